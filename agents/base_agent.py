@@ -0,0 +1,199 @@
+"""
+Base class for Rustsmith agents
+Sends the agent's messages through the shared response cache and the router,
+with the generation settings of the agent's role
+"""
+from typing import List, Dict, Any, Iterator
+
+from agents.llm_client import LLMClient, LLMError, LLMResult
+from agents.generation import GenerationConfig, ReasoningFilter, KEEP, generation_config, strip_reasoning
+from agents.router import Router, DEFAULT_BACKEND, get_router
+from agents.response_cache import ResponseCache, get_cache
+from agents.prompts import prefix_tracker
+from utils.context_manager import estimate_tokens
+from utils.log import get_logger
+from utils.metrics import AGENT_SECONDS, AGENT_TOKENS
+from utils.tracing import Span, span
+
+logger = get_logger("agents")
+
+
+class BaseAgent:
+    # Model used by the agent, set by every subclass
+    model = None
+
+    def __init__(self, client: LLMClient = None, cache: ResponseCache = None, router: Router = None,
+                 generation: GenerationConfig = None):
+        """
+        Args:
+            client (LLMClient): Send every request to this client, without routing
+            cache (ResponseCache): Response cache, the shared one by default
+            router (Router): Router of the requests, the shared one by default
+            generation (GenerationConfig): Generation settings, the role's configured ones by default
+        """
+        self.router = router or (Router({DEFAULT_BACKEND: client}) if client else get_router())
+        # A configured pool for the role replaces the class default
+        self.model = self.router.primary_model(self.role, self.model)
+        self.generation = generation or generation_config(self.role)
+        self.cache = cache or get_cache()
+        self.last_result = None
+        self.last_tokens = 0
+        self.last_prefix_reuse = 0.0
+
+    @property
+    def role(self) -> str:
+        """Routing role, the class name without "Agent", e.g. smith"""
+        return type(self).__name__.replace("Agent", "").lower()
+
+    def _observe_prefix(self, messages: List[Dict[str, str]]):
+        """Report how much of the request repeats this agent's previous one"""
+        self.last_prefix_reuse = prefix_tracker.observe(type(self).__name__, messages)
+        logger.debug("%s: %.0f%% of the prompt matches the previous request", type(self).__name__, self.last_prefix_reuse * 100)
+
+    def _visible(self, content: str) -> str:
+        """The part of a response later prompts may see, reasoning stripped unless it is kept"""
+        return content if self.generation.reasoning == KEEP else strip_reasoning(content, self.generation.reasoning_open)
+
+    def _cached_result(self, key: str) -> LLMResult:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        return LLMResult(
+            ok=True,
+            model=entry.get("model") or self.model,
+            content=entry["content"],
+            usage=entry.get("usage") or {},
+            cached=True,
+            finish_reason=entry.get("finish_reason")
+        )
+
+    def _store_result(self, key: str, result: LLMResult):
+        # A response cut off at max_tokens would be replayed cut off to every identical call
+        if not result.ok or result.finish_reason == "length":
+            return
+        # The key names the primary model, an answer of a hedge or fallback
+        # route would be replayed as the primary's after the route recovers
+        if result.backend and result.backend != self.router.primary_route(self.role, self.model):
+            return
+        self.cache.put(key, {
+            "model": result.model, "content": result.content, "usage": result.usage,
+            "finish_reason": result.finish_reason,
+        })
+
+    def _record(self, messages: List[Dict[str, str]], result: LLMResult, current: Span):
+        """Keep the last result and the tokens it cost, cache hits cost nothing, and report the call"""
+        self.last_result = result
+        if result.cached:
+            self.last_tokens = 0
+        else:
+            self.last_tokens = result.usage.get("total_tokens") or estimate_tokens(
+                "".join(message["content"] for message in messages) + (result.content or "")
+            )
+
+        agent = type(self).__name__
+        outcome = "cached" if result.cached else ("ok" if result.ok else "error")
+        current.set("response_chars", len(result.content or ""))
+        current.set("tokens", self.last_tokens)
+        current.set("cached", result.cached)
+        current.set("attempts", result.attempts)
+        current.set("queued_seconds", result.queued or None)
+        current.set("backend", result.backend or None)
+        current.set("hedged", result.hedged or None)
+        current.set("status_code", result.status_code)
+        current.set("finish_reason", result.finish_reason)
+        if result.ok and self.generation.reasoning != KEEP:
+            current.set("reasoning_chars", len(result.content or "") - len(self._visible(result.content) or ""))
+        if result.finish_reason == "length":
+            logger.warning("%s: response cut off at max_tokens=%s", agent, self.generation.max_tokens)
+        if not result.ok:
+            current.fail(result.error or "completion failed")
+        AGENT_SECONDS.observe(result.latency if result.latency else current.duration, agent=agent, model=result.model, outcome=outcome)
+        AGENT_TOKENS.inc(self.last_tokens, agent=agent, model=result.model)
+        logger.debug("%s response:\n%s", agent, result.content)
+
+    def _span(self, messages: List[Dict[str, str]], stream: bool = False):
+        """Span of one completion, with the request size"""
+        return span(
+            f"agent.{type(self).__name__}",
+            agent=type(self).__name__,
+            model=self.model,
+            stream=stream,
+            messages=len(messages),
+            prompt_chars=sum(len(message["content"]) for message in messages),
+        )
+
+    def _complete(self, messages: List[Dict[str, str]], use_cache: bool = True, **params: Any) -> str:
+        """
+        Run a chat completion for this agent, served from the cache when possible
+
+        Args:
+            messages (list): Chat messages
+            use_cache (bool): False for calls that must not replay an earlier
+                answer, such as repairs: the same errors would get the same fix
+            **params: Generation parameters of this call (temperature, seed, ...),
+                they override the role's settings
+
+        Returns:
+            str: The response text, without reasoning unless the role keeps it
+
+        Raises:
+            LLMError: If the endpoint did not return a completion
+        """
+        params = {**self.generation.params(), **params}
+        with self._span(messages) as current:
+            key = ResponseCache.make_key(self.model, messages, params)
+            result = self._cached_result(key) if use_cache else None
+            if result is None:
+                self._observe_prefix(messages)
+                result = self.router.chat(self.role, self.model, messages, **params)
+                if use_cache:
+                    self._store_result(key, result)
+            self._record(messages, result, current)
+        if not result.ok:
+            raise LLMError(result)
+        return self._visible(result.content)
+
+    def _stream(self, messages: List[Dict[str, str]], use_cache: bool = True, **params: Any) -> Iterator[str]:
+        """
+        Run a streaming chat completion for this agent, served from the cache when possible
+
+        Args:
+            messages (list): Chat messages
+            use_cache (bool): False for calls that must not replay an earlier answer
+            **params: Generation parameters of this call (temperature, seed, ...),
+                they override the role's settings
+
+        Yields:
+            str: Content deltas as they arrive, reasoning filtered out unless the role keeps it
+
+        Raises:
+            LLMError: If the stream could not be opened or broke off
+        """
+        params = {**self.generation.params(), **params}
+        with self._span(messages, stream=True) as current:
+            key = ResponseCache.make_key(self.model, messages, params)
+            result = self._cached_result(key) if use_cache else None
+            if result is not None:
+                self._record(messages, result, current)
+                yield self._visible(result.content)
+                return
+
+            self._observe_prefix(messages)
+            stream = self.router.stream_chat(self.role, self.model, messages, **params)
+            if self.generation.reasoning == KEEP:
+                yield from stream
+            else:
+                reasoning_filter = ReasoningFilter(self.generation.reasoning_open)
+                for text in stream:
+                    text = reasoning_filter.feed(text)
+                    if text:
+                        yield text
+                text = reasoning_filter.close()
+                if text:
+                    yield text
+            current.set("first_token_seconds", stream.first_token_latency)
+            self._record(messages, stream.result, current)
+            if use_cache:
+                self._store_result(key, stream.result)
+        if not stream.result.ok:
+            raise LLMError(stream.result)
@@ -0,0 +1,153 @@
+"""
+Generation settings for Rustsmith agents
+Per-role max_tokens, temperature, stop sequences and reasoning handling, and
+the filters that keep a model's reasoning out of every later prompt
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Any
+
+from config import (
+    AGENT_MAX_TOKENS, AGENT_MAX_TOKENS_DEFAULT, AGENT_TEMPERATURE, AGENT_TEMPERATURE_DEFAULT,
+    AGENT_STOP, AGENT_REASONING, AGENT_REASONING_DEFAULT, REASONING_DISABLE_PARAMS, REASONING_OPEN_ROLES
+)
+
+# Reasoning modes, see AGENT_REASONING in config.py
+KEEP, STRIP, DISABLE = "keep", "strip", "disable"
+
+REASONING_TAGS = ["think", "thinking", "reasoning"]
+TAG_RE = re.compile(r"<(/?)(%s)>" % "|".join(REASONING_TAGS), re.IGNORECASE)
+
+
+@dataclass
+class GenerationConfig:
+    """How an agent's completions are generated"""
+    max_tokens: int = AGENT_MAX_TOKENS_DEFAULT
+    temperature: float = AGENT_TEMPERATURE_DEFAULT
+    stop: List[str] = field(default_factory=list)
+    reasoning: str = AGENT_REASONING_DEFAULT
+    # The chat template opens the reasoning block in the prompt, responses start inside it
+    reasoning_open: bool = False
+
+    def params(self) -> Dict[str, Any]:
+        """Payload fields of a request, calls may still override them"""
+        params = {"max_tokens": self.max_tokens, "temperature": self.temperature}
+        if self.stop:
+            params["stop"] = list(self.stop)
+        if self.reasoning == DISABLE:
+            params.update(REASONING_DISABLE_PARAMS)
+        return params
+
+
+def generation_config(role: str) -> GenerationConfig:
+    """
+    Generation settings of an agent role
+
+    Args:
+        role (str): Agent role, e.g. "type"
+
+    Returns:
+        GenerationConfig: The role's settings, the defaults for anything not configured
+    """
+    reasoning = AGENT_REASONING.get(role, AGENT_REASONING_DEFAULT)
+    if reasoning not in (KEEP, STRIP, DISABLE):
+        raise ValueError(f"Unknown reasoning mode {reasoning!r} for {role}, expected keep, strip or disable")
+    if reasoning == DISABLE and not REASONING_DISABLE_PARAMS:
+        raise ValueError(f"Reasoning mode disable for {role} needs REASONING_DISABLE_PARAMS, "
+                         f"the backend's switch, e.g. '{{\"think\": false}}' for Ollama")
+    return GenerationConfig(
+        max_tokens=AGENT_MAX_TOKENS.get(role, AGENT_MAX_TOKENS_DEFAULT),
+        temperature=AGENT_TEMPERATURE.get(role, AGENT_TEMPERATURE_DEFAULT),
+        stop=list(AGENT_STOP.get(role) or []),
+        reasoning=reasoning,
+        reasoning_open=role in REASONING_OPEN_ROLES,
+    )
+
+
+def strip_reasoning(text: str, opened: bool = False) -> str:
+    """
+    Remove reasoning blocks from a response
+
+    <think>...</think> blocks (and <thinking>, <reasoning>) are dropped, as is
+    an unterminated one cut off by max_tokens. A closing tag outside of a
+    block is dropped on its own; ReasoningFilter applies the same rule.
+
+    Args:
+        text (str): The response
+        opened (bool): The response starts inside a block, for chat templates
+            that open it in the prompt
+    """
+    if not text:
+        return text
+    parts = []
+    inside = opened
+    position = 0
+    for tag in TAG_RE.finditer(text):
+        if not inside:
+            parts.append(text[position:tag.start()])
+        position = tag.end()
+        inside = not tag.group(1)
+    if not inside:
+        parts.append(text[position:])
+    return "".join(parts).strip()
+
+
+class ReasoningFilter:
+    """
+    Streaming variant of strip_reasoning, with the same result
+
+    Deltas are passed through as they arrive except inside reasoning blocks.
+    Text that may be the start of a tag is held back until the next delta
+    tells.
+    """
+    def __init__(self, opened: bool = False):
+        """
+        Args:
+            opened (bool): The response starts inside a block, see strip_reasoning
+        """
+        self.buffer = ""
+        self.inside = opened
+        self.started = False
+
+    def _held(self) -> int:
+        """Length of the buffer's tail that could still become a tag"""
+        start = self.buffer.rfind("<")
+        if start == -1:
+            return 0
+        tail = self.buffer[start:].lower()
+        tags = [f"<{slash}{tag}>" for tag in REASONING_TAGS for slash in ("", "/")]
+        return len(tail) if any(tag.startswith(tail) for tag in tags) else 0
+
+    def feed(self, text: str) -> str:
+        """
+        Args:
+            text (str): Next delta of the response
+
+        Returns:
+            str: The part of the response that is now known to be output
+        """
+        self.buffer += text
+        output = []
+        position = 0
+        for tag in TAG_RE.finditer(self.buffer):
+            if not self.inside:
+                output.append(self.buffer[position:tag.start()])
+            position = tag.end()
+            self.inside = not tag.group(1)
+        self.buffer = self.buffer[position:]
+        held = self._held()
+        if not self.inside:
+            output.append(self.buffer[:len(self.buffer) - held])
+        self.buffer = self.buffer[len(self.buffer) - held:]
+        text = "".join(output)
+        if not self.started:
+            # Like strip_reasoning, no leading whitespace before the output
+            text = text.lstrip()
+            self.started = bool(text)
+        return text
+
+    def close(self) -> str:
+        """The held back text once the response is complete, nothing if a block is left open"""
+        text = "" if self.inside else self.buffer
+        self.buffer = ""
+        return text if self.started else text.strip()
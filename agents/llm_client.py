@@ -0,0 +1,301 @@
+"""
+Shared LLM client for Rustsmith agents
+Pooled keep-alive HTTP session with deadlines, retry/backoff and adaptive per-model limits
+"""
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agents.model_limits import ModelLimits, Ticket, get_model_limits, SUCCESS, OVERLOAD, FAILURE
+from utils.context_manager import estimate_tokens
+from config import (
+    LLM_BASE_URL, LLM_API_KEY, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_POOL_SIZE
+)
+
+# Status codes worth another attempt, everything else is returned as is
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Status codes meaning the model is over capacity, they shrink its concurrency window
+OVERLOAD_STATUS_CODES = {429, 503, 504}
+
+
+@dataclass
+class LLMResult:
+    """Outcome of a chat completion call"""
+    ok: bool
+    model: str
+    content: Optional[str] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    latency: float = 0.0
+    usage: Dict[str, int] = field(default_factory=dict)
+    cached: bool = False
+    queued: float = 0.0
+    backend: str = ""
+    hedged: bool = False
+    finish_reason: Optional[str] = None
+
+
+class LLMError(Exception):
+    """Raised by the agents when a completion could not be obtained"""
+    def __init__(self, result: LLMResult):
+        super().__init__(f"{result.model}: {result.error}")
+        self.result = result
+
+
+class LLMClient:
+    def __init__(
+        self,
+        base_url: str = LLM_BASE_URL,
+        api_key: str = LLM_API_KEY,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        pool_size: int = LLM_POOL_SIZE,
+        limits: ModelLimits = None
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limits = limits or get_model_limits()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self._prepare_headers())
+
+    def _prepare_headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        """Seconds from a Retry-After header, None if absent or not a number"""
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return None
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, a server Retry-After wins when present"""
+        if retry_after is not None:
+            return min(retry_after, LLM_BACKOFF_MAX)
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+    def _post(self, payload: Dict[str, Any], deadline: float, result: LLMResult, stream: bool = False):
+        """
+        POST the payload once the model's limits allow it, retrying on 429/5xx
+        and connection errors until the deadline
+
+        Every attempt reports its outcome to the limits. Time spent waiting
+        for them is added to result.queued and does not count against the
+        deadline.
+
+        Returns:
+            tuple: (the 200 response, its ticket to release once the body is
+            read), or (None, None) with result.error set
+        """
+        model = payload["model"]
+        prompt_tokens = estimate_tokens("".join(message.get("content") or "" for message in payload["messages"]))
+        for attempt in range(self.max_retries + 1):
+            if deadline - time.monotonic() <= 0:
+                result.error = result.error or "Deadline exceeded"
+                return None, None
+            ticket = self.limits.acquire(model, prompt_tokens)
+            result.queued += ticket.waited
+            deadline += ticket.waited
+            remaining = deadline - time.monotonic()
+            result.attempts = attempt + 1
+            retry_after = None
+            try:
+                response = self.session.post(
+                    self.base_url,
+                    json=payload,
+                    stream=stream,
+                    timeout=(min(LLM_CONNECT_TIMEOUT, remaining), remaining)
+                )
+            except requests.Timeout as e:
+                result.status_code = None
+                result.error = f"{type(e).__name__}: {e}"
+                self.limits.release(ticket, OVERLOAD, reason="timeout")
+            except requests.ConnectionError as e:
+                result.status_code = None
+                result.error = f"{type(e).__name__}: {e}"
+                self.limits.release(ticket, FAILURE)
+            else:
+                result.status_code = response.status_code
+                if response.status_code == 200:
+                    result.error = None
+                    return response, ticket
+                result.error = f"API Error: {response.status_code}, {response.text[:500]}"
+                response.close()
+                retry_after = self._retry_after(response)
+                if response.status_code in OVERLOAD_STATUS_CODES:
+                    self.limits.release(ticket, OVERLOAD, retry_after=retry_after, reason=str(response.status_code))
+                else:
+                    self.limits.release(ticket, FAILURE)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return None, None
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, retry_after)
+                if time.monotonic() + delay >= deadline:
+                    return None, None
+                time.sleep(delay)
+        return None, None
+
+    def _release(self, ticket: Ticket, result: LLMResult, outcome: str = None, reason: str = ""):
+        """Hand back the ticket of a 200 response once its body is read, with the tokens it cost"""
+        tokens = result.usage.get("total_tokens") or ticket.tokens + estimate_tokens(result.content or "")
+        self.limits.release(ticket, outcome or (SUCCESS if result.ok else FAILURE), tokens=tokens, reason=reason)
+
+    def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        timeout: float = None,
+        **params: Any
+    ) -> LLMResult:
+        """
+        Send a chat completion request, once the model's limits allow it
+
+        Args:
+            model (str): Model name
+            messages (list): Chat messages
+            timeout (float): Deadline in seconds for the whole call, retries
+                included, the wait for the model's limits is not counted
+            **params: Extra payload fields (temperature, max_tokens, ...)
+
+        Returns:
+            LLMResult: The completion, or the reason it failed
+        """
+        payload = {"model": model, "messages": messages, **params}
+        result = LLMResult(ok=False, model=model)
+
+        started_at = time.monotonic()
+        response, ticket = self._post(payload, started_at + (timeout or self.timeout), result)
+        if response is not None:
+            try:
+                response_json = response.json()
+                result.content = response_json["choices"][0]["message"]["content"]
+                result.finish_reason = response_json["choices"][0].get("finish_reason")
+                result.usage = response_json.get("usage") or {}
+                result.ok = True
+            except (ValueError, KeyError, IndexError, TypeError):
+                result.error = "No valid response content from the API"
+            self._release(ticket, result)
+
+        result.latency = time.monotonic() - started_at - result.queued
+        return result
+
+    def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        timeout: float = None,
+        **params: Any
+    ) -> "LLMStream":
+        """
+        Send a streaming chat completion request
+
+        Args:
+            model (str): Model name
+            messages (list): Chat messages
+            timeout (float): Deadline in seconds for the whole call, retries included
+            **params: Extra payload fields (temperature, max_tokens, ...)
+
+        Returns:
+            LLMStream: Iterator over the content deltas, its result is
+            filled in once the stream is exhausted
+        """
+        return LLMStream(self, model, messages, timeout or self.timeout, params)
+
+
+class LLMStream:
+    """
+    Iterator over the content deltas of a streaming completion
+
+    Consumes the server-sent events of an OpenAI compatible endpoint. The
+    request counts against the model's limits until the stream ends.
+    Retries only happen before the first byte; once exhausted, `result`
+    holds the full content, usage and latency.
+    """
+    def __init__(self, client: LLMClient, model: str, messages: List[Dict[str, str]],
+                 timeout: float, params: Dict[str, Any]):
+        self.client = client
+        self.payload = {"model": model, "messages": messages, "stream": True, **params}
+        self.timeout = timeout
+        self.result = LLMResult(ok=False, model=model)
+        self.first_token_latency = None
+
+    def __iter__(self) -> Iterator[str]:
+        started_at = time.monotonic()
+        result = self.result
+        response, ticket = self.client._post(self.payload, started_at + self.timeout, result, stream=True)
+        # The wait for the model's limits does not count against the deadline
+        deadline = started_at + self.timeout + result.queued
+        if response is None:
+            result.latency = time.monotonic() - started_at - result.queued
+            return
+
+        parts = []
+        outcome, reason = None, ""
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if time.monotonic() > deadline:
+                    result.error = "Deadline exceeded while streaming"
+                    outcome, reason = OVERLOAD, "timeout"
+                    break
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                if chunk.get("usage"):
+                    result.usage = chunk["usage"]
+                choices = chunk.get("choices") or []
+                if choices and choices[0].get("finish_reason"):
+                    result.finish_reason = choices[0]["finish_reason"]
+                text = (choices[0].get("delta") or {}).get("content") if choices else None
+                if text:
+                    if self.first_token_latency is None:
+                        self.first_token_latency = time.monotonic() - started_at - result.queued
+                    parts.append(text)
+                    yield text
+        except (requests.ConnectionError, requests.Timeout) as e:
+            result.error = f"{type(e).__name__}: {e}"
+            if isinstance(e, requests.Timeout):
+                outcome, reason = OVERLOAD, "timeout"
+        finally:
+            response.close()
+            result.latency = time.monotonic() - started_at - result.queued
+            result.content = "".join(parts)
+            self.client._release(ticket, result, outcome or (SUCCESS if result.error is None else FAILURE), reason)
+
+        result.ok = result.error is None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """Return the process-wide client shared by all agents"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
@@ -2,37 +2,12 @@
 Master Agent for Rustsmith
 Divides the project task among specialized agents
 """
-
 from typing import List, Dict, Any
-from config import DEFAULT_MODEL, DEFAULT_TEMPERATURE, MAX_TOKENS
-import os
-import json
-import requests
-from dotenv import load_dotenv
-load_dotenv()
-class MasterAgent:
-    def __init__(self):
-        self.base_url = "https://anura-testnet.lilypad.tech/api/v1/chat/completions"
-        self.api_key = os.getenv('ROUTER_API_KEY')
-    def _prepare_headers(self) -> Dict[str, str]:
-        return {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-    
-    def process(self, project_idea: str, context: List[Dict[str, Any]]) -> str:
-        endpoint = f"{self.base_url}"
-        """
-        Process the project idea and divide it into subtasks
-        
-        Args:
-            project_idea (str): The user's project idea
-            context (list): List of past interactions
-            
-        Returns:
-            str: Response with task division for each agent
-        """
-        system_message = """
+from agents.base_agent import BaseAgent
+from agents.prompts import system_prompt, build_messages, format_reference
+
+
+SYSTEM_PROMPT = system_prompt("""
         Here is a cleaner and well-structured version of your prompt, optimized for clarity and LLM understanding:
 
 ---
@@ -98,50 +73,31 @@ Instructions for the Utility Agent...
 
 ---
 
+### Similar Projects
+
+A project idea may be followed by the outline of a similar project that already compiled. Reuse its structure where it fits the new idea, and only instruct the agents for what differs or is missing.
+
+---
+
 Now, given the user's project idea, provide structured instructions for the appropriate agents using the format and rules above.
 
-        """
-        
-        # Format the context for the prompt
-        context_str = ""
-        if context:
-            context_str = "Previous context:\n"
-            for item in context:
-                if isinstance(item, dict):
-                    question = item.get("question", "")
-                    answer = item.get("answer", "")
-                    error = item.get("error", "")
-                    context_str += f"Question: {question}\n"
-                    context_str += f"Answer: {answer}\n"
-                    if error:
-                        context_str += f"Error: {error}\n"
-                    context_str += "---\n"
-        
-        user_message = f"""
-        Project idea: {project_idea}
-        
+        """)
+
 
+class MasterAgent(BaseAgent):
+    model = "llama3.1:8b"
+
+    def process(self, project_idea: str, context: List[Dict[str, Any]], reference: Any = None) -> str:
         """
+        Process the project idea and divide it into subtasks
         
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message}
-        ]
-        payload = json.dumps({
-    "model": "llama3.1:8b",
-    "messages": messages
-    
-})
-        
-        response = requests.post(endpoint, headers=self._prepare_headers(), data=payload)
-        if response.status_code == 200:
-            response_json = response.json()
-            # print('response_json', response_json)
-            if "choices" in response_json and len(response_json["choices"]) > 0:
-                response_text = response_json["choices"][0]["message"]["content"]
-                print("Response Text:\n", response_text)
-                return response_text
-            else:
-                print("Error: No valid response content from the API.")
-        else:
-            print(f"API Error: {response.status_code}, {response.text}")
\ No newline at end of file
+        Args:
+            project_idea (str): The user's project idea
+            context (list): List of past interactions
+            reference (SimilarProject): A similar project that compiled, outlined to the agent
+            
+        Returns:
+            str: Response with task division for each agent
+        """
+        messages = build_messages(SYSTEM_PROMPT, f"Project idea: {project_idea}", format_reference(reference, with_code=False))
+        return self._complete(messages)
@@ -0,0 +1,228 @@
+"""
+Adaptive per-model limits for Rustsmith
+Token buckets for requests and tokens per second and an AIMD concurrency
+window per model, shared by every job of the process
+"""
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from config import (
+    MODEL_CONCURRENCY, MODEL_CONCURRENCY_DEFAULT, MODEL_AIMD_INCREASE, MODEL_AIMD_DECREASE,
+    MODEL_RPS, MODEL_RPS_DEFAULT, MODEL_TPS, MODEL_TPS_DEFAULT, MODEL_BURST_SECONDS
+)
+from utils.metrics import MODEL_QUEUE_SECONDS, MODEL_WINDOW, MODEL_OVERLOADS
+
+# Outcomes of a request, reported with ModelLimits.release
+SUCCESS, OVERLOAD, FAILURE = "success", "overload", "failure"
+
+
+class TokenBucket:
+    """
+    Refills at rate per second up to burst_seconds of it
+
+    Amounts are taken in full even when the level goes negative, so a request
+    larger than the bucket is not starved and the debt is paid by the next
+    ones. A rate of 0 disables the bucket.
+    """
+    def __init__(self, rate: float, burst_seconds: float = MODEL_BURST_SECONDS):
+        self.rate = rate
+        self.capacity = max(rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount (at most a full bucket) can be taken"""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        if self.rate:
+            self.level -= amount
+
+
+class Ticket:
+    """Permission for one request, handed back with ModelLimits.release"""
+    def __init__(self, model: str, tokens: int, waited: float):
+        self.model = model
+        self.tokens = tokens
+        self.waited = waited
+        self.started_at = time.monotonic()
+
+
+class ModelLimiter:
+    """
+    Limits of one model
+
+    The concurrency window starts at the cap. Every success adds
+    increase / window, so the window grows by `increase` once a full window
+    of requests has succeeded; an overload multiplies it by `decrease`. Only
+    requests sent after the last cut can cut it again, so a burst of 429s
+    from one overloaded moment halves the window once. The buckets pace the
+    requests and tokens sent inside that window.
+    """
+    def __init__(self, model: str, cap: int, rps: float, tps: float,
+                 increase: float = MODEL_AIMD_INCREASE, decrease: float = MODEL_AIMD_DECREASE):
+        self.model = model
+        self.cap = cap
+        self.window = float(cap)
+        self.increase = increase
+        self.decrease = decrease
+        self.requests = TokenBucket(rps)
+        self.tokens = TokenBucket(tps)
+        self.active = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        self.last_cut = 0.0
+        self.overloads = 0
+        self.successes = 0
+        MODEL_WINDOW.set(self.window, model=model)
+
+    def delay(self, tokens: int, now: float) -> Optional[float]:
+        """Seconds to wait before sending, None to wait for a request to finish"""
+        if self.cap and self.active >= int(self.window):
+            return None
+        return max(self.paused_until - now, self.requests.delay(1, now), self.tokens.delay(tokens, now))
+
+    def on_success(self):
+        self.successes += 1
+        if self.cap:
+            self.window = min(float(self.cap), self.window + self.increase / self.window)
+
+    def on_overload(self, ticket: Ticket, retry_after: Optional[float]):
+        self.overloads += 1
+        now = time.monotonic()
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        if self.cap and ticket.started_at >= self.last_cut:
+            self.window = max(1.0, self.window * self.decrease)
+            self.last_cut = now
+
+
+class ModelLimits:
+    """
+    The limiters of every model
+
+    A request waits in acquire until its model's window has room and the
+    buckets hold a request and its estimated tokens, then reports its outcome
+    with release.
+    """
+    def __init__(self, caps: Dict[str, int] = None, default_cap: int = MODEL_CONCURRENCY_DEFAULT,
+                 rps: Dict[str, float] = None, default_rps: float = MODEL_RPS_DEFAULT,
+                 tps: Dict[str, float] = None, default_tps: float = MODEL_TPS_DEFAULT):
+        self.caps = dict(MODEL_CONCURRENCY if caps is None else caps)
+        self.default_cap = default_cap
+        self.rps = dict(MODEL_RPS if rps is None else rps)
+        self.default_rps = default_rps
+        self.tps = dict(MODEL_TPS if tps is None else tps)
+        self.default_tps = default_tps
+        self._limiters = {}
+        self._condition = threading.Condition()
+
+    def limiter(self, model: str) -> ModelLimiter:
+        """Limiter of a model, created on first use, call with the lock held"""
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limiter = self._limiters[model] = ModelLimiter(
+                model,
+                self.caps.get(model, self.default_cap),
+                self.rps.get(model, self.default_rps),
+                self.tps.get(model, self.default_tps)
+            )
+        return limiter
+
+    def acquire(self, model: str, tokens: int = 0) -> Ticket:
+        """
+        Wait until a request to the model may be sent
+
+        Args:
+            model (str): Model name
+            tokens (int): Estimated tokens of the request
+
+        Returns:
+            Ticket: To hand back with release once the response is read
+        """
+        started_at = time.monotonic()
+        with self._condition:
+            limiter = self.limiter(model)
+            limiter.waiting += 1
+            while True:
+                now = time.monotonic()
+                delay = limiter.delay(tokens, now)
+                if delay is not None and delay <= 0:
+                    break
+                self._condition.wait(delay)
+            limiter.waiting -= 1
+            limiter.active += 1
+            limiter.requests.take(1)
+            limiter.tokens.take(tokens)
+        waited = time.monotonic() - started_at
+        MODEL_QUEUE_SECONDS.observe(waited, model=model)
+        return Ticket(model, tokens, waited)
+
+    def release(self, ticket: Ticket, outcome: str, tokens: int = None, retry_after: float = None, reason: str = ""):
+        """
+        Hand back a ticket and adapt the model's window to the outcome
+
+        Args:
+            ticket (Ticket): Ticket from acquire
+            outcome (str): SUCCESS, OVERLOAD (429/503/504 or a timeout) or
+                FAILURE (any other error, leaves the window alone)
+            tokens (int): Tokens actually spent, corrects the estimate
+            retry_after (float): Seconds the endpoint asked to wait, pauses the model
+            reason (str): What the overload was, for the metrics
+        """
+        with self._condition:
+            limiter = self.limiter(ticket.model)
+            limiter.active -= 1
+            if tokens is not None:
+                limiter.tokens.take(tokens - ticket.tokens)
+            if outcome == SUCCESS:
+                limiter.on_success()
+            elif outcome == OVERLOAD:
+                limiter.on_overload(ticket, retry_after)
+            window = limiter.window
+            self._condition.notify_all()
+        if outcome == OVERLOAD:
+            MODEL_OVERLOADS.inc(model=ticket.model, reason=reason or "overload")
+        MODEL_WINDOW.set(window, model=ticket.model)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Current load
+
+        Returns:
+            dict: Model -> cap, window, requests in flight and waiting, overloads and successes
+        """
+        with self._condition:
+            return {
+                model: {
+                    "cap": limiter.cap,
+                    "window": round(limiter.window, 2),
+                    "active": limiter.active,
+                    "waiting": limiter.waiting,
+                    "overloads": limiter.overloads,
+                    "successes": limiter.successes,
+                }
+                for model, limiter in sorted(self._limiters.items())
+            }
+
+
+_limits = None
+_limits_lock = threading.Lock()
+
+
+def get_model_limits() -> ModelLimits:
+    """Return the process-wide limits shared by all clients"""
+    global _limits
+    with _limits_lock:
+        if _limits is None:
+            _limits = ModelLimits()
+        return _limits
@@ -0,0 +1,170 @@
+"""
+Prompt construction for Rustsmith agents
+
+Every agent has a byte-stable system prompt, normalized once at import, and
+sends everything that changes between calls as separate messages after it,
+ordered from least to most volatile. Requests of the same agent then share
+the longest possible prefix, which server-side KV/prefix caches can reuse.
+"""
+import re
+import textwrap
+import threading
+from typing import List, Dict, Any, Optional
+
+
+def system_prompt(text: str) -> str:
+    """
+    Normalize a system prompt template once
+
+    Args:
+        text (str): Prompt as written in the agent module
+
+    Returns:
+        str: The prompt dedented, with trailing spaces and surrounding blank lines removed
+    """
+    lines = textwrap.dedent(text).strip("\n").splitlines()
+    return "\n".join(line.rstrip() for line in lines).strip() + "\n"
+
+
+def format_files(files: Dict[str, str]) -> str:
+    """Render a file set in the [FILE: ...] protocol"""
+    return "\n".join(
+        f"[FILE: {path}]\n```\n{content}\n```\n[END FILE]"
+        for path, content in files.items()
+    )
+
+
+def format_answer(answer: Any) -> str:
+    """Render a context answer, files in the [FILE: ...] protocol and anything else as text"""
+    if isinstance(answer, dict):
+        return format_files(answer)
+    return str(answer or "").strip()
+
+
+def format_reference(reference: Any, with_code: bool = True) -> str:
+    """
+    Render a similar project that compiled
+
+    Args:
+        reference (SimilarProject): Match from utils.project_index, None for no reference
+        with_code (bool): Include the files, otherwise only their paths and declarations
+
+    Returns:
+        str: The reference block, empty without a reference
+    """
+    if reference is None:
+        return ""
+    header = f"Similar project that compiled (idea: {reference.idea.strip()})"
+    if with_code:
+        return f"{header}:\n{format_files(reference.files)}"
+    outline = []
+    for path, content in reference.files.items():
+        outline.append(path)
+        outline.extend(
+            f"    {line.strip().rstrip('{').strip()}" for line in content.splitlines()
+            if re.match(r"\s*(pub(\([^)]*\))?\s+)?(struct|enum|trait|fn|mod|type)\s", line)
+        )
+    return f"{header}, its files and declarations:\n" + "\n".join(outline)
+
+
+def format_context(context: List[Dict[str, Any]]) -> str:
+    """
+    Render the past attempts in a fixed layout
+
+    Args:
+        context (list): List of past interactions
+
+    Returns:
+        str: One block per attempt, empty if there is no history
+    """
+    blocks = []
+    for attempt, item in enumerate(context or [], 1):
+        if not isinstance(item, dict):
+            continue
+        block = f"Attempt {attempt}\nQuestion: {str(item.get('question', '')).strip()}\nAnswer:\n{format_answer(item.get('answer'))}"
+        if item.get("error"):
+            block += f"\nError:\n{str(item['error']).strip()}"
+        blocks.append(block)
+    return "Previous context:\n" + "\n---\n".join(blocks) if blocks else ""
+
+
+def build_messages(system: str, *parts: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Assemble the chat messages of a request
+
+    Args:
+        system (str): The agent's normalized system prompt
+        *parts: Dynamic parts in order of increasing volatility, empty ones are skipped
+
+    Returns:
+        list: The system message followed by one user message per part
+    """
+    messages = [{"role": "system", "content": system}]
+    for part in parts:
+        if part and part.strip():
+            messages.append({"role": "user", "content": part.strip()})
+    return messages
+
+
+def serialize_messages(messages: List[Dict[str, str]]) -> str:
+    """Approximation of the rendered chat template the server tokenizes"""
+    return "".join(f"<|{message['role']}|>\n{message['content']}\n" for message in messages)
+
+
+class PrefixTracker:
+    """
+    Measures how much of each request repeats the previous request of the same agent
+
+    A server-side prefix cache can skip recomputing the shared prefix, so the
+    reported fraction is the share of the prompt that is reusable.
+    """
+    def __init__(self):
+        self._previous = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_chars = 0
+        self.reusable_chars = 0
+
+    def observe(self, key: str, messages: List[Dict[str, str]]) -> float:
+        """
+        Record a request
+
+        Args:
+            key (str): Agent or model the request belongs to
+            messages (list): The request's messages
+
+        Returns:
+            float: Fraction of the prompt shared with the previous request for key
+        """
+        current = serialize_messages(messages)
+        with self._lock:
+            previous = self._previous.get(key, "")
+            self._previous[key] = current
+            # Binary search on slice comparisons for the common prefix length
+            shared, high = 0, min(len(previous), len(current))
+            while shared < high:
+                middle = (shared + high + 1) // 2
+                if previous[:middle] == current[:middle]:
+                    shared = middle
+                else:
+                    high = middle - 1
+            self.requests += 1
+            self.prompt_chars += len(current)
+            self.reusable_chars += shared
+        return shared / len(current) if current else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Totals over all requests of this process
+
+        Returns:
+            dict: requests and the overall reusable prefix fraction
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "reusable_fraction": self.reusable_chars / self.prompt_chars if self.prompt_chars else 0.0,
+            }
+
+
+prefix_tracker = PrefixTracker()
@@ -0,0 +1,193 @@
+"""
+Content-addressed response cache for Rustsmith agents
+Completions are stored on disk keyed on a hash of model, messages and parameters
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_MB, RESPONSE_CACHE_TTL
+
+
+class ResponseCache:
+    """
+    Size-bounded on-disk cache with LRU and TTL eviction
+
+    Every entry is a JSON file named after its key. The file's mtime is the
+    last access time, so eviction removes the least recently used entries
+    first once the store grows past max_bytes.
+    """
+    def __init__(
+        self,
+        cache_dir: str = RESPONSE_CACHE_DIR,
+        max_bytes: int = int(RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+        ttl: float = RESPONSE_CACHE_TTL,
+        enabled: bool = RESPONSE_CACHE_ENABLED
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        """
+        Hash the request into a cache key
+
+        Args:
+            model (str): Model name
+            messages (list): Chat messages
+            params (dict): Generation parameters sent with the request
+
+        Returns:
+            str: Hex SHA-256 of the canonical JSON of the request
+        """
+        canonical = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached completion
+
+        Args:
+            key (str): Key returned by make_key
+
+        Returns:
+            dict: The stored entry, or None on a miss or when the cache is bypassed
+        """
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+                self.evictions += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        """
+        Store a completion and evict old entries if the store is over its size bound
+
+        Args:
+            key (str): Key returned by make_key
+            entry (dict): JSON serializable entry, must contain "content"
+        """
+        if not self.enabled:
+            return
+        entry = {**entry, "created": time.time()}
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.writes += 1
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """Yield (path, size, last access) for every stored entry"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                if item.name.endswith(".json"):
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    yield item.path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """Remove least recently used entries until the store is at 90% of its bound"""
+        entries = sorted(self._entries(), key=lambda item: item[2])
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self._size <= target:
+                break
+            if self._remove(path):
+                self._size -= size
+                self.evictions += 1
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters of this process
+
+        Returns:
+            dict: hits, misses, writes, evictions and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """Return the process-wide cache shared by all agents"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
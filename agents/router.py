@@ -0,0 +1,296 @@
+"""
+Latency-aware routing for Rustsmith agents
+Every agent role maps to a ranked pool of backend/model pairs; slow requests
+are hedged on the next pair and failed ones fall back to it
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Iterator
+
+from agents.llm_client import LLMClient, LLMResult, get_client
+from agents.model_limits import ModelLimits
+from utils.log import get_logger
+from utils.metrics import ROUTE_HEDGES, ROUTE_FALLBACKS
+from config import (
+    LLM_BASE_URL, ROUTES_FILE, ROUTE_STATS_WINDOW, ROUTE_STATS_MAX_AGE, ROUTE_MIN_SAMPLES,
+    ROUTE_MAX_ERROR_RATE, ROUTE_HEDGE_MIN_SECONDS, ROUTE_POOL_SIZE
+)
+
+logger = get_logger("router")
+
+DEFAULT_BACKEND = "default"
+
+
+class BackendStats:
+    """
+    Rolling latency and error rate of the last requests to a route
+
+    Samples older than max_age seconds are dropped. A route demoted for its
+    errors gets no traffic, so no new samples; without the age limit a short
+    outage would demote it for the life of the process.
+    """
+    def __init__(self, window: int = ROUTE_STATS_WINDOW, min_samples: int = ROUTE_MIN_SAMPLES,
+                 max_age: float = ROUTE_STATS_MAX_AGE, clock=time.monotonic):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.samples.append((self.clock(), latency, ok))
+
+    def _current(self) -> List[tuple]:
+        """(latency, ok) of the samples young enough to count, call with the lock held"""
+        if self.max_age > 0:
+            oldest = self.clock() - self.max_age
+            while self.samples and self.samples[0][0] < oldest:
+                self.samples.popleft()
+        return [(latency, ok) for _, latency, ok in self.samples]
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Latency quantile of the successful requests, None until there are min_samples"""
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._current() if ok)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            samples = self._current()
+        if len(samples) < self.min_samples:
+            return 0.0
+        return sum(1 for _, ok in samples if not ok) / len(samples)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        with self._lock:
+            samples = len(self._current())
+        return {
+            "samples": samples,
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+class Route:
+    """A model served by a backend"""
+    def __init__(self, backend: str, client: LLMClient, model: str):
+        self.backend = backend
+        self.client = client
+        self.model = model
+        self.name = f"{backend}/{model}"
+        self.stats = BackendStats()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a request is hedged: the route's p95, None while it is unknown"""
+        p95 = self.stats.quantile(0.95)
+        return None if p95 is None else max(p95, ROUTE_HEDGE_MIN_SECONDS)
+
+    def healthy(self) -> bool:
+        return self.stats.error_rate() <= ROUTE_MAX_ERROR_RATE
+
+    def chat(self, messages: List[Dict[str, str]], timeout: float, params: Dict[str, Any]) -> LLMResult:
+        result = self.client.chat(self.model, messages, timeout=timeout, **params)
+        self.stats.record(result.latency, result.ok)
+        result.backend = self.name
+        return result
+
+
+class Router:
+    """
+    Ranked route pools per agent role
+
+    The pool of a role is tried in its configured order, routes whose recent
+    error rate is above ROUTE_MAX_ERROR_RATE moved to the end. A request
+    that is still running after the p95 latency of its route is hedged: the
+    same request goes to the next route and the first answer wins. A failed
+    request falls back to the next route at once. Roles without a pool use
+    the agent's own model on the default backend, exactly as without a router.
+    """
+    def __init__(self, clients: Dict[str, LLMClient] = None, pools: Dict[str, List[str]] = None,
+                 pool_size: int = ROUTE_POOL_SIZE):
+        self.clients = {DEFAULT_BACKEND: get_client(), **(clients or {})}
+        self.pools = pools or {}
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="route")
+
+    @classmethod
+    def from_file(cls, path: str) -> "Router":
+        """
+        Load the backends and pools from a JSON file:
+
+            {
+              "backends": {"local": {"url": "http://localhost:11434/v1/chat/completions", "api_key_env": "LOCAL_KEY"}},
+              "roles": {"smith": ["default/llama3.1:8b", "local/qwen2.5-coder:7b"]}
+            }
+
+        "default" is LLM_BASE_URL with ROUTER_API_KEY. Every other backend
+        gets its own connection pool and per-model limits.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        clients = {}
+        for name, backend in (spec.get("backends") or {}).items():
+            api_key = backend.get("api_key") or os.getenv(backend.get("api_key_env", ""), "")
+            client_args = {"base_url": backend.get("url", LLM_BASE_URL), "api_key": api_key, "limits": ModelLimits()}
+            if "timeout" in backend:
+                client_args["timeout"] = float(backend["timeout"])
+            clients[name] = LLMClient(**client_args)
+        return cls(clients, spec.get("roles") or {})
+
+    def _route(self, target: str) -> Route:
+        backend, _, model = target.partition("/")
+        if backend not in self.clients:
+            raise ValueError(f"Unknown backend {backend!r} in route {target!r}")
+        with self._lock:
+            route = self._routes.get(target)
+            if route is None:
+                route = self._routes[target] = Route(backend, self.clients[backend], model)
+            return route
+
+    def routes(self, role: str, model: str) -> List[Route]:
+        """
+        Pool of a role, best first
+
+        Args:
+            role (str): Agent role, e.g. "smith"
+            model (str): The agent's own model, used when the role has no pool
+
+        Returns:
+            list: Routes in the order they are tried
+        """
+        targets = self.pools.get(role) or [f"{DEFAULT_BACKEND}/{model}"]
+        routes = [self._route(target) for target in targets]
+        return sorted(routes, key=lambda route: not route.healthy())
+
+    def primary_model(self, role: str, model: str) -> str:
+        """Model of the first route in a role's configured pool"""
+        targets = self.pools.get(role)
+        return targets[0].partition("/")[2] if targets else model
+
+    def primary_route(self, role: str, model: str) -> str:
+        """Name of the first route in a role's configured pool, whatever its health"""
+        targets = self.pools.get(role)
+        return targets[0] if targets else f"{DEFAULT_BACKEND}/{model}"
+
+    def chat(self, role: str, model: str, messages: List[Dict[str, str]], timeout: float = None,
+             **params: Any) -> LLMResult:
+        """
+        Send a chat completion request through the role's pool
+
+        Args:
+            role (str): Agent role
+            model (str): The agent's own model
+            messages (list): Chat messages
+            timeout (float): Deadline of every routed request
+            **params: Extra payload fields
+
+        Returns:
+            LLMResult: The first successful answer, or the last failure
+        """
+        routes = self.routes(role, model)
+        if len(routes) == 1:
+            return routes[0].chat(messages, timeout, params)
+
+        remaining = list(routes)
+        pending = {}
+        hedged = False
+
+        def launch() -> Route:
+            route = remaining.pop(0)
+            pending[self._pool.submit(route.chat, messages, timeout, params)] = route
+            return route
+
+        current = launch()
+        result = None
+        while pending:
+            delay = current.hedge_delay() if remaining else None
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # Past the p95 of the route: race the next one
+                hedged = True
+                logger.debug("%s: %s is slower than %.2fs, hedging on %s", role, current.name, delay, remaining[0].name)
+                current = launch()
+                continue
+            for future in done:
+                route = pending.pop(future)
+                result = future.result()
+                if result.ok:
+                    result.hedged = hedged
+                    if hedged:
+                        ROUTE_HEDGES.inc(role=role, winner="primary" if route is routes[0] else "hedge")
+                    return result
+                if remaining:
+                    logger.info("%s: %s failed (%s), falling back to %s", role, route.name, result.error, remaining[0].name)
+                    ROUTE_FALLBACKS.inc(role=role, backend=route.name)
+                    current = launch()
+        result.hedged = hedged
+        return result
+
+    def stream_chat(self, role: str, model: str, messages: List[Dict[str, str]], timeout: float = None,
+                    **params: Any) -> "RoutedStream":
+        """
+        Send a streaming chat completion request through the role's pool
+
+        Streams are not hedged, a duplicate would have to be buffered until
+        it wins, but a stream that fails before its first delta falls back to
+        the next route.
+        """
+        return RoutedStream(role, self.routes(role, model), messages, timeout, params)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Route name -> samples, p50, p95 and error rate"""
+        with self._lock:
+            routes = list(self._routes.values())
+        return {route.name: route.stats.snapshot() for route in routes}
+
+
+class RoutedStream:
+    """Iterator over the content deltas of the first route that streams, see Router.stream_chat"""
+    def __init__(self, role: str, routes: List[Route], messages: List[Dict[str, str]],
+                 timeout: Optional[float], params: Dict[str, Any]):
+        self.role = role
+        self.routes = routes
+        self.messages = messages
+        self.timeout = timeout
+        self.params = params
+        self.result = None
+        self.first_token_latency = None
+
+    def __iter__(self) -> Iterator[str]:
+        for index, route in enumerate(self.routes):
+            stream = route.client.stream_chat(route.model, self.messages, timeout=self.timeout, **self.params)
+            started = False
+            for text in stream:
+                started = True
+                yield text
+            route.stats.record(stream.result.latency, stream.result.ok)
+            self.result = stream.result
+            self.result.backend = route.name
+            self.first_token_latency = stream.first_token_latency
+            if self.result.ok or started or index == len(self.routes) - 1:
+                return
+            logger.info("%s: %s failed (%s), falling back to %s", self.role, route.name, self.result.error, self.routes[index + 1].name)
+            ROUTE_FALLBACKS.inc(role=self.role, backend=route.name)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router:
+    """Return the process-wide router, loaded from ROUTES_FILE when it is set"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router.from_file(ROUTES_FILE) if ROUTES_FILE else Router()
+        return _router
@@ -2,57 +2,14 @@
 Smith Agent for Rustsmith
 Assembles the final Rust project based on output from other agents
 """
-import openai
-from typing import List, Dict, Any
-from config import DEFAULT_MODEL, DEFAULT_TEMPERATURE, MAX_TOKENS
-import os
-import json
-import requests
-from dotenv import load_dotenv
-load_dotenv()
-class SmithAgent:
-    def __init__(self):
-        self.base_url = "https://anura-testnet.lilypad.tech/api/v1/chat/completions"
-        self.api_key = os.getenv('ROUTER_API_KEY')
-    
-    def _prepare_headers(self) -> Dict[str, str]:
-        return {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-    
-    def process(
-        self, 
-        project_idea: str, 
-        master_workflow: str,  
-        context: List[Dict[str, Any]],
-        agent_responses: Dict[str, str] = {}
-    ) -> str:
-        
-        parsed_context = ""
-        for item in context:
-            if isinstance(item, dict) and item.get("answer"):
-                parsed_context += f"parsed files:\n{item.get('answer')}\n\n"
-
-        error_context = ""
-        for item in context:
-            if isinstance(item, dict) and item.get("error"):
-                error_context += f"Previous error:\n{item.get('error')}\n\n"
-                
-        endpoint = f"{self.base_url}"
-        """
-        Assemble the final Rust project using outputs from specialized agents
-        
-        Args:
-            project_idea (str): The user's project idea
-            master_workflow (str): The Master Agent's workflow description
-            agent_responses (dict): Dictionary of responses from specialized agents
-            context (list): List of past interactions including errors
-            
-        Returns:
-            str: Final assembled project with file paths and content
-        """
-        system_message = """
+from typing import List, Dict, Any, Callable, Tuple
+from agents.base_agent import BaseAgent
+from agents.prompts import system_prompt, build_messages, format_answer, format_files, format_reference
+from utils.file_manager import EXTRA_TEXT_FILE
+from utils.protocol import ProtocolParser
+
+
+SYSTEM_PROMPT = system_prompt("""
         You are the Smith Agent for Rustsmith, a tool that generates Rust projects.
         Your task is to assemble a complete Rust project using the outputs from specialized agents.
         You will be provided the Context which will be a list of dictionary containing the User query, Your code response and the error on the code you generated by the rust compiler. Now when you receive errors you have to regenerate the project with the error fixed.
@@ -100,45 +57,165 @@ If no agent responses are present:
 - In the errors if you find errors which are related to the dependency version, The error should be like changing the version to some other version then change the dependency version to the version expected by the compiler returned in the error.
 ---
 
-## Input Fields You Will Receive
+## Input You Will Receive
+
+The messages after this one contain, in this order and only when available:
+- The project idea
+- `Similar project that compiled`: Files of an earlier project with a similar idea. Start from them and change what the new idea needs; when no agent output follows, they are your only plan
+- The output of each specialized agent, headed `<NAME> AGENT OUTPUT:`
+- `Parsed files`: Files generated by agents or Smith Agent previously
+- `Previous error`: The error returned by the Rust compiler on the last compiled project
+
+        """)
+
+
+REPAIR_SYSTEM_PROMPT = system_prompt("""
+You are the Smith Agent for Rustsmith, a tool that generates Rust projects.
+A project you generated failed to compile. You will receive the project idea, the current files and the errors returned by the Rust compiler.
+Fix the errors by changing as little as possible. Do not explain the errors, only output the changes.
+
+For every file you change, output a unified diff of that file:
+
+[PATCH: src/main.rs]
+```diff
+@@ -12,3 +12,3 @@
+ unchanged line
+-removed line
++added line
+ unchanged line
+```
+[END PATCH]
 
-- `agent_responses`: Output from specialized agents (if available){agent_responses}
-- `parsed_files`: Files generated by agents or Smith Agent previously{parsed_context}
-- `error_context`: The error returned by the Rust compiler on the last compiled project{error_context}
+**Important Rules**:
+- Copy context and removed lines exactly as they appear in the current file, with at least two context lines around every change
+- Only output files that change, files you do not mention are kept as they are
+- To add a new file or rewrite most of a file, output the whole file instead:
 
+[FILE: src/<module_name>.rs]
+```
+<content>
+```
+[END FILE]
+
+- If an error is about a dependency version, change the version in Cargo.toml to the one the compiler expects
+""")
+
+
+class SmithAgent(BaseAgent):
+    model = "llama3.1:8b"
+
+    def process(
+        self,
+        project_idea: str,
+        master_workflow: str,
+        context: List[Dict[str, Any]],
+        agent_responses: Dict[str, str] = {},
+        reference: Any = None,
+        **params: Any
+    ) -> str:
         """
+        Assemble the final Rust project using outputs from specialized agents
         
-        # Check if there are any errors in the context to fix
-       
-        # # Format agent responses
-        # agent_responses_str = ""
-        # for agent_name, response in agent_responses.items():
-        #     agent_responses_str += f"{agent_name.upper()} AGENT OUTPUT:\n{response}\n\n"
-        
-        user_message = f"""
-        Project idea: {project_idea}
+        Args:
+            project_idea (str): The user's project idea
+            master_workflow (str): The Master Agent's workflow description
+            agent_responses (dict): Dictionary of responses from specialized agents
+            context (list): List of past interactions including errors
+            reference (SimilarProject): A similar project that compiled, to start from
+            **params: Generation parameters for this call (temperature, seed, ...)
             
+        Returns:
+            str: Final assembled project with file paths and content
         """
-        
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message}
+        messages = self._build_messages(project_idea, master_workflow, context, agent_responses, reference)
+        # With past attempts in the context this is a repair, or a retry of an idea that failed
+        return self._complete(messages, use_cache=not context, **params)
+
+    def repair(
+        self,
+        project_idea: str,
+        files: Dict[str, str],
+        error: str,
+        **params: Any
+    ) -> str:
+        """
+        Ask for a fix of the current project as patches instead of the whole project
+
+        Args:
+            project_idea (str): The user's project idea
+            files (dict): Current file paths and contents
+            error (str): Compiler errors of the current files
+            **params: Generation parameters for this call (temperature, seed, ...)
+
+        Returns:
+            str: [PATCH: ...] diffs and [FILE: ...] replacements, see utils.patcher
+        """
+        messages = build_messages(
+            REPAIR_SYSTEM_PROMPT,
+            f"Project idea: {project_idea}",
+            f"Current files:\n{format_files(files)}",
+            f"Compiler errors:\n{error}"
+        )
+        return self._complete(messages, use_cache=False, **params)
+
+    def process_stream(
+        self,
+        project_idea: str,
+        master_workflow: str,
+        context: List[Dict[str, Any]],
+        agent_responses: Dict[str, str] = {},
+        on_file: Callable[[str, str], None] = None,
+        reference: Any = None,
+        **params: Any
+    ) -> Tuple[str, Dict[str, str]]:
+        """
+        Streaming variant of process, hands every file over as soon as its block closes
+
+        Args:
+            project_idea (str): The user's project idea
+            master_workflow (str): The Master Agent's workflow description
+            context (list): List of past interactions including errors
+            agent_responses (dict): Dictionary of responses from specialized agents
+            on_file (callable): Called with (file path, content) for each finished file
+            reference (SimilarProject): A similar project that compiled, to start from
+            **params: Generation parameters for this call (temperature, seed, ...)
+
+        Returns:
+            tuple: (full response text, dict mapping file paths to contents)
+        """
+        messages = self._build_messages(project_idea, master_workflow, context, agent_responses, reference)
+        extractor = ProtocolParser(EXTRA_TEXT_FILE)
+        for chunk in self._stream(messages, use_cache=not context, **params):
+            for filepath, content in extractor.feed(chunk):
+                if on_file:
+                    on_file(filepath, content)
+        for filepath, content in extractor.close():
+            if on_file:
+                on_file(filepath, content)
+        return self._visible(self.last_result.content), extractor.files
+
+    def _build_messages(
+        self,
+        project_idea: str,
+        master_workflow: str,
+        context: List[Dict[str, Any]],
+        agent_responses: Dict[str, str],
+        reference: Any = None
+    ) -> List[Dict[str, str]]:
+        # Ordered from least to most volatile so that consecutive repair
+        # requests share everything up to the previous files
+        agent_parts = [
+            f"{agent_name.upper()} AGENT OUTPUT:\n{response}"
+            for agent_name, response in agent_responses.items()
         ]
-        payload = json.dumps({
-    "model": "llama3.1:8b",
-    "messages": messages
-    
-})
-        
-        response = requests.post(endpoint, headers=self._prepare_headers(), data=payload)
-        if response.status_code == 200:
-            response_json = response.json()
-            # print('response_json', response_json)
-            if "choices" in response_json and len(response_json["choices"]) > 0:
-                response_text = response_json["choices"][0]["message"]["content"]
-                print("Response Text:\n", response_text)
-                return response_text
-            else:
-                print("Error: No valid response content from the API.")
-        else:
-            print(f"API Error: {response.status_code}, {response.text}")
\ No newline at end of file
+        answers = [item["answer"] for item in context if isinstance(item, dict) and item.get("answer")]
+        errors = [str(item["error"]).strip() for item in context if isinstance(item, dict) and item.get("error")]
+        messages = build_messages(
+            SYSTEM_PROMPT,
+            f"Project idea: {project_idea}",
+            format_reference(reference),
+            *agent_parts,
+            f"Parsed files:\n{format_answer(answers[-1])}" if answers else "",
+            "\n\n".join(f"Previous error:\n{error}" for error in errors)
+        )
+        return messages
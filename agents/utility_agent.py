@@ -2,40 +2,12 @@
 Utility Agent for Rustsmith
 Creates utility functions, implementations, and other general-purpose code
 """
-import openai
 from typing import List, Dict, Any
-from config import DEFAULT_MODEL, DEFAULT_TEMPERATURE, MAX_TOKENS
-import os
-import json
-import requests
-from dotenv import load_dotenv
-load_dotenv()
-class UtilityAgent:
-    def __init__(self):
-        self.base_url = "https://anura-testnet.lilypad.tech/api/v1/chat/completions"
-        self.api_key = os.getenv('ROUTER_API_KEY')
-    
-    
-    def _prepare_headers(self) -> Dict[str, str]:
-        return {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-    
-    def process(self, project_idea: str, task_description: str, context: List[Dict[str, Any]]) -> str:
-        endpoint = f"{self.base_url}"
-        """
-        Generate utility functions and implementations based on the project requirements
-        
-        Args:
-            project_idea (str): The user's project idea
-            task_description (str): Specific task description from the Master Agent
-            context (list): List of past interactions
-            
-        Returns:
-            str: Response with utility functions and implementations
-        """
-        system_message = """
+from agents.base_agent import BaseAgent
+from agents.prompts import system_prompt, build_messages, format_context
+
+
+SYSTEM_PROMPT = system_prompt("""
         You are the **Utility Agent** for **Rustsmith**, a tool that generates Rust projects.
 
 Your task is to create **utility functions**, **struct implementations**, and other **general-purpose code** required for the project.
@@ -59,50 +31,42 @@ Your task is to create **utility functions**, **struct implementations**, and ot
 - All comments should be **inside** the code block.
 - Do **not** include anything outside the code block.
 
+        """)
+
+
+class UtilityAgent(BaseAgent):
+    model = "qwen2.5-coder:7b"
+
+    def process(
+        self,
+        project_idea: str,
+        task_description: str,
+        context: List[Dict[str, Any]],
+        dependency_outputs: Dict[str, str] = None
+    ) -> str:
         """
-        
-        # Format the context for the prompt
-        context_str = ""
-        if context:
-            context_str = "Previous context:\n"
-            for item in context:
-                if isinstance(item, dict):
-                    question = item.get("question", "")
-                    answer = item.get("answer", "")
-                    error = item.get("error", "")
-                    context_str += f"Question: {question}\n"
-                    context_str += f"Answer: {answer}\n"
-                    if error:
-                        context_str += f"Error: {error}\n"
-                    context_str += "---\n"
-        
-        user_message = f"""
-        Project idea: {project_idea}
-        
-        Task description from Master Agent:
-        {task_description}
-        
-        {context_str}
+        Generate utility functions and implementations based on the project requirements
+
+        Args:
+            project_idea (str): The user's project idea
+            task_description (str): Specific task description from the Master Agent
+            context (list): List of past interactions
+            dependency_outputs (dict): Finished Struct/Type Agent outputs to build on
+
+        Returns:
+            str: Response with utility functions and implementations
         """
-        
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message}
+        # Give the definitions from the Struct and Type agents so the
+        # implementations match them
+        dependency_parts = [
+            f"{agent_name.upper()} AGENT OUTPUT (implement against these definitions):\n{output}"
+            for agent_name, output in (dependency_outputs or {}).items()
         ]
-        payload = json.dumps({
-    "model": "qwen2.5-coder:7b",
-    "messages": messages
-})
-        
-        response = requests.post(endpoint, headers=self._prepare_headers(), data=payload)
-        if response.status_code == 200:
-            response_json = response.json()
-            # print('response_json', response_json)
-            if "choices" in response_json and len(response_json["choices"]) > 0:
-                response_text = response_json["choices"][0]["message"]["content"]
-                print("Response Text:\n", response_text)
-                return response_text
-            else:
-                print("Error: No valid response content from the API.")
-        else:
-            print(f"API Error: {response.status_code}, {response.text}")
\ No newline at end of file
+        messages = build_messages(
+            SYSTEM_PROMPT,
+            f"Project idea: {project_idea}",
+            f"Task description from Master Agent:\n{task_description}",
+            *dependency_parts,
+            format_context(context)
+        )
+        return self._complete(messages)
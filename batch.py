@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Rustsmith batch mode - generate many projects from a JSONL file of ideas
+
+Each input line is a JSON object with the idea in "idea", "project_idea" or
+"title"/"body", and an optional "id" or "request_id". Every job gets its own
+output directory. One result line per finished job is appended to the
+results file, which doubles as the checkpoint: on restart, jobs that already
+have a result are skipped.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Set
+
+from database.mongodb import MongoDB
+from agents.response_cache import get_cache
+from utils.fixes import get_fix_store
+from utils.file_manager import output_subdirectory
+from utils.project_index import get_project_index
+from agents.prompts import prefix_tracker
+from pipeline import run_pipeline
+from utils.log import get_logger
+from utils.metrics import registry
+from config import MONGODB_URI, METRICS_PORT
+
+logger = get_logger("batch")
+
+
+def load_jobs(path: str) -> List[Dict[str, str]]:
+    """
+    Read the ideas file
+
+    Args:
+        path (str): JSONL file with one idea per line
+
+    Returns:
+        list: Jobs with "id" and "idea"
+    """
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            idea = record.get("idea") or record.get("project_idea")
+            if not idea:
+                idea = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            job_id = str(record.get("id") or record.get("request_id") or f"job-{line_number}")
+            jobs.append({"id": job_id, "idea": idea})
+    return jobs
+
+
+def load_checkpoint(results_path: str) -> Set[str]:
+    """
+    Ids of the jobs that already have a result
+
+    Jobs that raised an exception are not counted, so they run again.
+    """
+    finished = set()
+    if not os.path.exists(results_path):
+        return finished
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            if record.get("status") != "error":
+                finished.add(record["id"])
+    return finished
+
+
+def job_directory(output_root: str, job_id: str) -> str:
+    """Output directory of a job, the id made safe for the filesystem, see output_subdirectory"""
+    return output_subdirectory(output_root, job_id)
+
+
+def run_job(job: Dict[str, str], output_root: str, user_id: str, db) -> Dict[str, Any]:
+    """Run the pipeline for one job and describe the outcome"""
+    started_at = time.perf_counter()
+    record = {"id": job["id"], "idea": job["idea"], "output_dir": None}
+    try:
+        output_dir = record["output_dir"] = job_directory(output_root, job["id"])
+        result = run_pipeline(job["idea"], user_id, output_dir, db)
+        record.update({
+            "status": "ok" if result["success"] else "failed",
+            "attempts": result["attempts"],
+            "error": result["error"],
+            "stop_reason": result["stop_reason"],
+            "timings": result["timings"],
+            "repair": result["repair"]["per_attempt"],
+            "trace_id": result["trace_id"],
+        })
+    except Exception as e:
+        logger.exception("Job %s failed", job["id"])
+        record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    record["duration"] = time.perf_counter() - started_at
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Rust projects for every idea in a JSONL file")
+    parser.add_argument("ideas", help="JSONL file with one project idea per line")
+    parser.add_argument("--workers", type=int, default=4, help="Number of jobs running at the same time")
+    parser.add_argument("--output-root", default="batch_output", help="Directory holding one output directory per job")
+    parser.add_argument("--results", default=None, help="Results JSONL, also the checkpoint (default: <output-root>/results.jsonl)")
+    parser.add_argument("--user-id", default="batch", help="User id the attempts are stored under")
+    parser.add_argument("--no-db", action="store_true", help="Do not store attempts in MongoDB")
+    args = parser.parse_args()
+
+    results_path = args.results or os.path.join(args.output_root, "results.jsonl")
+    os.makedirs(args.output_root, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+
+    jobs = load_jobs(args.ideas)
+    finished = load_checkpoint(results_path)
+    pending = [job for job in jobs if job["id"] not in finished]
+    logger.info("%d jobs, %d already finished, %d to run", len(jobs), len(jobs) - len(pending), len(pending))
+
+    if METRICS_PORT:
+        registry.serve(METRICS_PORT)
+    db = None if args.no_db or not MONGODB_URI else MongoDB(MONGODB_URI)
+    started_at = time.perf_counter()
+
+    with open(results_path, "a", encoding="utf-8") as results, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(run_job, job, args.output_root, args.user_id, db): job for job in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            results.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results.flush()
+            os.fsync(results.fileno())
+            logger.info("[%d/%d] %s: %s in %.1fs", done, len(pending), record['id'], record['status'], record['duration'])
+
+    logger.info("Batch finished in %.1fs, results in %s", time.perf_counter() - started_at, results_path)
+    logger.info("Response cache: %s", get_cache().stats())
+    logger.info("Fix store: %s", get_fix_store().stats())
+    logger.info("Project index: %s", get_project_index().stats())
+    logger.info("Prompt prefix reuse: %s", prefix_tracker.stats())
+
+
+if __name__ == "__main__":
+    main()
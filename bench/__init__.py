@@ -0,0 +1,3 @@
+"""
+Benchmark harness for Rustsmith: record/replay mock endpoint and pipeline runner
+"""
@@ -0,0 +1,286 @@
+"""
+Mock OpenAI-compatible chat completions server for Rustsmith benchmarks
+
+In record mode every request is forwarded to the real endpoint and the
+exchange is appended to a fixtures file. In replay mode the recorded
+responses are served with a configurable latency, so pipeline runs are
+reproducible and cost nothing.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional
+
+import requests
+
+from agents.response_cache import ResponseCache
+
+
+def system_hash(messages: List[Dict[str, str]]) -> str:
+    """Short hash of the system prompt, identifies the agent that sent a request"""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    return hashlib.sha1(system.encode("utf-8")).hexdigest()[:12]
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Key of a request, independent of streaming"""
+    params = {k: v for k, v in payload.items() if k not in ("model", "messages", "stream", "stream_options")}
+    return ResponseCache.make_key(payload.get("model"), payload.get("messages", []), params)
+
+
+class LatencyModel:
+    """
+    Seeded latency distribution of the mock endpoint
+
+    Specs: "recorded" (latency measured while recording), "fixed:S",
+    "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA", all in seconds. An
+    optional tokens-per-second rate paces the stream after the first token.
+    """
+    def __init__(self, spec: str = "recorded", tokens_per_second: float = 0.0, seed: int = 0):
+        self.kind, _, arguments = spec.partition(":")
+        self.arguments = [float(a) for a in arguments.split(",") if a]
+        self.tokens_per_second = tokens_per_second
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        if self.kind not in ("recorded", "fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def first_token(self, recorded: float) -> float:
+        """Delay before the first byte of a response"""
+        with self._lock:
+            if self.kind == "fixed":
+                return self.arguments[0]
+            if self.kind == "uniform":
+                return self._random.uniform(self.arguments[0], self.arguments[1])
+            if self.kind == "lognormal":
+                median, sigma = self.arguments
+                return self._random.lognormvariate(0.0, sigma) * median
+            return recorded
+
+
+class FixtureStore:
+    """
+    Recorded exchanges, looked up by exact request first
+
+    A request that was never recorded (different compiler output, new
+    context) gets the next recorded response of the same model and system
+    prompt, cycling through them in recording order.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.exact = {}
+        self.by_agent = defaultdict(list)
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+        self.stats = {"exact": 0, "fallback": 0, "miss": 0}
+        if path:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            self._index(json.loads(line))
+            except FileNotFoundError:
+                pass
+
+    def _index(self, fixture: Dict[str, Any]):
+        self.exact[fixture["key"]] = fixture
+        self.by_agent[(fixture["model"], fixture["system_hash"])].append(fixture)
+
+    def __len__(self) -> int:
+        return len(self.exact)
+
+    def lookup(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            fixture = self.exact.get(request_key(payload))
+            if fixture is not None:
+                self.stats["exact"] += 1
+                return fixture
+            candidates = self.by_agent.get((payload.get("model"), system_hash(payload.get("messages", []))))
+            if not candidates:
+                self.stats["miss"] += 1
+                return None
+            agent = (payload.get("model"), system_hash(payload.get("messages", [])))
+            fixture = candidates[self._cursor[agent] % len(candidates)]
+            self._cursor[agent] += 1
+            self.stats["fallback"] += 1
+            return fixture
+
+    def record(self, payload: Dict[str, Any], content: str, usage: Dict[str, Any], latency: float):
+        fixture = {
+            "key": request_key(payload),
+            "model": payload.get("model"),
+            "system_hash": system_hash(payload.get("messages", [])),
+            "messages": payload.get("messages", []),
+            "content": content,
+            "usage": usage,
+            "latency": latency,
+        }
+        with self._lock:
+            self._index(fixture)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(fixture, ensure_ascii=False) + "\n")
+
+
+class MockServer:
+    """
+    Chat completions endpoint in a background thread
+
+    Args:
+        fixtures (FixtureStore): Recorded exchanges
+        latency (LatencyModel): Delay applied in replay mode
+        upstream (str): Real endpoint to forward to and record from, None to replay
+        api_key (str): Bearer token for the upstream
+        port (int): Port to listen on, 0 picks a free one
+    """
+    def __init__(self, fixtures: FixtureStore, latency: LatencyModel = None, upstream: str = None,
+                 api_key: str = "", host: str = "127.0.0.1", port: int = 0):
+        self.fixtures = fixtures
+        self.latency = latency or LatencyModel()
+        self.upstream = upstream
+        self.api_key = api_key
+        self.calls = defaultdict(int)
+        self._calls_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_calls(self) -> Dict[str, int]:
+        """Return and clear the per-model request counts"""
+        with self._calls_lock:
+            calls = dict(self.calls)
+            self.calls.clear()
+        return calls
+
+    def _forward(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        started_at = time.monotonic()
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        upstream_payload = {k: v for k, v in payload.items() if k not in ("stream", "stream_options")}
+        response = requests.post(self.upstream, headers=headers, json=upstream_payload, timeout=600)
+        if response.status_code != 200:
+            return None
+        body = response.json()
+        content = body["choices"][0]["message"]["content"]
+        usage = body.get("usage") or {}
+        self.fixtures.record(payload, content, usage, time.monotonic() - started_at)
+        return {"content": content, "usage": usage, "latency": 0.0}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, content: str, usage: Dict[str, Any], model: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+                # 16 characters are about 4 tokens
+                delay = 4.0 / server.latency.tokens_per_second if server.latency.tokens_per_second else 0.0
+                for piece in pieces:
+                    chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if delay:
+                        time.sleep(delay)
+                final = {"model": model, "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                model = payload.get("model", "")
+                with server._calls_lock:
+                    server.calls[model] += 1
+
+                if server.upstream:
+                    fixture = server._forward(payload)
+                else:
+                    fixture = server.fixtures.lookup(payload)
+                    if fixture is not None:
+                        time.sleep(server.latency.first_token(fixture.get("latency", 0.0)))
+                if fixture is None:
+                    self._send_json(404, {"error": {"message": f"No fixture for model {model}"}})
+                    return
+
+                if payload.get("stream"):
+                    self._send_stream(fixture["content"], fixture.get("usage") or {}, model)
+                    return
+                if server.latency.tokens_per_second and not server.upstream:
+                    time.sleep(len(fixture["content"]) / 4.0 / server.latency.tokens_per_second)
+                self._send_json(200, {
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": fixture["content"]}, "finish_reason": "stop"}],
+                    "usage": fixture.get("usage") or {},
+                })
+
+        return Handler
+
+
+def main():
+    from config import LLM_BASE_URL, LLM_API_KEY
+
+    parser = argparse.ArgumentParser(description="Record or replay agent completions")
+    parser.add_argument("fixtures", help="Fixtures JSONL file")
+    parser.add_argument("--record", action="store_true", help="Forward to the real endpoint and record the exchanges")
+    parser.add_argument("--upstream", default=LLM_BASE_URL, help="Endpoint to record from (default: LLM_BASE_URL)")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="recorded", help='"recorded", "fixed:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA"')
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Output rate after the first token, 0 for instant")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockServer(
+        FixtureStore(args.fixtures),
+        LatencyModel(args.latency, args.tokens_per_second, args.seed),
+        upstream=args.upstream if args.record else None,
+        api_key=LLM_API_KEY,
+        port=args.port
+    )
+    print(f"{'Recording' if args.record else 'Replaying'} {len(server.fixtures)} fixtures at {server.url}")
+    print(f"Point Rustsmith at it with LLM_BASE_URL={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Fixture lookups:", server.fixtures.stats)
+
+
+if __name__ == "__main__":
+    main()
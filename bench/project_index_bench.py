@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the similar-project index in utils/project_index.py
+
+Indexes generated projects of growing count and times lookups of paraphrased
+ideas. Reports the mean and p95 lookup latency and how often the project a
+paraphrase was made from is the best match.
+
+    python -m bench.project_index_bench --sizes 1000,5000 --queries 500
+"""
+import argparse
+import random
+import time
+
+from utils.project_index import ProjectIndex
+
+SUBJECTS = ["todo list", "calculator", "bank account", "inventory", "chat server", "snake game", "markdown parser",
+            "weather client", "password manager", "file encryptor", "url shortener", "matrix library", "tic tac toe",
+            "library catalog", "expense tracker", "json validator", "port scanner", "image resizer", "quiz game"]
+FEATURES = ["with persistence to a file", "over tcp", "with a command line interface", "with unit conversions",
+            "that reads csv input", "with undo support", "using async io", "with colored output", "with user accounts",
+            "with a REST api", "with search and filters", "that exports reports", "with multiple players"]
+VERBS = ["A", "Build a", "Create a", "Write a", "Make a", "Simple"]
+
+
+def generate_idea(rnd: random.Random) -> str:
+    return f"{rnd.choice(VERBS)} {rnd.choice(SUBJECTS)} {' and '.join(rnd.sample(FEATURES, rnd.randint(1, 3)))}"
+
+
+def paraphrase(idea: str, rnd: random.Random) -> str:
+    """Drop one word other than the first, the way a user would restate an idea more loosely"""
+    words = idea.split()
+    del words[rnd.randrange(1, len(words))]
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the similar-project index")
+    parser.add_argument("--sizes", default="1000,5000", help="Indexed projects, comma separated")
+    parser.add_argument("--queries", type=int, default=500, help="Lookups per size")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated ideas")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    files = {"Cargo.toml": "[package]\nname = \"demo\"\n", "src/main.rs": "struct App;\nfn main() {}\n"}
+    print(f"{'projects':>9}{'index s':>9}{'mean ms':>9}{'p95 ms':>8}{'top-1':>7}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        index = ProjectIndex(path="", max_entries=size)
+        ideas = [f"{generate_idea(rnd)} #{number}" for number in range(size)]
+        started_at = time.perf_counter()
+        for idea in ideas:
+            index.add(idea, files)
+        indexed = time.perf_counter() - started_at
+
+        latencies, found = [], 0
+        for idea in rnd.sample(ideas, min(args.queries, size)):
+            query = paraphrase(idea, rnd)
+            started_at = time.perf_counter()
+            best = index.search(query, limit=1)
+            latencies.append(time.perf_counter() - started_at)
+            found += bool(best) and best[0].idea == idea
+        latencies.sort()
+        mean = 1000 * sum(latencies) / len(latencies)
+        p95 = 1000 * latencies[int(0.95 * (len(latencies) - 1))]
+        print(f"{size:>9}{indexed:>9.2f}{mean:>9.3f}{p95:>8.3f}{found / len(latencies):>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the agent response tokenizer in utils/protocol.py
+
+Generates Smith and Master responses of growing size and times parsing them
+at once and in streaming-sized chunks. The parse time should grow linearly
+with the response; the run fails if the slope of log(time) over log(size),
+fitted over all sizes, is more than --tolerance above 1. A quadratic parser
+has a slope of 2, timer noise on a single size barely moves it.
+
+    python -m bench.protocol_bench --sizes 1,2,4,8 --chunk 64
+"""
+import argparse
+import math
+import random
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+from utils.protocol import ProtocolParser, parse_response
+
+LINES = [
+    "    let mut total = 0;",
+    "    for item in &self.items {",
+    "        total += item.len();",
+    "    }",
+    "/// Returns the number of items",
+    "pub fn len(&self) -> usize {",
+    "    println!(\"{}: {}\", self.name, total);",
+    "}",
+    "",
+]
+
+
+def smith_response(size: int, rnd: random.Random) -> str:
+    """Files of 20 to 200 lines, some with a missing [END FILE] or a nested fence"""
+    parts = []
+    length = 0
+    index = 0
+    while length < size:
+        body = [rnd.choice(LINES) for _ in range(rnd.randint(20, 200))]
+        if index % 7 == 3:
+            body[len(body) // 2:len(body) // 2] = ["/// ```", "/// assert!(true);", "/// ```"]
+        block = f"[FILE: src/module_{index}.rs]\n```rust\n" + "\n".join(body) + "\n```\n"
+        if index % 5:
+            block += "[END FILE]\n"
+        parts.append(block)
+        length += len(block)
+        index += 1
+    return "".join(parts)
+
+
+def master_response(size: int, rnd: random.Random) -> str:
+    """Sections with long task descriptions"""
+    parts = []
+    length = 0
+    while length < size:
+        for name in ("STRUCT", "TYPE", "UTILITY"):
+            body = "\n".join(rnd.choice(LINES).strip() or "Implement it." for _ in range(rnd.randint(50, 500)))
+            section = f"[{name}_AGENT]\n{body}\n[/{name}_AGENT]\n"
+            parts.append(section)
+            length += len(section)
+    return "".join(parts)
+
+
+def parse_chunked(text: str, chunk: int):
+    parser = ProtocolParser("src/README.md")
+    for start in range(0, len(text), chunk):
+        parser.feed(text[start:start + chunk])
+    parser.close()
+
+
+def median_time(function: Callable[[], None], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started_at)
+    return statistics.median(times)
+
+
+def growth_slope(sizes: List[float], times: List[float]) -> float:
+    """Least-squares slope of log(time) over log(size), 1 for linear growth"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(elapsed, 1e-9)) for elapsed in times]
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent response tokenizer")
+    parser.add_argument("--sizes", default="1,2,4,8", help="Response sizes in MB, comma separated")
+    parser.add_argument("--chunk", type=int, default=64, help="Characters per streamed chunk")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case, the median is reported")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed excess of the fitted slope over 1")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated responses")
+    args = parser.parse_args()
+
+    sizes = [float(size) for size in args.sizes.split(",")]
+    if len(set(sizes)) < 2:
+        parser.error("--sizes needs at least two different sizes")
+    rnd = random.Random(args.seed)
+    print(f"{'response':<10}{'MB':>6}{'whole s':>10}{'s/MB':>8}{'chunked s':>11}{'s/MB':>8}")
+    measured: List[List[float]] = []
+    for kind, generate in (("smith", smith_response), ("master", master_response)):
+        for size in sizes:
+            text = generate(int(size * 1024 * 1024), rnd)
+            megabytes = len(text) / (1024 * 1024)
+            whole = median_time(lambda: parse_response(text, "src/README.md"), args.repeat)
+            streamed = median_time(lambda: parse_chunked(text, args.chunk), args.repeat)
+            measured.append([kind, megabytes, whole, streamed])
+            print(f"{kind:<10}{megabytes:>6.1f}{whole:>10.3f}{whole / megabytes:>8.3f}"
+                  f"{streamed:>11.3f}{streamed / megabytes:>8.3f}")
+
+    failed = False
+    for kind in ("smith", "master"):
+        rows = [row for row in measured if row[0] == kind]
+        for column, mode in ((2, "whole"), (3, "chunked")):
+            slope = growth_slope([row[1] for row in rows], [row[column] for row in rows])
+            print(f"{kind} {mode}: parse time grows with size^{slope:.2f}")
+            if slope > 1 + args.tolerance:
+                failed = True
+    if failed:
+        sys.exit(1)
+    print("Parse time grows linearly with the response size")
+
+
+if __name__ == "__main__":
+    main()
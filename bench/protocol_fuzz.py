@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Fuzzer for the agent response tokenizer in utils/protocol.py
+
+Mutates the responses in bench/corpus/protocol (dropped tags and fences,
+nested fences, truncation, stray tags, CRLF line ends) and checks that the
+parser never raises, that feeding the response in random chunks gives the
+same result as feeding it at once, and that files written back in the
+canonical format parse to the same files.
+
+    python -m bench.protocol_fuzz --iterations 20000 --seed 1
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+from typing import List
+
+from utils.protocol import ProtocolParser, parse_response
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus", "protocol")
+
+STRAY_LINES = [
+    "[END FILE]", "```", "```rust", "```toml", "[FILE: src/extra.rs]", "[FILE:]",
+    "[PATCH: src/main.rs]", "[END PATCH]", "@@ -1,2 +1,2 @@", "-fn old() {}", "+fn new() {}",
+    "[STRUCT_AGENT]", "[/STRUCT_AGENT]", "[TYPE_AGENT]", "[/UTILITY_AGENT]", "[FOO_AGENT]",
+    "", "    ", "fn main() {}", "Some commentary from the model.",
+]
+
+
+def load_corpus(directory: str = CORPUS_DIR) -> List[str]:
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def mutate(text: str, rnd: random.Random) -> str:
+    """Apply one to four random mutations"""
+    for _ in range(rnd.randint(1, 4)):
+        lines = text.split("\n")
+        operation = rnd.randrange(8)
+        index = rnd.randrange(len(lines))
+        if operation == 0:
+            del lines[index]
+        elif operation == 1:
+            lines.insert(index, lines[rnd.randrange(len(lines))])
+        elif operation == 2:
+            lines.insert(index, rnd.choice(STRAY_LINES))
+        elif operation == 3:
+            # Drop every closing tag or fence of one kind
+            marker = rnd.choice(["[END FILE]", "```", "[/"])
+            lines = [line for line in lines if not line.strip().startswith(marker) or rnd.random() < 0.5]
+        elif operation == 4:
+            text = text[:rnd.randrange(len(text) + 1)]
+            continue
+        elif operation == 5:
+            line = lines[index]
+            cut = rnd.randrange(len(line) + 1)
+            lines[index] = line[:cut] + rnd.choice(STRAY_LINES) + line[cut:]
+        elif operation == 6:
+            text = text.replace("\n", "\r\n")
+            continue
+        else:
+            lines[index:index] = ["```rust", "let nested = true;", "```"]
+        text = "\n".join(lines)
+    return text
+
+
+def chunked(text: str, rnd: random.Random) -> ProtocolParser:
+    parser = ProtocolParser("src/README.md")
+    position = 0
+    while position < len(text):
+        size = rnd.choice([1, 2, 7, 64, 4096])
+        parser.feed(text[position:position + size])
+        position += size
+    parser.close()
+    return parser
+
+
+def canonical(files) -> str:
+    return "\n".join(f"[FILE: {path}]\n```\n{content}\n```\n[END FILE]" for path, content in files.items())
+
+
+def round_trips(content: str) -> bool:
+    """Content without lines the protocol would read as tags or fences"""
+    return not any(line.strip().startswith(("```", "[FILE:", "[END FILE]", "[PATCH:", "[END PATCH]")) for line in content.split("\n"))
+
+
+def check(text: str, rnd: random.Random) -> str:
+    """
+    Returns:
+        str: Description of the first broken invariant, empty if none
+    """
+    whole = parse_response(text, "src/README.md")
+    pieces = chunked(text, rnd)
+    if (pieces.files, pieces.patches, pieces.sections) != (whole.files, whole.patches, whole.sections):
+        return "chunked parse differs from the whole parse"
+    for path, content in whole.files.items():
+        if content != content.strip():
+            return f"{path} is not stripped"
+    files = {path: content for path, content in whole.files.items()
+             if path != "src/README.md" and round_trips(content)}
+    if parse_response(canonical(files)).files != files:
+        return "canonical files do not parse back"
+    return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the agent response tokenizer")
+    parser.add_argument("--iterations", type=int, default=10000, help="Mutated responses to check")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Directory with the seed responses")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        sys.exit(f"No seed responses in {args.corpus}")
+    rnd = random.Random(args.seed)
+    for iteration in range(args.iterations):
+        text = mutate(rnd.choice(corpus), rnd)
+        try:
+            problem = check(text, rnd)
+        except Exception as e:
+            problem = f"{type(e).__name__}: {e}"
+        if problem:
+            print(f"Iteration {iteration}: {problem}\n--- input ---\n{text}")
+            sys.exit(1)
+    print(f"{args.iterations} mutated responses from {len(corpus)} seeds parsed without errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Outage check for the router in agents/router.py
+
+Sends requests through a two-route pool on a simulated clock while the
+primary backend fails, then brings it back. Checks that the primary is
+demoted during the outage, that the traffic falls back to the second route,
+and that the primary takes the traffic again once its failures are older
+than the stats age limit. Exits with status 1 if it does not.
+
+    python -m bench.router_recovery --max-age 300 --outage 60
+"""
+import argparse
+import logging
+import sys
+from typing import List, Dict, Any
+
+from agents.llm_client import LLMResult
+from agents.router import Router, BackendStats
+
+
+class Clock:
+    """Simulated time, advanced by hand"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeClient:
+    """Chat client that answers at once, or fails while it is down"""
+    def __init__(self):
+        self.down = False
+        self.calls = 0
+
+    def chat(self, model: str, messages: List[Dict[str, str]], timeout: float = None, **params: Any) -> LLMResult:
+        self.calls += 1
+        if self.down:
+            return LLMResult(ok=False, model=model, status_code=503, error="HTTP 503", latency=0.01)
+        return LLMResult(ok=True, model=model, content="ok", latency=0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a demoted route recovers after an outage")
+    parser.add_argument("--max-age", type=float, default=300, help="Seconds samples count for")
+    parser.add_argument("--outage", type=float, default=60, help="Seconds the primary backend is down")
+    parser.add_argument("--interval", type=float, default=1, help="Seconds between requests")
+    args = parser.parse_args()
+    # Every request of the outage falls back, one log line each
+    logging.getLogger("rustsmith.router").setLevel(logging.WARNING)
+
+    clock = Clock()
+    primary, secondary = FakeClient(), FakeClient()
+    router = Router({"primary": primary, "secondary": secondary}, {"smith": ["primary/a", "secondary/b"]})
+    for route in router.routes("smith", "a"):
+        route.stats = BackendStats(max_age=args.max_age, clock=clock)
+    messages = [{"role": "user", "content": "ping"}]
+
+    def first_route() -> str:
+        return router.routes("smith", "a")[0].name
+
+    primary.down = True
+    while clock.now < args.outage:
+        result = router.chat("smith", "a", messages)
+        if not result.ok:
+            sys.exit(f"t={clock.now:.0f}s: request failed during the outage: {result.error}")
+        clock.now += args.interval
+    if first_route() != "secondary/b":
+        sys.exit(f"t={clock.now:.0f}s: primary not demoted after {args.outage:.0f}s of errors")
+    print(f"t={clock.now:.0f}s: primary demoted after {primary.calls} failed requests")
+
+    primary.down = False
+    demoted_calls = primary.calls
+    recovered_at = None
+    while clock.now < args.outage + args.max_age + args.interval * 2:
+        router.chat("smith", "a", messages)
+        if first_route() == "primary/a":
+            recovered_at = clock.now
+            break
+        clock.now += args.interval
+    if recovered_at is None:
+        print(f"t={clock.now:.0f}s: primary still demoted, {primary.calls - demoted_calls} requests sent to it since the outage")
+        sys.exit(1)
+    print(f"t={recovered_at:.0f}s: primary back in front, {recovered_at - args.outage:.0f}s after the outage ended")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Rustsmith pipeline benchmark
+
+Runs the full pipeline for a set of ideas against the mock endpoint in
+bench/mock_server.py and reports per-stage latency, API calls per project
+and repair iterations. With --record the mock forwards to the real endpoint
+and stores the transcripts as fixtures for later replays.
+
+    python -m bench.run bench/fixtures/smoke.jsonl --record --idea "a todo list cli"
+    python -m bench.run bench/fixtures/smoke.jsonl --latency fixed:0.5 --runs 3 --output before.json
+    python -m bench.run bench/fixtures/smoke.jsonl --latency fixed:0.5 --runs 3 --compare before.json
+"""
+import argparse
+import json
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any
+
+STAGES = ["similar", "master", "agents", "smith", "parse", "save", "compile", "fixes", "speculative", "db"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate the runs
+
+    Returns:
+        dict: mean, p50 and p95 of every stage, the total, API calls and repair iterations
+    """
+    metrics = {stage: [run["timings"].get(stage, 0.0) for run in runs] for stage in STAGES}
+    metrics["total"] = [run["duration"] for run in runs]
+    metrics["api_calls"] = [run["api_calls"] for run in runs]
+    metrics["attempts"] = [run["attempts"] for run in runs]
+    metrics["success"] = [1.0 if run["success"] else 0.0 for run in runs]
+    return {
+        name: {"mean": statistics.fmean(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+        for name, values in metrics.items() if values and any(values)
+    }
+
+
+def format_report(summary: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]] = None) -> str:
+    lines = [f"{'metric':<12}{'mean':>10}{'p50':>10}{'p95':>10}" + (f"{'baseline':>10}{'change':>9}" if baseline else "")]
+    for name, values in summary.items():
+        line = f"{name:<12}{values['mean']:>10.3f}{values['p50']:>10.3f}{values['p95']:>10.3f}"
+        if baseline and name in baseline:
+            before = baseline[name]["mean"]
+            change = f"{(values['mean'] - before) / before:+.1%}" if before else "n/a"
+            line += f"{before:>10.3f}{change:>9}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def fixture_ideas(fixtures) -> List[str]:
+    """Project ideas found in the recorded requests, in recording order"""
+    ideas = []
+    for candidates in fixtures.by_agent.values():
+        for fixture in candidates:
+            for message in fixture["messages"]:
+                content = message.get("content", "").strip()
+                if message.get("role") == "user" and content.startswith("Project idea:"):
+                    idea = content[len("Project idea:"):].strip().split("\n")[0]
+                    if idea not in ideas:
+                        ideas.append(idea)
+    return ideas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Rustsmith pipeline against recorded completions")
+    parser.add_argument("fixtures", help="Fixtures JSONL file, written in --record mode")
+    parser.add_argument("--record", action="store_true", help="Call the real endpoint and record the exchanges")
+    parser.add_argument("--idea", action="append", default=[], help="Project idea to run, repeatable (default: every idea in the fixtures)")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per idea")
+    parser.add_argument("--latency", default="recorded", help='"recorded", "fixed:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA"')
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Output rate after the first token, 0 for instant")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency distribution")
+    parser.add_argument("--output", help="Write the runs and the summary as JSON")
+    parser.add_argument("--compare", help="JSON written by an earlier --output to compare against")
+    args = parser.parse_args()
+
+    # The agents bind their settings when the pipeline is imported, point
+    # them at the mock before that. The response cache, the fix store and the
+    # similar-project index would hide the API calls being measured
+    import config
+    upstream = config.LLM_BASE_URL
+    port = free_port()
+    config.LLM_BASE_URL = f"http://127.0.0.1:{port}/v1/chat/completions"
+    config.RESPONSE_CACHE_ENABLED = False
+    config.FIX_STORE_ENABLED = False
+    config.PROJECT_INDEX_ENABLED = False
+
+    from bench.mock_server import MockServer, FixtureStore, LatencyModel
+    from pipeline import run_pipeline
+
+    fixtures = FixtureStore(args.fixtures)
+    server = MockServer(
+        fixtures,
+        LatencyModel(args.latency, args.tokens_per_second, args.seed),
+        upstream=upstream if args.record else None,
+        api_key=config.LLM_API_KEY,
+        port=port
+    ).start()
+
+    ideas = args.idea or fixture_ideas(fixtures)
+    if not ideas:
+        sys.exit("No ideas given and none found in the fixtures")
+
+    runs = []
+    try:
+        for run_index in range(args.runs):
+            for idea in ideas:
+                output_dir = tempfile.mkdtemp(prefix="rustsmith-bench-")
+                server.reset_calls()
+                started_at = time.perf_counter()
+                try:
+                    result = run_pipeline(idea, "bench", output_dir, db=None)
+                finally:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                calls = server.reset_calls()
+                runs.append({
+                    "idea": idea,
+                    "run": run_index,
+                    "duration": time.perf_counter() - started_at,
+                    "timings": result["timings"],
+                    "api_calls": sum(calls.values()),
+                    "calls_per_model": calls,
+                    "attempts": result["attempts"],
+                    "success": result["success"],
+                })
+                print(f"[bench] {idea[:40]!r} run {run_index}: {runs[-1]['duration']:.2f}s, "
+                      f"{runs[-1]['api_calls']} API calls, {result['attempts']} attempts")
+    finally:
+        server.stop()
+
+    summary = summarize(runs)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["summary"]
+    print(f"\n{len(runs)} runs, latency {args.latency}, fixture lookups {fixtures.stats}")
+    print(format_report(summary, baseline))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "settings": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                             "seed": args.seed, "runs": args.runs, "fixtures": args.fixtures},
+                "runs": runs,
+                "summary": summary,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
 """
 Configuration settings for Rustsmith
 """
+import json
 import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env file if it exists
 load_dotenv()
 
+
+def _per_model(name, cast):
+    """Parse a "model=value,model=value" setting"""
+    return {
+        model.strip(): cast(value)
+        for model, _, value in (entry.rpartition("=") for entry in os.getenv(name, "").split(",") if entry.strip())
+    }
+
+
 # MongoDB connection
 MONGODB_URI = os.getenv("MONGODB_URI", "")
 MONGODB_DB = os.getenv("MONGODB_DB", "rustsmith")
@@ -16,3 +26,171 @@ MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "user_contexts")
 # Project output directory
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", os.path.join(os.path.dirname(__file__), "output"))
 
+# LLM endpoint (OpenAI compatible chat completions)
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://anura-testnet.lilypad.tech/api/v1/chat/completions")
+LLM_API_KEY = os.getenv("ROUTER_API_KEY", "")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+
+# Generation settings per agent role (master, struct, type, utility, smith),
+# see agents/generation.py. Per-role values are "role=value,role=value";
+# AGENT_STOP is JSON ({"role": ["stop", ...]}) since stop sequences may hold
+# commas. AGENT_REASONING is "keep", "strip" (drop <think> blocks from the
+# output) or "disable" (also send REASONING_DISABLE_PARAMS, which must be set
+# since the switch depends on the backend; the output is still stripped for
+# endpoints ignoring it). REASONING_OPEN_ROLES lists the roles whose chat
+# template opens the <think> block in the prompt
+AGENT_MAX_TOKENS = {
+    "master": 2048, "struct": 4096, "type": 4096, "utility": 4096, "smith": 8192,
+    **_per_model("AGENT_MAX_TOKENS", int)
+}
+AGENT_MAX_TOKENS_DEFAULT = int(os.getenv("AGENT_MAX_TOKENS_DEFAULT", "4096"))
+AGENT_TEMPERATURE = _per_model("AGENT_TEMPERATURE", float)
+AGENT_TEMPERATURE_DEFAULT = float(os.getenv("AGENT_TEMPERATURE_DEFAULT", "0.2"))
+AGENT_STOP = json.loads(os.getenv("AGENT_STOP", "{}"))
+AGENT_REASONING = _per_model("AGENT_REASONING", str)
+AGENT_REASONING_DEFAULT = os.getenv("AGENT_REASONING_DEFAULT", "strip")
+REASONING_DISABLE_PARAMS = json.loads(os.getenv("REASONING_DISABLE_PARAMS") or "{}")
+REASONING_OPEN_ROLES = [r.strip() for r in os.getenv("REASONING_OPEN_ROLES", "").split(",") if r.strip()]
+
+# Stream the Smith agent's completion and write files as their blocks close
+STREAM_COMPLETIONS = os.getenv("STREAM_COMPLETIONS", "false").lower() in ("1", "true", "yes")
+
+# On-disk cache of agent completions, keyed on model, messages and parameters;
+# repair calls are never cached, a replayed fix would fail the same way
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rustsmith", "responses"))
+RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Cargo target directory shared by every generated project, so dependency
+# crates are compiled once per machine and cargo slot (see CARGO_MAX_PARALLEL).
+# Empty keeps cargo's per-project target/
+CARGO_TARGET_DIR = os.getenv("CARGO_TARGET_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rustsmith", "target"))
+# "incremental" runs `cargo check` in the repair loop and `cargo build` only on
+# the final candidate, "build" runs `cargo build` every time
+COMPILE_MODE = os.getenv("COMPILE_MODE", "incremental")
+# Local crate mirror filled by prewarm.py: "auto" builds offline against it
+# when it has every dependency of a project, "offline" always does, "off"
+# never uses it
+CRATE_MIRROR = os.getenv("CRATE_MIRROR", "auto")
+CRATE_VENDOR_DIR = os.getenv("CRATE_VENDOR_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rustsmith", "vendor"))
+# Crates vendored and pre-built by prewarm.py, "name@version" with optional ":feature+feature"
+COMMON_CRATES = [c for c in os.getenv(
+    "COMMON_CRATES",
+    "serde@1:derive,serde_json@1,clap@4:derive,rand@0.8,chrono@0.4,regex@1,anyhow@1,thiserror@1"
+).split(",") if c.strip()]
+# Validate the manifest, module files and delimiters before starting cargo
+PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Number of ranked compiler errors passed on to the repair prompt
+MAX_DIAGNOSTICS = int(os.getenv("MAX_DIAGNOSTICS", "5"))
+
+# Token budget for the repair history sent to the agents
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+# Limits of the repair loop, 0 disables a limit; the seconds count from the
+# start of the request, the first generation included
+REPAIR_MAX_ATTEMPTS = int(os.getenv("REPAIR_MAX_ATTEMPTS", "8"))
+REPAIR_MAX_SECONDS = float(os.getenv("REPAIR_MAX_SECONDS", "1800"))
+REPAIR_MAX_TOKENS = int(os.getenv("REPAIR_MAX_TOKENS", "200000"))
+# Stop once the same set of errors has been seen this many times
+REPAIR_MAX_REPEATS = int(os.getenv("REPAIR_MAX_REPEATS", "3"))
+
+# Per-job build roots, on tmpfs when /dev/shm is available
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "/dev/shm/rustsmith" if os.path.isdir("/dev/shm") else "")
+KEEP_WORKSPACES = os.getenv("KEEP_WORKSPACES", "false").lower() in ("1", "true", "yes")
+# Machine-wide number of cargo invocations running at the same time, each
+# gets an equal share of the cores as its jobserver limit
+CARGO_MAX_PARALLEL = int(os.getenv("CARGO_MAX_PARALLEL", str(max(1, (os.cpu_count() or 1) // 4))))
+CARGO_LOCK_DIR = os.getenv("CARGO_LOCK_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rustsmith", "locks"))
+
+# Speculative repair: number of candidate fixes requested and compiled in
+# parallel per repair iteration (1 disables it) and the temperatures they use;
+# the candidates follow REPAIR_OUTPUT_MODE below
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+SPECULATIVE_TEMPERATURES = [float(t) for t in os.getenv("SPECULATIVE_TEMPERATURES", "0.2,0.6,0.9").split(",")]
+
+# Output of the repair iterations: "patch" asks the Smith Agent for diffs of
+# the files it changes and falls back to the whole project when a patch does
+# not apply, "full" always regenerates the whole project
+REPAIR_OUTPUT_MODE = os.getenv("REPAIR_OUTPUT_MODE", "patch")
+
+# Observability: log level of the "rustsmith" logger, directory of the
+# per-run OpenTelemetry JSON trace files (empty disables them), and the
+# Prometheus metrics file written after every run / HTTP port (0 disables)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+TRACE_DIR = os.getenv("TRACE_DIR", "")
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Interactive mode: user the attempts are stored under, asked for when empty
+USER_ID = os.getenv("RUSTSMITH_USER_ID", "")
+
+# Adaptive per-model limits shared by all jobs of a process. The number of
+# completions in flight per model is an AIMD window: it grows by
+# MODEL_AIMD_INCREASE per window of successes and is multiplied by
+# MODEL_AIMD_DECREASE on 429/503/504 or a timeout, between 1 and the cap.
+# Caps are "model=N,model=N"; other models get MODEL_CONCURRENCY_DEFAULT
+# (0 is unlimited and not adaptive)
+MODEL_CONCURRENCY = _per_model("MODEL_CONCURRENCY", int)
+MODEL_CONCURRENCY_DEFAULT = int(os.getenv("MODEL_CONCURRENCY_DEFAULT", "4"))
+MODEL_AIMD_INCREASE = float(os.getenv("MODEL_AIMD_INCREASE", "1"))
+MODEL_AIMD_DECREASE = float(os.getenv("MODEL_AIMD_DECREASE", "0.5"))
+# Token buckets per model: requests and (estimated prompt + completion)
+# tokens per second, "model=rate,model=rate", 0 is unlimited. A bucket holds
+# MODEL_BURST_SECONDS of its rate
+MODEL_RPS = _per_model("MODEL_RPS", float)
+MODEL_RPS_DEFAULT = float(os.getenv("MODEL_RPS_DEFAULT", "0"))
+MODEL_TPS = _per_model("MODEL_TPS", float)
+MODEL_TPS_DEFAULT = float(os.getenv("MODEL_TPS_DEFAULT", "0"))
+MODEL_BURST_SECONDS = float(os.getenv("MODEL_BURST_SECONDS", "1"))
+
+# Routing: JSON file mapping agent roles to ranked "backend/model" pools (see
+# agents/router.py, empty sends every agent to LLM_BASE_URL), the requests
+# kept per route for its rolling p50/p95 and error rate and the seconds they
+# count for (so a demoted route is tried again once its failures age out), the
+# samples needed before a route is hedged or demoted, the error rate that
+# demotes it, the shortest hedge delay and the threads running routed requests
+ROUTES_FILE = os.getenv("ROUTES_FILE", "")
+ROUTE_STATS_WINDOW = int(os.getenv("ROUTE_STATS_WINDOW", "200"))
+ROUTE_STATS_MAX_AGE = float(os.getenv("ROUTE_STATS_MAX_AGE", "300"))
+ROUTE_MIN_SAMPLES = int(os.getenv("ROUTE_MIN_SAMPLES", "20"))
+ROUTE_MAX_ERROR_RATE = float(os.getenv("ROUTE_MAX_ERROR_RATE", "0.5"))
+ROUTE_HEDGE_MIN_SECONDS = float(os.getenv("ROUTE_HEDGE_MIN_SECONDS", "1"))
+ROUTE_POOL_SIZE = int(os.getenv("ROUTE_POOL_SIZE", "32"))
+
+# Fix knowledge base (utils/fixes.py): edit templates learned from the agents'
+# repairs and the built-in fixers are applied without an agent call once their
+# verified success rate reaches FIX_MIN_CONFIDENCE
+FIX_STORE_ENABLED = os.getenv("FIX_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+FIX_STORE_PATH = os.getenv("FIX_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "rustsmith", "fixes.json"))
+FIX_MIN_CONFIDENCE = float(os.getenv("FIX_MIN_CONFIDENCE", "0.8"))
+
+# Similar-project index (utils/project_index.py): projects that compiled are
+# indexed by idea; a new idea at least SIMILAR_SEED_THRESHOLD similar (cosine
+# of TF-IDF vectors) is shown to the Master and Smith agents as a reference,
+# and from SIMILAR_SKIP_THRESHOLD the Master and sub-agents are skipped and the
+# Smith Agent adapts the reference directly
+PROJECT_INDEX_ENABLED = os.getenv("PROJECT_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+PROJECT_INDEX_PATH = os.getenv("PROJECT_INDEX_PATH", os.path.join(os.path.expanduser("~"), ".cache", "rustsmith", "projects.json"))
+PROJECT_INDEX_MAX_ENTRIES = int(os.getenv("PROJECT_INDEX_MAX_ENTRIES", "5000"))
+SIMILAR_SEED_THRESHOLD = float(os.getenv("SIMILAR_SEED_THRESHOLD", "0.45"))
+SIMILAR_SKIP_THRESHOLD = float(os.getenv("SIMILAR_SKIP_THRESHOLD", "0.85"))
+
+# HTTP service (service.py): pipelines running at the same time, jobs waiting
+# before new ones are refused, finished jobs kept for polling and the root of
+# the per-job output directories
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+SERVICE_MAX_JOBS = int(os.getenv("SERVICE_MAX_JOBS", "8"))
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "100"))
+SERVICE_KEEP_FINISHED = int(os.getenv("SERVICE_KEEP_FINISHED", "1000"))
+SERVICE_OUTPUT_ROOT = os.getenv("SERVICE_OUTPUT_ROOT", os.path.join(OUTPUT_DIR, "jobs"))
+# "token=user,token=user": callers authenticate with "Authorization: Bearer
+# <token>" and only see their own jobs. Empty trusts the user_id the caller
+# sends, for a service that only listens on localhost
+SERVICE_TOKENS = _per_model("SERVICE_TOKENS", str)
@@ -1,48 +1,145 @@
 """
 MongoDB connection and operations for Rustsmith
 """
+import hashlib
+from datetime import datetime, timezone
+
 import pymongo
+from pymongo.errors import DuplicateKeyError
 from config import MONGODB_URI, MONGODB_DB, MONGODB_COLLECTION
+from utils.log import get_logger
+
+logger = get_logger("mongodb")
+
+INDEX_NAME = "user_project_attempt"
+INDEX_KEYS = [("user_id", pymongo.ASCENDING), ("project", pymongo.ASCENDING), ("attempt", pymongo.DESCENDING)]
+
+
+def project_key(project_idea):
+    """
+    Stable identifier of a project idea
+
+    Args:
+        project_idea (str): The user's project idea
+
+    Returns:
+        str: Short hash of the whitespace and case normalized idea
+    """
+    normalized = " ".join(project_idea.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
 
 class MongoDB:
-    def __init__(self, uri=MONGODB_URI):
-        self.client = pymongo.MongoClient(MONGODB_URI)
-        self.db = self.client['rustsmith']
-        self.collection = self.db['user_contexts']
-    
-    def get_user_context(self, user_id):
+    """
+    One document per attempt:
+    {user_id, project, attempt, question, answer, error, created_at}
+
+    (user_id, project, attempt) is unique, so two runs of the same project
+    cannot both store the same attempt number.
+    """
+    def __init__(self, uri=MONGODB_URI, db_name=MONGODB_DB, collection=MONGODB_COLLECTION):
+        self.client = pymongo.MongoClient(uri)
+        self.db = self.client[db_name]
+        self.collection = self.db[collection]
+        self._ensure_index()
+
+    def _ensure_index(self):
+        """Create the unique attempt index, replacing the non-unique one of older versions"""
+        existing = self.collection.index_information().get(INDEX_NAME)
+        if existing and existing.get("unique"):
+            return
+        if existing:
+            self.collection.drop_index(INDEX_NAME)
+        try:
+            self.collection.create_index(INDEX_KEYS, name=INDEX_NAME, unique=True)
+        except DuplicateKeyError:
+            # Attempts stored twice by concurrent runs before the index was unique
+            logger.warning("Duplicate attempts in %s, the attempt index is not unique", self.collection.name)
+            self.collection.create_index(INDEX_KEYS, name=INDEX_NAME)
+
+    def get_latest_attempt(self, user_id, project):
+        """
+        Retrieve the most recent attempt of a project
+
+        Args:
+            user_id (str): The unique identifier for the user
+            project (str): Project key from project_key
+
+        Returns:
+            dict: The attempt with question, answer, error and attempt number, or None
+        """
+        return self.collection.find_one(
+            {"user_id": user_id, "project": project},
+            projection={"_id": 0, "question": 1, "answer": 1, "error": 1, "attempt": 1},
+            sort=[("attempt", pymongo.DESCENDING)]
+        )
+
+    def get_user_context(self, user_id, project):
         """
         Retrieve user context from MongoDB
-        
+
         Args:
             user_id (str): The unique identifier for the user
-            
+            project (str): Project key from project_key
+
         Returns:
-            list: List of dictionaries containing question, answer, and error
+            list: The latest attempt as a one element context list, empty if there is none
         """
-        user_record = self.collection.find_one({"user_id": user_id})
-        if user_record:
-            context = user_record.get("context", [])
-            if context:
-                return context[-1]
+        latest = self.get_latest_attempt(user_id, project)
+        if latest:
+            latest.pop("attempt", None)
+            return [latest]
         return []
-    
-    def update_user_context(self, user_id, context):
+
+    def next_attempt_number(self, user_id, project):
         """
-        Update user context in MongoDB
-        
+        Number to use for the next attempt of a project
+
         Args:
             user_id (str): The unique identifier for the user
-            context (list): List of dictionaries with question, answer, and error
-            
+            project (str): Project key from project_key
+
         Returns:
-            bool: True if update was successful
+            int: One more than the latest stored attempt, 1 for a new project
         """
-        self.collection.update_one(
-            {"user_id": user_id},
-            {"$set": {"context": context}},
-            upsert=True
+        latest = self.collection.find_one(
+            {"user_id": user_id, "project": project},
+            projection={"_id": 0, "attempt": 1},
+            sort=[("attempt", pymongo.DESCENDING)]
         )
-        print("The context has been updated ---------- \n",context)
-        return True
+        return latest["attempt"] + 1 if latest else 1
 
+    def add_attempt(self, user_id, project, attempt, entry, retries=5):
+        """
+        Store a single attempt, independent of how long the history is
+
+        Args:
+            user_id (str): The unique identifier for the user
+            project (str): Project key from project_key
+            attempt (int): Attempt number
+            entry (dict): The attempt's question, answer and error
+            retries (int): Times to move to the next free number when another
+                run of the project already stored this one
+
+        Returns:
+            int: The attempt number the entry was stored under
+
+        Raises:
+            DuplicateKeyError: If no free number was found within the retries
+        """
+        for _ in range(retries):
+            try:
+                self.collection.insert_one({
+                    "user_id": user_id,
+                    "project": project,
+                    "attempt": attempt,
+                    "question": entry.get("question"),
+                    "answer": entry.get("answer"),
+                    "error": entry.get("error"),
+                    "created_at": datetime.now(timezone.utc),
+                })
+                return attempt
+            except DuplicateKeyError:
+                logger.info("Attempt %d of %s is already stored, another run is on the same project", attempt, project)
+                attempt = self.next_attempt_number(user_id, project)
+        raise DuplicateKeyError(f"No free attempt number for {project} after {retries} tries")
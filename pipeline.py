@@ -0,0 +1,346 @@
+"""
+Rustsmith generation pipeline
+Master Agent -> specialized agents -> Smith Agent -> cargo, with repair iterations
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from database.mongodb import project_key
+from agents.master_agent import MasterAgent
+from agents.struct_agent import StructAgent
+from agents.type_agent import TypeAgent
+from agents.utility_agent import UtilityAgent
+from agents.smith_agent import SmithAgent
+from utils.parser import parse_master_response
+from utils.executor import run_agent_tasks, format_timings
+from utils.context_manager import ContextManager
+from utils.compiler import compile_project
+from utils.repair import RepairController
+from utils.speculative import speculative_repair
+from utils.fixes import apply_edits, get_fix_store
+from utils.project_index import get_project_index
+from utils.file_manager import save_file, extract_files_from_response
+from utils.patcher import PatchError, apply_repair_response
+from utils.workspace import Workspace
+from utils.log import get_logger
+from utils.metrics import registry, RUNS, AGENT_CALLS_SKIPPED
+from utils.tracing import trace_run, span, current_span
+from config import STREAM_COMPLETIONS, SPECULATIVE_CANDIDATES, REPAIR_OUTPUT_MODE, METRICS_FILE, SIMILAR_SKIP_THRESHOLD
+
+logger = get_logger("pipeline")
+
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str, **attributes: Any):
+    """Add the time spent in the block to timings[stage] and trace it as a span"""
+    started_at = time.perf_counter()
+    try:
+        with span(stage, **attributes) as current:
+            yield current
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started_at
+
+
+def compact_context(context_manager, context):
+    """Compact the history for the next agent calls and report the savings"""
+    agent_context = context_manager.compact(context)
+    stats = context_manager.last_stats
+    logger.debug("Context: %d tokens (%d saved, %d attempts dropped)",
+                 stats['tokens_after'], stats['tokens_saved'], stats['entries_dropped'])
+    return agent_context
+
+
+def run_smith(smith_agent, project_idea, master_response, agent_context, workspace, timings, agent_responses=None,
+              reference=None):
+    """
+    Have the Smith Agent produce the project and write it to the workspace,
+    replacing the previous attempt, starting from a similar project if one is given
+
+    Returns:
+        dict: The parsed files
+    """
+    agent_responses = agent_responses or {}
+    if STREAM_COMPLETIONS:
+        # Files are written as soon as their block is complete
+        workspace.reset()
+        with timed(timings, "smith") as current:
+            _, parsed_files = smith_agent.process_stream(
+                project_idea,
+                master_response,
+                agent_context,
+                agent_responses,
+                on_file=lambda filepath, content: save_file(workspace.path, filepath, content),
+                reference=reference
+            )
+            current.set("files", len(parsed_files))
+        return parsed_files
+
+    with timed(timings, "smith"):
+        smith_response = smith_agent.process(
+            project_idea,
+            master_response,
+            agent_context,
+            agent_responses,
+            reference=reference
+        )
+    with timed(timings, "parse", response_chars=len(smith_response)) as current:
+        parsed_files = extract_files_from_response(smith_response)
+        current.set("files", len(parsed_files))
+    with timed(timings, "save", files=len(parsed_files), bytes=sum(len(c) for c in parsed_files.values())):
+        workspace.write(parsed_files)
+    return parsed_files
+
+
+def run_patch_repair(smith_agent, project_idea, files, error, workspace, timings):
+    """
+    Have the Smith Agent fix the project with patches and apply them to the workspace
+
+    Returns:
+        dict: The patched files, None if the response did not apply
+    """
+    with timed(timings, "smith"):
+        response = smith_agent.repair(project_idea, files, error)
+    with timed(timings, "parse", response_chars=len(response), patch=True) as current:
+        try:
+            patched_files = apply_repair_response(response, files)
+        except PatchError as e:
+            current.set("patch_error", str(e))
+            logger.info("Patch did not apply (%s), regenerating the whole project", e)
+            return None
+    with timed(timings, "save", files=len(patched_files), bytes=sum(len(c) for c in patched_files.values())):
+        workspace.write(patched_files)
+    return patched_files
+
+
+def run_known_fixes(store, files, compile_result, workspace, timings, attempt):
+    """
+    Fix the errors the fix knowledge base is confident about, without an agent call
+
+    The fixed project is compiled at once; fixes that did not make the
+    compile better are recorded as failures and rolled back.
+
+    Returns:
+        tuple: The fixed files and their compile result, None if nothing was fixed
+    """
+    with timed(timings, "fixes", attempt=attempt) as current:
+        confident, candidates = store.lookup(compile_result.diagnostics, files)
+        fixed_files = apply_edits(files, [edit for fix in confident for edit in fix.edits]) if confident else None
+        current.set("confident", len(confident))
+        current.set("candidates", len(candidates))
+    if fixed_files is None:
+        return None
+
+    logger.info("Applying %d known fixes: %s", len(confident), "; ".join(fix.description for fix in confident))
+    workspace.write(fixed_files)
+    with timed(timings, "compile", attempt=attempt, known_fixes=len(confident)) as current:
+        fixed_result = compile_project(workspace.path)
+        current.set("success", fixed_result.success)
+        current.set("errors", len(fixed_result.errors))
+    if store.verify(confident, compile_result.diagnostics, fixed_result.diagnostics, fixed_result.success, files):
+        return fixed_files, fixed_result
+    logger.info("Known fixes did not help, rolling them back")
+    workspace.write(files)
+    return None
+
+
+def run_pipeline(project_idea: str, user_id: str, output_dir: str, db=None) -> Dict[str, Any]:
+    """
+    Generate a Rust project for an idea and repair it until it compiles
+
+    The run is traced, see utils.tracing, and counted in the metrics.
+
+    Args:
+        project_idea (str): The user's project idea
+        user_id (str): The unique identifier for the user
+        output_dir (str): Directory the final project is copied to, it is
+            built in a private workspace
+        db (MongoDB): Database for the attempt history, None to keep it in memory only
+
+    Returns:
+        dict: success, output_dir, number of attempts, why the repair loop
+        stopped, last error, per-stage timings, per-attempt metrics, the similar
+        project it started from and the trace id
+    """
+    try:
+        with trace_run("pipeline", project=project_key(project_idea), user_id=user_id) as trace:
+            result = _generate_project(project_idea, user_id, output_dir, db)
+            root = current_span()
+            for key in ("success", "attempts", "stop_reason"):
+                root.set(key, result[key])
+        RUNS.inc(stop_reason=result["stop_reason"])
+    except Exception:
+        RUNS.inc(stop_reason="error")
+        raise
+    finally:
+        if METRICS_FILE:
+            registry.write(METRICS_FILE)
+    result["trace_id"] = trace.trace_id
+    return result
+
+
+def _generate_project(project_idea: str, user_id: str, output_dir: str, db=None) -> Dict[str, Any]:
+    """
+    The pipeline itself, see run_pipeline
+
+    Returns:
+        dict: success, output_dir, number of attempts, why the repair loop
+        stopped, last error, per-stage timings, per-attempt metrics and the
+        similar project it started from
+    """
+    timings = {}
+    # The time budget counts from here: planning and the first generation are part of it
+    controller = RepairController()
+
+    # Get or create user context, only the latest attempt is loaded
+    project = project_key(project_idea)
+    context = db.get_user_context(user_id, project) if db else []
+    attempt = db.next_attempt_number(user_id, project) if db else 1
+
+    # Initialize agents
+    master_agent = MasterAgent()
+    struct_agent = StructAgent()
+    type_agent = TypeAgent()
+    utility_agent = UtilityAgent()
+    smith_agent = SmithAgent()
+    context_manager = ContextManager()
+    fix_store = get_fix_store()
+
+    # Keep the history sent to the agents under the token budget
+    agent_context = compact_context(context_manager, context)
+
+    # Step 0: Look for a similar project that compiled before
+    project_index = get_project_index()
+    with timed(timings, "similar") as current:
+        reference = project_index.nearest(project_idea)
+        current.set("score", reference.score if reference else 0.0)
+
+    if reference and reference.score >= SIMILAR_SKIP_THRESHOLD:
+        # Close enough for the Smith Agent to adapt it without a plan
+        logger.info("Starting from %r (similarity %.2f), skipping the Master and sub-agents", reference.idea, reference.score)
+        master_response, agent_tasks, agent_responses = "", reference.agents, {}
+        for agent in ["master"] + agent_tasks:
+            AGENT_CALLS_SKIPPED.inc(agent=agent)
+        skipped_calls = 1 + len(agent_tasks)
+    else:
+        if reference:
+            logger.info("Similar project %r (similarity %.2f) given as a reference", reference.idea, reference.score)
+        skipped_calls = 0
+
+        # Step 1: Master agent divides the task
+        with timed(timings, "master"):
+            master_response = master_agent.process(project_idea, agent_context, reference=reference)
+
+        # Step 2: Parse master response to determine which agents to use
+        with timed(timings, "parse", response_chars=len(master_response)) as current:
+            agent_tasks = parse_master_response(master_response)
+            current.set("agent_tasks", ",".join(agent_tasks))
+
+        # Step 3: Call the required agents, independent ones run concurrently
+        with timed(timings, "agents"):
+            agent_responses, agent_timings = run_agent_tasks(
+                project_idea,
+                agent_tasks,
+                {"struct": struct_agent, "type": type_agent, "utility": utility_agent},
+                agent_context
+            )
+        logger.info("Agent stage timings:\n%s", format_timings(agent_timings))
+
+    # Every attempt is built in a private workspace
+    with Workspace(project) as workspace:
+        # Step 4: Smith agent assembles the project
+        # Step 5: Save the project
+        parsed_files = run_smith(smith_agent, project_idea, master_response, agent_context, workspace, timings,
+                                 agent_responses, reference)
+
+        llm_seconds = sum(timings.get(stage, 0.0) for stage in ("master", "agents", "smith"))
+        tokens = sum(agent.last_tokens for agent in (master_agent, struct_agent, type_agent, utility_agent, smith_agent))
+
+        # Step 6: Compile the project
+        with timed(timings, "compile", attempt=1) as current:
+            compile_result = compile_project(workspace.path)
+            current.set("success", compile_result.success)
+            current.set("errors", len(compile_result.errors))
+        while True:
+            success, error = compile_result.success, compile_result.output
+            logger.debug("Compiler output:\n%s", error)
+            metrics = controller.record(success, compile_result.errors, tokens, compile_result.duration, llm_seconds)
+            logger.info("Attempt %d: %s", metrics['attempt'], 'compiled' if success else f"{metrics['errors']} errors")
+
+            context.append({
+                "question": project_idea,
+                "answer": parsed_files,
+                "error": error
+            })
+
+            # Save the attempt to MongoDB
+            if db:
+                with timed(timings, "db", attempt=attempt):
+                    attempt = db.add_attempt(user_id, project, attempt, context[-1])
+            attempt += 1
+
+            # Step 7: If there are errors and budget is left, try again
+            if not controller.should_continue():
+                break
+            logger.info("Compilation failed. Attempting to fix errors...")
+
+            # Errors with a known fix are fixed without an agent call
+            fixed = run_known_fixes(fix_store, parsed_files, compile_result, workspace, timings,
+                                    len(controller.attempts) + 1)
+            if fixed:
+                parsed_files, compile_result = fixed
+                llm_seconds, tokens = 0.0, 0
+                continue
+            # The repair is learned from as the edit between these and the repaired files
+            broken_files, broken_result = parsed_files, compile_result
+
+            # Try to fix errors
+            agent_context = compact_context(context_manager, context)
+            if SPECULATIVE_CANDIDATES > 1:
+                # Candidates are generated and compiled in their own workspaces
+                with timed(timings, "speculative"):
+                    speculation = speculative_repair(project_idea, master_response, agent_context, name=project,
+                                                     files=parsed_files, error=error)
+                winner = speculation["winner"]
+                parsed_files, compile_result = winner.files, winner.compile_result
+                workspace.write(parsed_files)
+                llm_seconds, tokens = speculation["llm_seconds"], speculation["tokens"]
+                fix_store.learn(broken_result.diagnostics, compile_result.diagnostics, broken_files, parsed_files)
+                continue
+
+            smith_seconds = timings.get("smith", 0.0)
+            patched_files, tokens = None, 0
+            if REPAIR_OUTPUT_MODE == "patch":
+                patched_files = run_patch_repair(smith_agent, project_idea, parsed_files, error, workspace, timings)
+                tokens += smith_agent.last_tokens
+            if patched_files is None:
+                patched_files = run_smith(smith_agent, project_idea, master_response, agent_context, workspace, timings)
+                tokens += smith_agent.last_tokens
+            parsed_files = patched_files
+            llm_seconds = timings["smith"] - smith_seconds
+
+            # Compile again
+            with timed(timings, "compile", attempt=len(controller.attempts) + 1) as current:
+                compile_result = compile_project(workspace.path)
+                current.set("success", compile_result.success)
+                current.set("errors", len(compile_result.errors))
+            fix_store.learn(broken_result.diagnostics, compile_result.diagnostics, broken_files, parsed_files)
+
+        workspace.export(output_dir)
+        summary = controller.summary()
+        if success:
+            logger.info("Project successfully generated and compiled at: %s", output_dir)
+            project_index.add(project_idea, parsed_files, agent_tasks)
+        else:
+            logger.warning("Giving up after %d attempts: %s", summary['attempts'], summary['stop_reason'])
+
+        return {
+            "success": success,
+            "output_dir": output_dir,
+            "attempts": summary["attempts"],
+            "stop_reason": summary["stop_reason"],
+            "error": error,
+            "timings": timings,
+            "repair": summary,
+            "reference": {"idea": reference.idea, "score": reference.score, "skipped_calls": skipped_calls} if reference else None,
+        }
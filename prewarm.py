@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Rustsmith crate mirror pre-warm
+
+Vendors the common crates (COMMON_CRATES) into the local mirror, the only
+step that needs the network, then compiles them once into every cargo slot
+of the shared target directory. Afterwards generated projects that only use
+these crates build offline and only compile their own code.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from utils.compiler import slot_target_dir
+from utils.crates import prewarm_manifest, source_config_args, vendored_crates
+from utils.workspace import Workspace
+from config import CRATE_VENDOR_DIR, CARGO_TARGET_DIR, CARGO_MAX_PARALLEL, COMMON_CRATES
+
+
+def run(command, cwd, env=None) -> bool:
+    """Run a cargo command, its output goes to the terminal"""
+    print("$", " ".join(command))
+    started_at = time.perf_counter()
+    returncode = subprocess.run(command, cwd=cwd, env=env).returncode
+    print(f"finished in {time.perf_counter() - started_at:.1f}s with exit code {returncode}")
+    return returncode == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor and pre-build the crates generated projects commonly use")
+    parser.add_argument("--crates", default=",".join(COMMON_CRATES),
+                        help='Comma separated "name@version[:feature+feature]" list (default: COMMON_CRATES)')
+    parser.add_argument("--vendor-dir", default=CRATE_VENDOR_DIR, help="Directory of the crate mirror")
+    parser.add_argument("--target-dir", default=CARGO_TARGET_DIR, help="Shared cargo target directory")
+    parser.add_argument("--slots", type=int, default=CARGO_MAX_PARALLEL, help="Number of cargo slots to pre-build")
+    parser.add_argument("--skip-vendor", action="store_true", help="Reuse the existing mirror, no network access")
+    args = parser.parse_args()
+
+    crates = [spec for spec in args.crates.split(",") if spec.strip()]
+    with Workspace("prewarm") as workspace:
+        with open(os.path.join(workspace.path, "Cargo.toml"), "w", encoding="utf-8") as f:
+            f.write(prewarm_manifest(crates))
+        os.makedirs(os.path.join(workspace.path, "src"), exist_ok=True)
+        with open(os.path.join(workspace.path, "src", "main.rs"), "w", encoding="utf-8") as f:
+            f.write("fn main() {}\n")
+
+        if not args.skip_vendor:
+            # Versioned directories let the mirror hold several versions of a crate
+            if not run(["cargo", "vendor", "--versioned-dirs", "--quiet", args.vendor_dir], workspace.path):
+                sys.exit("Vendoring failed, is crates.io reachable?")
+        print(f"Mirror at {args.vendor_dir} holds {len(vendored_crates(args.vendor_dir))} crates")
+
+        # Same environment as run_cargo, so the dependency artifacts are reused.
+        # `check` and `build` produce different artifacts, the repair loop uses both
+        env = dict(os.environ)
+        env.setdefault("CARGO_INCREMENTAL", "1")
+        for slot in range(args.slots):
+            if args.target_dir:
+                env["CARGO_TARGET_DIR"] = slot_target_dir(args.target_dir, slot)
+            for command in ("check", "build"):
+                if not run(["cargo", command] + source_config_args(args.vendor_dir), workspace.path, env):
+                    sys.exit(f"cargo {command} failed for slot {slot}")
+    print("Pre-warm finished")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Rustsmith service mode - generate projects for many users over HTTP
+
+An asyncio server accepts generation jobs, queues them and runs up to
+SERVICE_MAX_JOBS pipelines at the same time. The agent completions of all
+jobs share the adaptive per-model limits (see agents/model_limits.py), the
+builds share the machine-wide cargo limit (CARGO_MAX_PARALLEL).
+
+    POST   /jobs                 {"idea": "...", "user_id": "..."} -> 202 {"id": ..., "status": "queued"}
+    GET    /jobs?user_id=...     Jobs of the caller
+    GET    /jobs/<id>            Status, and the result once finished
+    GET    /jobs/<id>/events     Server-sent events: status changes and finished stages
+    GET    /jobs/<id>/files      The generated files
+    DELETE /jobs/<id>            Cancel a queued job
+    GET    /health               Queue depth, model load and route latencies
+    GET    /metrics              Prometheus metrics
+
+Every /jobs route acts for one user: the owner of the bearer token when
+SERVICE_TOKENS is set, otherwise the user_id (or X-User-Id header) the caller
+sends. Jobs of other users answer 404.
+
+    python service.py --port 8080 --max-jobs 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple, AsyncIterator
+from urllib.parse import urlsplit, parse_qs
+
+from database.mongodb import MongoDB
+from agents.model_limits import get_model_limits
+from agents.router import get_router
+from pipeline import run_pipeline
+from utils.file_manager import output_subdirectory
+from utils.log import get_logger
+from utils.metrics import registry
+from utils.tracing import Span, STATUS_ERROR, watch_spans
+from config import (
+    MONGODB_URI, SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_JOBS, SERVICE_QUEUE_SIZE,
+    SERVICE_KEEP_FINISHED, SERVICE_OUTPUT_ROOT, SERVICE_TOKENS
+)
+
+logger = get_logger("service")
+
+MAX_BODY_BYTES = 1024 * 1024
+FINISHED = ("succeeded", "failed", "error", "cancelled")
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Job:
+    """A generation request and everything that happened to it"""
+    def __init__(self, idea: str, user_id: str, output_root: str):
+        self.id = secrets.token_hex(8)
+        self.idea = idea
+        self.user_id = user_id
+        self.output_dir = os.path.join(output_subdirectory(output_root, user_id), self.id)
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._updated = asyncio.Event()
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """Append an event and wake up the followers, on the event loop only"""
+        self.events.append({"event": event, "time": time.time(), **data})
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    def set_status(self, status: str, **data: Any):
+        self.status = status
+        self.publish("status", {"status": status, **data})
+
+    async def follow(self) -> AsyncIterator[Dict[str, Any]]:
+        """Every event so far, then new ones as they come, until the job is finished"""
+        index = 0
+        while True:
+            updated = self._updated
+            while index < len(self.events):
+                index += 1
+                yield self.events[index - 1]
+            if self.status in FINISHED:
+                return
+            await updated.wait()
+
+    def describe(self) -> Dict[str, Any]:
+        description = {
+            "id": self.id,
+            "user_id": self.user_id,
+            "idea": self.idea,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.result is not None:
+            description["result"] = {
+                key: self.result[key]
+                for key in ("success", "attempts", "stop_reason", "error", "timings", "trace_id")
+            }
+        if self.error:
+            description["error"] = self.error
+        return description
+
+
+class JobService:
+    """
+    Job queue and the workers draining it
+
+    Each worker is an asyncio task that runs one pipeline at a time. The
+    pipeline itself blocks on HTTP and cargo, so it runs in a thread of a
+    pool with one thread per worker; the event loop stays free to accept
+    jobs and serve status requests.
+    """
+    def __init__(self, max_jobs: int = SERVICE_MAX_JOBS, queue_size: int = SERVICE_QUEUE_SIZE,
+                 output_root: str = SERVICE_OUTPUT_ROOT, keep_finished: int = SERVICE_KEEP_FINISHED, db=None):
+        self.max_jobs = max_jobs
+        self.output_root = output_root
+        self.keep_finished = keep_finished
+        self.db = db
+        self.jobs = OrderedDict()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.running = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="pipeline")
+        self._workers = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_jobs)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, idea: str, user_id: str) -> Job:
+        """
+        Queue a job
+
+        Raises:
+            asyncio.QueueFull: If SERVICE_QUEUE_SIZE jobs are already waiting
+            ValueError: If the user's directory would be outside the output root
+        """
+        job = Job(idea, user_id, self.output_root)
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        job.set_status("queued")
+        self._forget_finished()
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """Cancel a job that has not started, running pipelines are not interrupted"""
+        if job.status != "queued":
+            return False
+        job.finished_at = time.time()
+        job.set_status("cancelled")
+        return True
+
+    def position(self, job: Job) -> int:
+        """Number of queued jobs ahead of this one"""
+        ahead = 0
+        for other in self.jobs.values():
+            if other is job:
+                return ahead
+            if other.status == "queued":
+                ahead += 1
+        return ahead
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(1 for job in self.jobs.values() if job.status == "queued"),
+            "running": self.running,
+            "max_jobs": self.max_jobs,
+            "models": get_model_limits().stats(),
+            "routes": get_router().stats(),
+        }
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status == "queued":
+                    await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: Job):
+        loop = asyncio.get_running_loop()
+
+        def on_span(finished: Span):
+            # Called from the pipeline threads
+            event = {"span": finished.name, "seconds": round(finished.duration, 3),
+                     "ok": finished.status != STATUS_ERROR, **finished.attributes}
+            try:
+                loop.call_soon_threadsafe(job.publish, "span", event)
+            except RuntimeError:
+                # The loop is shutting down
+                pass
+
+        def run() -> Dict[str, Any]:
+            with watch_spans(on_span):
+                return run_pipeline(job.idea, job.user_id, job.output_dir, self.db)
+
+        self.running += 1
+        job.started_at = time.time()
+        job.set_status("running")
+        try:
+            job.result = await loop.run_in_executor(self._pool, run)
+            status = "succeeded" if job.result["success"] else "failed"
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.error = f"{type(e).__name__}: {e}"
+            status = "error"
+        finally:
+            self.running -= 1
+        job.finished_at = time.time()
+        job.set_status(status, **({"trace_id": job.result["trace_id"]} if job.result else {"error": job.error}))
+        logger.info("Job %s for %s: %s in %.1fs", job.id, job.user_id, status, job.finished_at - job.started_at)
+
+
+def read_files(directory: str) -> Dict[str, str]:
+    """Text files of a generated project, without build output"""
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in ("target", ".git")]
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    files[os.path.relpath(path, directory)] = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+    return files
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: Dict[str, str] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """
+    Read one HTTP/1.1 request
+
+    Returns:
+        tuple: (method, target, lower-case headers, body), None when the client closed the connection
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def write_head(writer: asyncio.StreamWriter, status: int, headers: Dict[str, str]):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, body: Any,
+                   content_type: str = "application/json", headers: Dict[str, str] = None):
+    data = body if isinstance(body, bytes) else (
+        body.encode("utf-8") if isinstance(body, str) else json.dumps(body, default=str).encode("utf-8")
+    )
+    write_head(writer, status, {"Content-Type": content_type, "Content-Length": str(len(data)), **(headers or {})})
+    writer.write(data)
+
+
+class Server:
+    """HTTP front end of a JobService"""
+    def __init__(self, service: JobService, tokens: Dict[str, str] = None):
+        self.service = service
+        self.tokens = SERVICE_TOKENS if tokens is None else tokens
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve the requests of one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    if await self.route(writer, method, target, headers, body):
+                        # Event streams end the connection
+                        break
+                except HttpError as e:
+                    write_response(writer, e.status, {"error": str(e)}, headers=e.headers)
+                    # The body of a refused request may still be unread
+                    keep_alive = e.status < 500 and e.status not in (400, 413)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("Request failed")
+            write_response(writer, 500, {"error": "Internal server error"})
+        finally:
+            writer.close()
+
+    def caller(self, headers: Dict[str, str], claimed: Optional[str]) -> str:
+        """
+        User a request acts for
+
+        Args:
+            headers (dict): Request headers
+            claimed (str): user_id sent with the request, if any
+
+        Returns:
+            str: The token's user when tokens are configured, else the claimed user
+
+        Raises:
+            HttpError: 401 without a valid token, 403 if the claimed user is
+                someone else, 400 if no user is given at all
+        """
+        claimed = (claimed or headers.get("x-user-id") or "").strip()
+        if self.tokens:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            user_id = self.tokens.get(token.strip()) if scheme.lower() == "bearer" else None
+            if not user_id:
+                raise HttpError(401, "A valid bearer token is required", {"WWW-Authenticate": "Bearer"})
+            if claimed and claimed != user_id:
+                raise HttpError(403, "The token does not belong to this user")
+            return user_id
+        if not claimed:
+            raise HttpError(400, "user_id is required")
+        return claimed
+
+    def _job(self, job_id: str, user_id: str) -> Job:
+        """A job of the caller, other users' jobs are reported missing"""
+        job = self.service.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            raise HttpError(404, f"No job {job_id}")
+        return job
+
+    async def route(self, writer: asyncio.StreamWriter, method: str, target: str,
+                    headers: Dict[str, str], body: bytes) -> bool:
+        """
+        Answer one request
+
+        Returns:
+            bool: True if the connection has to be closed afterwards
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if parts == ["health"] and method == "GET":
+            write_response(writer, 200, {"status": "ok", **self.service.stats()})
+        elif parts == ["metrics"] and method == "GET":
+            write_response(writer, 200, registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif parts == ["jobs"] and method == "POST":
+            write_response(writer, 202, self.create_job(headers, body))
+        elif parts == ["jobs"] and method == "GET":
+            user_id = self.caller(headers, query.get("user_id"))
+            jobs = [job.describe() for job in self.service.jobs.values() if job.user_id == user_id]
+            write_response(writer, 200, {"jobs": jobs})
+        elif len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            job = self._job(parts[1], self.caller(headers, query.get("user_id")))
+            description = job.describe()
+            if job.status == "queued":
+                description["position"] = self.service.position(job)
+            write_response(writer, 200, description)
+        elif len(parts) == 2 and parts[0] == "jobs" and method == "DELETE":
+            job = self._job(parts[1], self.caller(headers, query.get("user_id")))
+            if not self.service.cancel(job):
+                raise HttpError(409, f"Job {job.id} is {job.status}, only queued jobs can be cancelled")
+            write_response(writer, 200, job.describe())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "files" and method == "GET":
+            job = self._job(parts[1], self.caller(headers, query.get("user_id")))
+            if job.status not in ("succeeded", "failed"):
+                raise HttpError(409, f"Job {job.id} is {job.status}")
+            files = await asyncio.get_running_loop().run_in_executor(None, read_files, job.output_dir)
+            write_response(writer, 200, {"files": files})
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events" and method == "GET":
+            await self.stream_events(writer, self._job(parts[1], self.caller(headers, query.get("user_id"))))
+            return True
+        elif parts and parts[0] in ("health", "metrics", "jobs"):
+            raise HttpError(405, f"{method} is not supported on {url.path}")
+        else:
+            raise HttpError(404, f"No route {url.path}")
+        return False
+
+    def create_job(self, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+        if not isinstance(request, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        idea = str(request.get("idea") or request.get("project_idea") or "").strip()
+        user_id = self.caller(headers, str(request.get("user_id") or ""))
+        if not idea:
+            raise HttpError(400, "idea is required")
+        try:
+            job = self.service.submit(idea, user_id)
+        except asyncio.QueueFull:
+            raise HttpError(503, "Too many queued jobs, retry later", {"Retry-After": "30"})
+        except ValueError:
+            raise HttpError(400, "user_id cannot be used as a directory name")
+        return {**job.describe(), "position": self.service.position(job)}
+
+    async def stream_events(self, writer: asyncio.StreamWriter, job: Job):
+        write_head(writer, 200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache", "Connection": "close"})
+        async for event in job.follow():
+            data = json.dumps(event, default=str)
+            writer.write(f"event: {event['event']}\ndata: {data}\n\n".encode("utf-8"))
+            await writer.drain()
+
+
+async def serve(host: str, port: int, service: JobService):
+    service.start()
+    server = await asyncio.start_server(Server(service).handle, host, port)
+    logger.info("Rustsmith service listening on http://%s:%d (%d pipelines at a time, queue of %d)",
+                host, port, service.max_jobs, service.queue.maxsize)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Rustsmith generation jobs over HTTP")
+    parser.add_argument("--host", default=SERVICE_HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="Port to listen on")
+    parser.add_argument("--max-jobs", type=int, default=SERVICE_MAX_JOBS, help="Pipelines running at the same time")
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="Jobs waiting before new ones are refused")
+    parser.add_argument("--output-root", default=SERVICE_OUTPUT_ROOT, help="Directory holding <user>/<job id> output directories")
+    parser.add_argument("--no-db", action="store_true", help="Do not store attempts in MongoDB")
+    args = parser.parse_args()
+
+    db = None if args.no_db or not MONGODB_URI else MongoDB(MONGODB_URI)
+
+    async def run():
+        service = JobService(args.max_jobs, args.queue_size, args.output_root, db=db)
+        await serve(args.host, args.port, service)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
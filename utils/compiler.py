@@ -3,27 +3,193 @@ Interface with the Rust compiler
 """
 import os
 import subprocess
-from typing import Tuple
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Tuple
 
-def compile_rust_project(project_path: str) -> Tuple[bool, str]:
+from config import CARGO_TARGET_DIR, COMPILE_MODE, PREFLIGHT_ENABLED
+from utils.workspace import cargo_slot
+from utils.diagnostics import Diagnostic, parse_cargo_output, top_errors, format_diagnostics
+from utils.preflight import preflight_check
+from utils.crates import mirror_args, mirror_resolution_failed
+from utils.log import get_logger
+from utils.metrics import COMPILES
+from utils.tracing import span
+
+logger = get_logger("compiler")
+
+
+@dataclass
+class CompileResult:
+    """Outcome of a cargo invocation"""
+    success: bool
+    output: str
+    command: str
+    duration: float
+    returncode: int = -1
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+
+    @property
+    def errors(self) -> List[Diagnostic]:
+        """Ranked, deduplicated top-N errors"""
+        return top_errors(self.diagnostics)
+
+
+def slot_target_dir(target_dir: str, slot: int) -> str:
+    """Target directory of a cargo slot inside the shared CARGO_TARGET_DIR"""
+    return os.path.join(target_dir, f"slot-{slot}")
+
+
+def run_cargo(
+    project_path: str,
+    command: str = "build",
+    target_dir: str = CARGO_TARGET_DIR,
+    cancel_event: threading.Event = None
+) -> CompileResult:
+    """
+    Run a cargo command on a Rust project
+
+    Args:
+        project_path (str): Path to the Rust project
+        command (str): "check" for type checking only, "build" for a full build
+        target_dir (str): Shared CARGO_TARGET_DIR root with one subdirectory
+            per cargo slot, empty for the project's own target/
+        cancel_event (threading.Event): Kills cargo when set while it runs
+
+    Returns:
+        CompileResult: Success flag, the rendered top errors (empty on
+        success), the parsed diagnostics and how long it took
+    """
+    env = dict(os.environ)
+    env.setdefault("CARGO_INCREMENTAL", "1")
+
+    with cargo_slot() as (slot, jobs):
+        started_at = time.perf_counter()
+        if target_dir:
+            # One target dir per slot: concurrent builds never wait on each
+            # other's build directory lock
+            env["CARGO_TARGET_DIR"] = slot_target_dir(target_dir, slot)
+            os.makedirs(env["CARGO_TARGET_DIR"], exist_ok=True)
+        env["CARGO_BUILD_JOBS"] = str(jobs)
+        if cancel_event is not None and cancel_event.is_set():
+            return CompileResult(False, "Cancelled", command, 0.0)
+        extra_args = mirror_args(project_path)
+        while True:
+            try:
+                process = subprocess.Popen(
+                    ['cargo', command, '--message-format=json'] + extra_args,
+                    cwd=project_path,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    env=env
+                )
+            except Exception as e:
+                return CompileResult(False, str(e), command, time.perf_counter() - started_at)
+
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=0.2)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_event is not None and cancel_event.is_set():
+                        process.kill()
+                        process.communicate()
+                        return CompileResult(False, "Cancelled", command, time.perf_counter() - started_at, process.returncode)
+
+            if process.returncode == 0 or not extra_args or not mirror_resolution_failed(stderr):
+                break
+            # The mirror lacks a transitive dependency or an exact version: resolve from crates.io once
+            logger.info("Crate mirror cannot resolve %s, retrying without it", project_path)
+            extra_args = []
+
+    duration = time.perf_counter() - started_at
+    success = process.returncode == 0
+    diagnostics = parse_cargo_output(stdout, stderr)
+    output = ""
+    if not success:
+        output = format_diagnostics(top_errors(diagnostics)) or stderr
+    return CompileResult(success, output, command, duration, process.returncode, diagnostics)
+
+
+def run_preflight(project_path: str) -> CompileResult:
+    """
+    Validate a project without cargo
+
+    Args:
+        project_path (str): Path to the Rust project
+
+    Returns:
+        CompileResult: command "preflight", failed with the structured
+        problems when any check found one
+    """
+    started_at = time.perf_counter()
+    diagnostics = preflight_check(project_path)
+    duration = time.perf_counter() - started_at
+    output = format_diagnostics(top_errors(diagnostics))
+    return CompileResult(not diagnostics, output, "preflight", duration, 1 if diagnostics else 0, diagnostics)
+
+
+def _traced(command: str, run, *args, **kwargs) -> CompileResult:
+    """Run a compile step in a span and count its outcome"""
+    with span(f"compile.{command}") as current:
+        result = run(*args, **kwargs)
+        outcome = "success" if result.success else ("cancelled" if result.output == "Cancelled" else "failed")
+        current.set("outcome", outcome)
+        current.set("returncode", result.returncode)
+        current.set("diagnostics", len(result.diagnostics))
+        current.set("errors", len(result.errors))
+    COMPILES.inc(command=command, outcome=outcome)
+    logger.info("%s %s in %.2fs", command, outcome, result.duration)
+    return result
+
+
+def compile_project(project_path: str, mode: str = COMPILE_MODE, cancel_event: threading.Event = None) -> CompileResult:
+    """
+    Compile a Rust project using cargo
+
+    Args:
+        project_path (str): Path to the Rust project
+        mode (str): "incremental" type checks with `cargo check` and only runs
+            `cargo build` once the check passes, "build" or "check" run that
+            single command
+        cancel_event (threading.Event): Stops the compile when set
+
+    Returns:
+        CompileResult: Result of the last cargo command, or of the pre-flight
+        validation if that already failed; its duration covers every command
+        that ran
+    """
+    preflight_duration = 0.0
+    if PREFLIGHT_ENABLED:
+        # Obviously broken output goes back to the repair loop without cargo
+        preflight = _traced("preflight", run_preflight, project_path)
+        if not preflight.success:
+            return preflight
+        preflight_duration = preflight.duration
+
+    command = "check" if mode == "incremental" else mode
+    result = _traced(command, run_cargo, project_path, command, cancel_event=cancel_event)
+    if result.success and mode == "incremental":
+        # Only the candidate that type checks pays for codegen and linking
+        check_duration = result.duration
+        result = _traced("build", run_cargo, project_path, "build", cancel_event=cancel_event)
+        result.duration += check_duration
+    result.duration += preflight_duration
+    return result
+
+
+def compile_rust_project(project_path: str, mode: str = COMPILE_MODE) -> Tuple[bool, str]:
     """
     Compile a Rust project using cargo
     
     Args:
         project_path (str): Path to the Rust project
+        mode (str): "incremental", "build" or "check", see compile_project
         
     Returns:
         tuple: (success, error_message)
     """
-    try:
-        result = subprocess.run(
-            ['cargo', 'build'],
-            cwd=project_path,
-            capture_output=True,
-            text=True
-        )
-        success = result.returncode == 0
-        output = result.stdout if success else result.stderr
-        return success, output
-    except Exception as e:
-        return False, str(e)
\ No newline at end of file
+    result = compile_project(project_path, mode)
+    return result.success, result.output
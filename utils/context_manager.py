@@ -0,0 +1,97 @@
+"""
+Token-budgeted context management for Rustsmith
+Keeps the repair history sent to the agents under a fixed size
+"""
+from typing import List, Dict, Any
+
+from config import CONTEXT_TOKEN_BUDGET
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for a prompt fragment
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated number of tokens (about 4 characters per token)
+    """
+    return (len(text) + 3) // 4
+
+
+def entry_tokens(item: Dict[str, Any]) -> int:
+    """Estimated tokens of a context entry the way the agents render it"""
+    return sum(estimate_tokens(str(item.get(key) or "")) for key in ("question", "answer", "error"))
+
+
+def error_headlines(error: str) -> str:
+    """Keep only the "error..." lines of a compiler error string"""
+    lines = str(error).strip().splitlines()
+    headlines = [line for line in lines if line.startswith("error")]
+    return "\n".join(headlines or lines[:1])
+
+
+class ContextManager:
+    """
+    Compacts the list of {"question", "answer", "error"} attempts
+
+    The latest attempts are kept verbatim; older ones are reduced to their
+    file names and error headlines, and dropped oldest first when the
+    history is still over the token budget.
+    """
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, keep_verbatim: int = 1):
+        self.token_budget = token_budget
+        self.keep_verbatim = keep_verbatim
+        self.last_stats = {"tokens_before": 0, "tokens_after": 0, "tokens_saved": 0, "entries_dropped": 0}
+
+    def _summarize(self, item: Dict[str, Any], attempt: int) -> Dict[str, Any]:
+        answer = item.get("answer")
+        if isinstance(answer, dict):
+            answer_summary = f"Attempt {attempt}, superseded. Files: {', '.join(answer)}"
+        else:
+            answer_summary = f"Attempt {attempt}, superseded."
+        summary = {"question": item.get("question", ""), "answer": answer_summary}
+        if item.get("error"):
+            summary["error"] = error_headlines(item["error"])
+        return summary
+
+    def compact(self, context: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fit the context into the token budget
+
+        Args:
+            context (list): Full list of past attempts, oldest first
+
+        Returns:
+            list: Compacted copy of the context, the input is left untouched
+        """
+        entries = [item for item in (context or []) if isinstance(item, dict)]
+        tokens_before = sum(entry_tokens(item) for item in entries)
+
+        split = max(len(entries) - self.keep_verbatim, 0)
+        older = [self._summarize(item, attempt + 1) for attempt, item in enumerate(entries[:split])]
+        latest = [dict(item) for item in entries[split:]]
+
+        # Drop the oldest summaries first
+        dropped = 0
+        while older and sum(entry_tokens(item) for item in older + latest) > self.token_budget:
+            older.pop(0)
+            dropped += 1
+
+        # The latest files are always kept; only their error output is cut
+        for item in latest:
+            if sum(entry_tokens(entry) for entry in older + latest) <= self.token_budget:
+                break
+            if item.get("error"):
+                item["error"] = error_headlines(item["error"])
+
+        compacted = older + latest
+        tokens_after = sum(entry_tokens(item) for item in compacted)
+        self.last_stats = {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "entries_dropped": dropped,
+        }
+        return compacted
@@ -0,0 +1,174 @@
+"""
+Local crate mirror for Rustsmith
+Generated projects build offline against a vendored copy of the common crates
+"""
+import json
+import os
+import re
+import tomllib
+from typing import List, Dict, Tuple
+
+from config import CRATE_MIRROR, CRATE_VENDOR_DIR, COMMON_CRATES
+from utils.log import get_logger
+
+logger = get_logger("crates")
+
+SOURCE_NAME = "rustsmith-vendor"
+VERSIONED_DIR_RE = re.compile(r'^(.+)-(\d+\.\d+\.\d+(?:[-+].*)?)$')
+# cargo could not resolve a dependency, or one of its dependencies, from the mirror
+MIRROR_RESOLUTION_RE = re.compile(
+    r'(failed to select a version|no matching package named|failed to load source for dependency)'
+    r'[\s\S]*directory source `[^`]*` \(which is replacing registry `crates-io`\)'
+)
+
+
+def parse_crate_spec(spec: str) -> Tuple[str, str, List[str]]:
+    """
+    Parse a COMMON_CRATES entry
+
+    Args:
+        spec (str): "name@version" with optional ":feature+feature", e.g. "serde@1:derive"
+
+    Returns:
+        tuple: (name, version requirement, features)
+    """
+    spec, _, features = spec.strip().partition(":")
+    name, _, version = spec.partition("@")
+    return name.strip(), version.strip() or "*", [f for f in features.split("+") if f]
+
+
+def prewarm_manifest(crates: List[str] = COMMON_CRATES) -> str:
+    """Cargo.toml of the project the common crates are vendored and built with"""
+    lines = ['[package]', 'name = "rustsmith-prewarm"', 'version = "0.1.0"', 'edition = "2021"', '', '[dependencies]']
+    for spec in crates:
+        name, version, features = parse_crate_spec(spec)
+        if features:
+            lines.append(f'{name} = {{ version = "{version}", features = {json.dumps(features)} }}')
+        else:
+            lines.append(f'{name} = "{version}"')
+    return "\n".join(lines) + "\n"
+
+
+def vendored_crates(vendor_dir: str = CRATE_VENDOR_DIR) -> Dict[str, List[str]]:
+    """
+    List the mirror's content
+
+    Returns:
+        dict: Crate name to the vendored versions, empty if there is no mirror
+    """
+    crates = {}
+    if not os.path.isdir(vendor_dir):
+        return crates
+    for entry in os.scandir(vendor_dir):
+        match = VERSIONED_DIR_RE.match(entry.name)
+        if entry.is_dir() and match:
+            crates.setdefault(match.group(1), []).append(match.group(2))
+    return crates
+
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in re.findall(r'\d+', version.split("-")[0].split("+")[0])[:3])
+
+
+def version_matches(requirement: str, version: str) -> bool:
+    """
+    Check a vendored version against a Cargo.toml requirement
+
+    Plain and caret requirements ("1", "0.8.5", "^1.2") are checked with
+    cargo's compatibility rules; any other kind is left to cargo.
+    """
+    requirement = requirement.strip()
+    if requirement in ("", "*") or not re.fullmatch(r'\^?\d+(\.\d+){0,2}', requirement):
+        return True
+    wanted = _version_tuple(requirement)
+    have = _version_tuple(version)
+    # Leading components up to and including the first non-zero one must match
+    significant = next((index + 1 for index, part in enumerate(wanted) if part), len(wanted))
+    return have[:significant] == wanted[:significant] and have >= wanted
+
+
+def missing_crates(manifest: str, vendor_dir: str = CRATE_VENDOR_DIR) -> List[str]:
+    """
+    Dependencies of a manifest the mirror cannot serve
+
+    Args:
+        manifest (str): Content of the project's Cargo.toml
+        vendor_dir (str): The mirror
+
+    Returns:
+        list: "name requirement" for every missing crate, path and git dependencies excluded
+    """
+    try:
+        parsed = tomllib.loads(manifest)
+    except tomllib.TOMLDecodeError:
+        return []
+    available = vendored_crates(vendor_dir)
+    missing = []
+    for section in ("dependencies", "dev-dependencies", "build-dependencies"):
+        for name, requirement in (parsed.get(section) or {}).items():
+            if isinstance(requirement, dict):
+                if "path" in requirement or "git" in requirement:
+                    continue
+                name = requirement.get("package", name)
+                requirement = requirement.get("version", "*")
+            if not any(version_matches(str(requirement), version) for version in available.get(name, [])):
+                missing.append(f"{name} {requirement}")
+    return missing
+
+
+def source_config_args(vendor_dir: str = CRATE_VENDOR_DIR) -> List[str]:
+    """cargo arguments replacing crates.io with the mirror and disabling the network"""
+    return [
+        "--offline",
+        "--config", f'source.crates-io.replace-with="{SOURCE_NAME}"',
+        "--config", f'source.{SOURCE_NAME}.directory={json.dumps(os.path.abspath(vendor_dir))}',
+    ]
+
+
+def mirror_args(project_path: str, mode: str = CRATE_MIRROR, vendor_dir: str = CRATE_VENDOR_DIR) -> List[str]:
+    """
+    cargo arguments pointing a generated project at the mirror
+
+    Args:
+        project_path (str): Path to the Rust project
+        mode (str): "auto" uses the mirror when it has every dependency of the
+            project, "offline" always uses it, "off" never does. Only direct
+            dependencies are checked and only plain and caret requirements,
+            see mirror_resolution_failed for the rest
+        vendor_dir (str): The mirror
+
+    Returns:
+        list: Extra cargo arguments, empty to resolve from crates.io
+    """
+    if mode == "off" or not os.path.isdir(vendor_dir):
+        return []
+    if mode == "auto":
+        try:
+            with open(os.path.join(project_path, "Cargo.toml"), encoding="utf-8") as f:
+                manifest = f.read()
+        except OSError:
+            return []
+        missing = missing_crates(manifest, vendor_dir)
+        if missing:
+            logger.info("Not in the crate mirror: %s, resolving from crates.io", ", ".join(missing))
+            return []
+    return source_config_args(vendor_dir)
+
+
+def mirror_resolution_failed(stderr: str, mode: str = CRATE_MIRROR) -> bool:
+    """
+    Check whether a cargo run failed because the mirror could not serve the project
+
+    mirror_args only checks the direct dependencies, so a build it sent to
+    the mirror can still miss a transitive dependency or a version an exact
+    or range requirement asks for. In "auto" mode such a build is retried
+    against crates.io; "offline" never goes to the network.
+
+    Args:
+        stderr (str): cargo's stderr
+        mode (str): CRATE_MIRROR mode
+
+    Returns:
+        bool: True if the build should be retried without the mirror
+    """
+    return mode == "auto" and bool(MIRROR_RESOLUTION_RE.search(stderr or ""))
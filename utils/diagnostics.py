@@ -0,0 +1,186 @@
+"""
+Structured compiler diagnostics for Rustsmith
+Parses cargo's --message-format=json output into typed, ranked records
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from config import MAX_DIAGNOSTICS
+
+# Errors that usually cause others further down, fixed first. Syntax errors
+# (no code) come before all of them.
+ROOT_CAUSE_CODES = ["E0432", "E0433", "E0412", "E0425", "E0422", "E0423", "E0583"]
+
+HEADER_RE = re.compile(r'^(error|warning)(\[E\d+\])?:')
+PROGRESS_RE = re.compile(r'^\s+(Checking|Compiling|Updating|Downloading|Downloaded|Locking|Adding|Blocking|Finished)\s')
+
+
+@dataclass
+class Diagnostic:
+    """A single rustc or cargo diagnostic"""
+    level: str
+    message: str
+    code: Optional[str] = None
+    file: Optional[str] = None
+    line_start: int = 0
+    line_end: int = 0
+    column_start: int = 0
+    column_end: int = 0
+    rendered: str = ""
+    children: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def fingerprint(self) -> str:
+        """Error code plus the message with identifiers, paths and numbers normalized"""
+        return f"{self.code or self.level}:{normalize_message(self.message)}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "code": self.code,
+            "message": self.message,
+            "file": self.file,
+            "line_start": self.line_start,
+            "line_end": self.line_end,
+            "column_start": self.column_start,
+            "column_end": self.column_end,
+        }
+
+
+def normalize_message(message: str) -> str:
+    """
+    Reduce a diagnostic message to a template
+
+    Args:
+        message (str): Diagnostic message
+
+    Returns:
+        str: The message with `quoted` names replaced by `_` and numbers by N
+    """
+    message = re.sub(r'`[^`]*`', '`_`', message)
+    message = re.sub(r'"[^"]*"', '"_"', message)
+    return re.sub(r'\d+', 'N', message).strip()
+
+
+def _from_compiler_message(message: Dict[str, Any]) -> Diagnostic:
+    code = message.get("code") or {}
+    spans = message.get("spans") or []
+    primary = next((span for span in spans if span.get("is_primary")), spans[0] if spans else {})
+    return Diagnostic(
+        level=message.get("level", "error"),
+        message=message.get("message", ""),
+        code=code.get("code"),
+        file=primary.get("file_name"),
+        line_start=primary.get("line_start", 0),
+        line_end=primary.get("line_end", 0),
+        column_start=primary.get("column_start", 0),
+        column_end=primary.get("column_end", 0),
+        rendered=message.get("rendered") or message.get("message", ""),
+        children=message.get("children") or [],
+    )
+
+
+def parse_cargo_output(stdout: str, stderr: str = "") -> List[Diagnostic]:
+    """
+    Parse the output of a cargo command run with --message-format=json
+
+    Errors cargo reports before rustc runs (manifest or dependency resolution
+    problems) are not JSON; they are taken from stderr.
+
+    Args:
+        stdout (str): JSON lines written by cargo
+        stderr (str): Human readable cargo output
+
+    Returns:
+        list: Diagnostics in the order cargo reported them
+    """
+    diagnostics = []
+    for line in stdout.splitlines():
+        if not line.startswith("{"):
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("reason") == "compiler-message" and record.get("message"):
+            diagnostic = _from_compiler_message(record["message"])
+            if diagnostic.level.startswith(("error", "warning")) and not diagnostic.message.startswith("aborting due to"):
+                diagnostics.append(diagnostic)
+
+    if not any(d.level.startswith("error") for d in diagnostics):
+        for block in _stderr_error_blocks(stderr):
+            diagnostics.append(Diagnostic(
+                level="error",
+                message=block[0].split(":", 1)[1].strip(),
+                file="Cargo.toml" if any("Cargo.toml" in line or "dependency" in line for line in block) else None,
+                rendered="\n".join(block).strip(),
+            ))
+    return diagnostics
+
+
+def _stderr_error_blocks(stderr: str) -> List[List[str]]:
+    """Split cargo's human readable output into "error: ..." blocks"""
+    blocks = []
+    current = None
+    for line in stderr.splitlines():
+        if HEADER_RE.match(line):
+            current = None
+            if line.startswith("error") and not line.startswith("error: could not compile"):
+                current = [line]
+                blocks.append(current)
+        elif current is not None and not PROGRESS_RE.match(line):
+            current.append(line)
+    return blocks
+
+
+def dedupe(diagnostics: List[Diagnostic]) -> List[Diagnostic]:
+    """Drop diagnostics reported more than once for the same location"""
+    seen = set()
+    unique = []
+    for diagnostic in diagnostics:
+        key = (diagnostic.level, diagnostic.code, diagnostic.message, diagnostic.file, diagnostic.line_start, diagnostic.column_start)
+        if key not in seen:
+            seen.add(key)
+            unique.append(diagnostic)
+    return unique
+
+
+def _rank_key(diagnostic: Diagnostic):
+    is_error = diagnostic.level.startswith("error")
+    if diagnostic.code is None:
+        category = 0
+    elif diagnostic.code in ROOT_CAUSE_CODES:
+        category = 1 + ROOT_CAUSE_CODES.index(diagnostic.code)
+    else:
+        category = 1 + len(ROOT_CAUSE_CODES)
+    return (not is_error, category, diagnostic.file or "", diagnostic.line_start, diagnostic.column_start)
+
+
+def top_errors(diagnostics: List[Diagnostic], limit: int = MAX_DIAGNOSTICS) -> List[Diagnostic]:
+    """
+    Deduplicate and rank diagnostics, keeping only the primary errors
+
+    Args:
+        diagnostics (list): Diagnostics from parse_cargo_output
+        limit (int): Maximum number of errors to keep
+
+    Returns:
+        list: At most `limit` errors, likely root causes first
+    """
+    errors = [d for d in dedupe(diagnostics) if d.level.startswith("error")]
+    return sorted(errors, key=_rank_key)[:limit]
+
+
+def format_diagnostics(diagnostics: List[Diagnostic]) -> str:
+    """
+    Render diagnostics for a repair prompt
+
+    Args:
+        diagnostics (list): Diagnostics to render
+
+    Returns:
+        str: The rendered diagnostics separated by blank lines
+    """
+    return "\n\n".join(d.rendered.strip() for d in diagnostics)
@@ -0,0 +1,104 @@
+"""
+Concurrent execution of the specialized agents for Rustsmith
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Tuple
+
+from utils.tracing import propagate
+
+# Agents that have to finish before another agent can start. The Utility Agent
+# writes impl blocks and functions against the structs and types, so it is
+# given their finished output instead of guessing at it.
+AGENT_DEPENDENCIES = {
+    "struct": [],
+    "type": [],
+    "utility": ["struct", "type"],
+}
+
+
+def run_agent_tasks(
+    project_idea: str,
+    agent_tasks: Dict[str, str],
+    agents: Dict[str, Any],
+    context: List[Dict[str, Any]],
+    max_workers: int = 3
+) -> Tuple[Dict[str, str], Dict[str, Dict[str, float]]]:
+    """
+    Run the tasks from parse_master_response as a dependency graph
+
+    Agents without pending dependencies run concurrently, an agent with
+    dependencies starts as soon as all of them have finished.
+
+    Args:
+        project_idea (str): The user's project idea
+        agent_tasks (dict): Agent name -> task description from the Master Agent
+        agents (dict): Agent name -> agent instance
+        context (list): List of past interactions
+        max_workers (int): Maximum number of agents running at the same time
+
+    Returns:
+        tuple: (agent_responses, timings) where timings maps every agent name
+        to its start offset, end offset and duration in seconds
+    """
+    pending = {
+        name: [dep for dep in AGENT_DEPENDENCIES.get(name, []) if dep in agent_tasks]
+        for name in agent_tasks
+    }
+    responses = {}
+    timings = {}
+    started_at = time.perf_counter()
+
+    def run_stage(name: str, dependency_outputs: Dict[str, str]) -> str:
+        stage_start = time.perf_counter()
+        kwargs = {"dependency_outputs": dependency_outputs} if dependency_outputs else {}
+        try:
+            return agents[name].process(project_idea, agent_tasks[name], context, **kwargs)
+        finally:
+            stage_end = time.perf_counter()
+            timings[name] = {
+                "start": stage_start - started_at,
+                "end": stage_end - started_at,
+                "duration": stage_end - stage_start,
+            }
+
+    # Agent spans become children of the caller's span
+    run_stage = propagate(run_stage)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            ready = [name for name, deps in pending.items() if all(dep in responses for dep in deps)]
+            for name in ready:
+                dependency_outputs = {dep: responses[dep] for dep in pending.pop(name) if responses[dep]}
+                running[pool.submit(run_stage, name, dependency_outputs)] = name
+
+            if not running:
+                raise RuntimeError(f"Unresolvable agent dependencies: {pending}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                responses[name] = future.result()
+
+    total = time.perf_counter() - started_at
+    timings["total"] = {"start": 0.0, "end": total, "duration": total}
+    return responses, timings
+
+
+def format_timings(timings: Dict[str, Dict[str, float]]) -> str:
+    """
+    Format the per-stage timings returned by run_agent_tasks
+
+    Args:
+        timings (dict): Timings returned by run_agent_tasks
+
+    Returns:
+        str: One line per stage, ordered by start time
+    """
+    lines = []
+    for name, timing in sorted(timings.items(), key=lambda item: (item[0] == "total", item[1]["start"])):
+        lines.append(
+            f"{name:<8} {timing['duration']:7.2f}s  "
+            f"(started +{timing['start']:.2f}s, finished +{timing['end']:.2f}s)"
+        )
+    return "\n".join(lines)
@@ -1,162 +1,68 @@
 """
 File and project management utilities for Rustsmith
 """
+import hashlib
 import os
 import re
-import json
-import shutil
-from datetime import datetime
-from typing import Dict, Any
-from config import OUTPUT_DIR
+from typing import Dict
+from utils.log import get_logger
+from utils.protocol import parse_response
 
-def save_project1(smith_response: str, project_dir="output") -> str:
-    """
-    Save the generated Rust project to disk
-    
-    
-    Returns:
-        str: Path to the saved project
-    """
-    # Create a safe project name from the idea
-    # Parse files from smith_response
-    files = extract_files_from_response(smith_response)
-    
-    # Write files
-    for file_path, content in files.items():
-        full_path = os.path.join(project_dir, file_path)
-        
-        # Create directories if needed
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        
-        # Write the file
-        with open(full_path, 'w') as f:
-            f.write(content)
-    
-    
-    return project_dir
+logger = get_logger("file_manager")
+
+# Receives the Smith agent's text outside of file blocks
+EXTRA_TEXT_FILE = "src/README.md"
 
-def extract_files_from_response1(response: str) -> Dict[str, str]:
+def output_subdirectory(root: str, name: str) -> str:
     """
-    Extract file paths and contents from the Smith agent's response
-    
+    Directory for a job or user inside an output root
+
     Args:
-        response (str): The Smith agent's response
-        
+        root (str): The output root
+        name (str): Job or user id, any string
+
     Returns:
-        dict: Dictionary mapping file paths to file contents
+        str: root/name with the name made safe for the filesystem; a name of
+        only dots (".", "..") or nothing at all is replaced with a hash of it
+
+    Raises:
+        ValueError: If the directory would not be strictly inside the root
     """
-    files = {}
-    
-    # Find all file blocks in the response
-    file_blocks = re.finditer(
-        r'File:\s*([^\n]+)\s*\n(.*?)(?=File:|$)',
-        response,
-        re.DOTALL
-    )
-    
-    for block in file_blocks:
-        file_path = block.group(1).strip()
-        content = block.group(2).strip()
-        
-        # Remove markdown code block markers if present
-        content = re.sub(r'^```(?:rust|toml)?|```$', '', content, flags=re.MULTILINE)
-        
-        files[file_path] = content.strip()
-    
-    # If no files were found, try alternative format with markdown code blocks
-    if not files:
-        file_blocks = re.finditer(
-            r'```(?:rust|toml)?\s*(?:(?:File|Path|Filename):\s*([^\n]+))?\s*\n(.*?)```',
-            response,
-            re.DOTALL
-        )
-        
-        for block in file_blocks:
-            file_path = block.group(1)
-            content = block.group(2)
-            
-            if not file_path:
-                # If no explicit file path, try to infer from content
-                if "fn main" in content:
-                    file_path = "src/main.rs"
-                elif "[package]" in content:
-                    file_path = "Cargo.toml"
-                else:
-                    # Default to a lib.rs file if we can't determine
-                    file_path = "src/lib.rs"
-            
-            files[file_path.strip()] = content.strip()
-    
-    # Ensure we have a Cargo.toml file
-    if "Cargo.toml" not in files:
-        files["Cargo.toml"] = generate_default_cargo_toml()
-    
-    # Ensure we have at least main.rs if no Rust files found
-    if not any(f.endswith(".rs") for f in files):
-        files["src/main.rs"] = generate_default_main_rs()
-    
-    return files
+    safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+    if not safe.strip("."):
+        safe = "id-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+    path = os.path.join(root, safe)
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(root):
+        raise ValueError(f"Output directory for {name!r} is not inside {root}")
+    return path
+
+def save_file(project_dir: str, filepath: str, content: str):
+        """
+        Write a single project file, creating parent directories as needed
+
+        Args:
+            project_dir (str): Root directory of the project
+            filepath (str): Path of the file relative to the project root
+            content (str): File content
+        """
+        full_path = os.path.join(project_dir, filepath)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(content)
 
 def save_project(files: Dict[str, str], project_dir: str):
         for filepath, content in files.items():
-            full_path = os.path.join(project_dir, filepath)
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-        print(f"Files saved successfully in {project_dir}")
+            save_file(project_dir, filepath, content)
+        logger.debug("Files saved successfully in %s", project_dir)
 
 def extract_files_from_response(response: str) -> Dict[str, str]:
-        files = {}
-        current_file = None
-        current_content = []
-        extra_text = []
-        inside_file = False
-        inside_code_block = False
-        
-        lines = response.split('\n')
-        
-        for line in lines:
-            if line.startswith('[FILE:'):
-                if current_file and current_content:
-                    files[current_file] = '\n'.join(current_content).strip()
-                current_file = line[6:].strip().rstrip(']')
-                current_content = []
-                inside_file = True
-                inside_code_block = False  
-            elif line.startswith('[END FILE]'):
-                if current_file and current_content:
-                    files[current_file] = '\n'.join(current_content).strip()
-                current_file = None
-                inside_file = False
-                inside_code_block = False
-            elif inside_file:
-                if line.strip().startswith('```'):
-                    inside_code_block = not inside_code_block 
-                    continue
-                if inside_code_block:
-                    current_content.append(line)
-            else:
-                extra_text.append(line)  
-        
-        if extra_text:
-            files["src/README.md"] = '\n'.join(extra_text).strip()
-        
-        return files
-
-
-def generate_default_cargo_toml() -> str:
-    """Generate a default Cargo.toml file"""
-    return """[package]
-name = "rustsmith_project"
-version = "0.1.0"
-edition = "2021"
+    """
+    Extract file paths and contents from the Smith agent's response
 
-[dependencies]
-"""
+    Args:
+        response (str): The Smith agent's response
 
-def generate_default_main_rs() -> str:
-    """Generate a default main.rs file"""
-    return """fn main() {
-    println!("Hello from Rustsmith!");
-}
-"""
\ No newline at end of file
+    Returns:
+        dict: File path -> content, text outside of file blocks goes to src/README.md
+    """
+    return parse_response(response, EXTRA_TEXT_FILE).files
@@ -0,0 +1,754 @@
+"""
+Fix knowledge base for Rustsmith
+Known compiler errors are fixed deterministically, without an agent call
+"""
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import FIX_STORE_ENABLED, FIX_STORE_PATH, FIX_MIN_CONFIDENCE
+from utils.diagnostics import Diagnostic, dedupe
+from utils.log import get_logger
+from utils.metrics import FIX_LOOKUPS, FIX_OUTCOMES
+
+logger = get_logger("fixes")
+
+# Traits a missing-impl error can be fixed for with a derive
+DERIVABLE = ["Debug", "Clone", "Copy", "Default", "PartialEq", "Eq", "Hash", "PartialOrd", "Ord"]
+# Methods whose absence means a derivable trait is missing
+TRAIT_METHODS = {"clone": "Clone", "eq": "PartialEq", "cmp": "Ord", "partial_cmp": "PartialOrd", "hash": "Hash"}
+# Operators whose absence means a derivable trait is missing
+TRAIT_OPERATORS = {"==": "PartialEq", "!=": "PartialEq", "<": "PartialOrd", ">": "PartialOrd", "<=": "PartialOrd", ">=": "PartialOrd"}
+
+# Prior (successes, failures) of a fix before the store has seen it, per
+# confidence level of the fixer. "certain" is rustc's MachineApplicable or
+# a version cargo listed as available, "likely" a single MaybeIncorrect
+# suggestion or a derive, which have to prove themselves first
+PRIORS = {"certain": (4, 0), "likely": (1, 1)}
+
+# Largest agent edit learned as a template: hunks per error and lines per hunk
+MAX_TEMPLATE_HUNKS = 3
+MAX_HUNK_LINES = 8
+
+NAME_RE = re.compile(r"[A-Za-z_]\w*")
+DECLARATION_RE = re.compile(r"\b(?:struct|enum|union|trait|fn|mod|type|const|static|let(?:\s+mut)?)\s+([A-Za-z_]\w*)")
+
+
+@dataclass
+class Edit:
+    """Replace the text between two 1-based (line, column) positions of a file"""
+    path: str
+    start: Tuple[int, int]
+    end: Tuple[int, int]
+    text: str
+
+
+@dataclass
+class Fix:
+    """A deterministic fix for one diagnostic"""
+    kind: str
+    prior: str
+    description: str
+    edits: List[Edit] = field(default_factory=list)
+    # Set by the store: the diagnostic's key, and the id and hunks of the edit template
+    key: str = ""
+    template: str = ""
+    hunks: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _offset(content: str, line: int, column: int) -> int:
+    """String offset of a 1-based line and character column"""
+    offset = 0
+    for _ in range(line - 1):
+        newline = content.find("\n", offset)
+        if newline == -1:
+            return len(content)
+        offset = newline + 1
+    return min(offset + column - 1, len(content))
+
+
+def apply_edits(files: Dict[str, str], edits: List[Edit]) -> Optional[Dict[str, str]]:
+    """
+    Apply edits to a project, last position first so earlier ones stay valid.
+    Insertions at the same position keep the order of the edits.
+
+    Args:
+        files (dict): File path -> content
+        edits (list): Edits from any number of fixes
+
+    Returns:
+        dict: The changed project, None if an edit targets a missing file or
+        two edits overlap
+    """
+    result = dict(files)
+    by_path = {}
+    for edit in edits:
+        if edit.path not in files:
+            return None
+        by_path.setdefault(edit.path, []).append(edit)
+    for path, path_edits in by_path.items():
+        content = files[path]
+        ranges = sorted(((_offset(content, *e.start), _offset(content, *e.end), index, e.text)
+                         for index, e in enumerate(path_edits)), reverse=True)
+        limit = len(content) + 1
+        for start, end, _, text in ranges:
+            if end > limit or (end == limit and start < end):
+                return None
+            content = content[:start] + text + content[end:]
+            limit = start
+        result[path] = content
+    return result
+
+
+def edited_lines(edits: List[Edit]) -> Dict[str, set]:
+    """Lines each file's edits wrote, numbered as in the edited file"""
+    lines = {}
+    shifts = {}
+    for edit in sorted(edits, key=lambda e: (e.path, e.start)):
+        shift = shifts.get(edit.path, 0)
+        first = edit.start[0] + shift
+        written = edit.text.count("\n")
+        lines.setdefault(edit.path, set()).update(range(first, first + written + 1))
+        shifts[edit.path] = shift + written - (edit.end[0] - edit.start[0])
+    return lines
+
+
+def suggestion_fix(diagnostic: Diagnostic, files: Dict[str, str]) -> Optional[Fix]:
+    """
+    rustc's own suggestion: an import, a derive, a conversion...
+
+    Only a suggestion with a single way to apply it is taken; "one of these
+    items" alternatives all replace the same span and are left to the agents.
+    """
+    for child in diagnostic.children:
+        spans = [span for span in child.get("spans") or [] if span.get("suggested_replacement") is not None]
+        if not spans:
+            continue
+        applicability = {span.get("suggestion_applicability") for span in spans}
+        if applicability - {"MachineApplicable", "MaybeIncorrect"}:
+            return None
+        positions = {(span["line_start"], span["column_start"], span["line_end"], span["column_end"]) for span in spans}
+        if len(positions) < len(spans):
+            return None
+        return Fix(
+            kind="suggestion",
+            prior="certain" if applicability == {"MachineApplicable"} else "likely",
+            description=child.get("message", ""),
+            edits=[
+                Edit(span["file_name"], (span["line_start"], span["column_start"]),
+                     (span["line_end"], span["column_end"]), span["suggested_replacement"])
+                for span in spans
+            ]
+        )
+    return None
+
+
+def _missing_derive(diagnostic: Diagnostic) -> Optional[Tuple[str, str]]:
+    """(type name, trait) of a missing-impl error a derive fixes"""
+    message = diagnostic.message
+    match = re.match(r"no method named `(\w+)` found for (?:struct|enum) `(\w+)", message)
+    if match and match.group(1) in TRAIT_METHODS:
+        return match.group(2), TRAIT_METHODS[match.group(1)]
+    match = re.match(r"`(\w+)(?:<[^`]*>)?` doesn't implement `(?:std::fmt::)?(\w+)`", message)
+    if match and match.group(2) in DERIVABLE:
+        return match.group(1), match.group(2)
+    match = re.match(r"the trait bound `(\w+)(?:<[^`]*>)?: (?:[\w:]+::)?(\w+)` is not satisfied", message)
+    if match and match.group(2) in DERIVABLE:
+        return match.group(1), match.group(2)
+    match = re.match(r"binary operation `([=!<>]+)` cannot be applied to type `(\w+)", message)
+    if match and match.group(1) in TRAIT_OPERATORS:
+        return match.group(2), TRAIT_OPERATORS[match.group(1)]
+    return None
+
+
+def derive_fix(diagnostic: Diagnostic, files: Dict[str, str]) -> Optional[Fix]:
+    """Add the missing trait to the derive of the type's definition"""
+    missing = _missing_derive(diagnostic)
+    if not missing:
+        return None
+    type_name, trait = missing
+    definition = re.compile(rf'^([ \t]*)(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum)\s+{type_name}\b', re.MULTILINE)
+    found = [(path, match) for path, content in files.items() if path.endswith(".rs")
+             for match in definition.finditer(content)]
+    if len(found) != 1:
+        return None
+    path, match = found[0]
+    content = files[path]
+    line = content.count("\n", 0, match.start()) + 1
+    lines = content.split("\n")
+    # Attributes right above the definition
+    index = line - 2
+    while index >= 0 and lines[index].strip().startswith(("#[", "///")):
+        derive = re.match(r'^(\s*#\[derive\()(.*)(\)\]\s*)$', lines[index])
+        if derive:
+            traits = [t.strip() for t in derive.group(2).split(",") if t.strip()]
+            if trait in traits:
+                return None
+            if trait == "Eq" and "PartialEq" not in traits:
+                traits.append("PartialEq")
+            if trait == "Ord" and "PartialOrd" not in traits:
+                traits.append("PartialOrd")
+            new_line = f"{derive.group(1)}{', '.join(traits + [trait])}{derive.group(3)}"
+            edit = Edit(path, (index + 1, 1), (index + 1, len(lines[index]) + 1), new_line)
+            break
+        index -= 1
+    else:
+        edit = Edit(path, (line, 1), (line, 1), f"{match.group(1)}#[derive({trait})]\n")
+    return Fix("derive", "likely", f"derive {trait} for {type_name}", [edit])
+
+
+def dependency_version_fix(diagnostic: Diagnostic, files: Dict[str, str]) -> Optional[Fix]:
+    """Point a dependency cargo could not resolve at the newest version it found"""
+    match = re.match(r'failed to select a version for the requirement `([\w-]+) = "[^"]*"`', diagnostic.message)
+    candidates = re.search(r"candidate versions found which didn't match: ([^\n]+)", diagnostic.rendered)
+    if not match or not candidates or "Cargo.toml" not in files:
+        return None
+    name = match.group(1)
+    version = candidates.group(1).split(",")[0].strip()
+    if not re.match(r'^\d+\.\d+\.\d+', version):
+        return None
+    lines = files["Cargo.toml"].split("\n")
+    in_table = False
+    for number, line in enumerate(lines, 1):
+        header = re.match(r'^\s*\[([^\]]+)\]', line)
+        if header:
+            in_table = header.group(1).strip() in (f"dependencies.{name}", f"dev-dependencies.{name}")
+            continue
+        if in_table:
+            pattern = r'^(\s*version\s*=\s*")[^"]*(")'
+        else:
+            pattern = rf'^(\s*{re.escape(name)}\s*=\s*(?:\{{[^}}]*version\s*=\s*)?")[^"]*(")'
+        version_match = re.match(pattern, line)
+        if version_match:
+            new_line = f"{version_match.group(1)}{version}{version_match.group(2)}{line[version_match.end():]}"
+            return Fix("dependency_version", "certain", f"{name} = \"{version}\"",
+                       [Edit("Cargo.toml", (number, 1), (number, len(line) + 1), new_line)])
+    return None
+
+
+# Tried in order, the first one that produces a fix wins
+FIXERS = [dependency_version_fix, derive_fix, suggestion_fix]
+
+
+def propose_fixes(diagnostics: List[Diagnostic], files: Dict[str, str]) -> List[Fix]:
+    """
+    Deterministic fixes for the errors of a compile
+
+    Args:
+        diagnostics (list): Diagnostics of the compile
+        files (dict): The project that was compiled
+
+    Returns:
+        list: At most one fix per error
+    """
+    fixes = []
+    for diagnostic in dedupe(diagnostics):
+        if not diagnostic.level.startswith("error"):
+            continue
+        for fixer in FIXERS:
+            fix = fixer(diagnostic, files)
+            if fix:
+                fixes.append(fix)
+                break
+    return fixes
+
+
+def project_names(files: Dict[str, str]) -> set:
+    """Names the project declares itself: its items, bindings and dependencies"""
+    names = {name for path, content in files.items() if path.endswith(".rs") for name in DECLARATION_RE.findall(content)}
+    manifest = files.get("Cargo.toml", "")
+    names.update(re.findall(r"^\s*([\w-]+)\s*=", manifest.split("[dependencies]", 1)[-1], re.MULTILINE))
+    names.update(re.findall(r"^\s*\[(?:dev-)?dependencies\.([\w-]+)\]", manifest, re.MULTILINE))
+    return names
+
+
+def fix_key(diagnostic: Diagnostic, names: set) -> Tuple[str, List[str]]:
+    """
+    Store key of a diagnostic, and the project names it abstracts
+
+    Like Diagnostic.fingerprint, but only the names the project declares
+    become placeholders ($0, $1... in order of appearance). Methods, traits,
+    std types and derives stay in the key, so a missing `clone` and a
+    missing `len` are learned separately.
+
+    Returns:
+        tuple: (key, the project names behind $0, $1...)
+    """
+    bindings = []
+
+    def abstract(match):
+        name = match.group(0)
+        if name not in names:
+            return name
+        if name not in bindings:
+            bindings.append(name)
+        return f"${bindings.index(name)}"
+
+    message = re.sub(r"`[^`]*`", lambda quoted: NAME_RE.sub(abstract, quoted.group(0)), diagnostic.message)
+    message = re.sub(r"(?<![$\w])\d+", "N", message).strip()
+    return f"{diagnostic.code or diagnostic.level}:{message}", bindings
+
+
+def count_keys(diagnostics: List[Diagnostic], names: set) -> Dict[str, int]:
+    counts = {}
+    for diagnostic in dedupe(diagnostics):
+        if diagnostic.level.startswith("error"):
+            key = fix_key(diagnostic, names)[0]
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def _abstract(text: str, bindings: List[str]) -> str:
+    """Text of a template: the bound names replaced by their placeholders, $ escaped"""
+    text = text.replace("$", "$$")
+    if not bindings:
+        return text
+    pattern = re.compile(r"\b(%s)\b" % "|".join(re.escape(name) for name in bindings))
+    return pattern.sub(lambda match: f"${bindings.index(match.group(1))}", text)
+
+
+def _concrete(text: str, bindings: List[str]) -> Optional[str]:
+    """Inverse of _abstract, None if the template uses a name the diagnostic does not bind"""
+    try:
+        return re.sub(r"\$(\$|\d+)", lambda match: "$" if match.group(1) == "$" else bindings[int(match.group(1))], text)
+    except IndexError:
+        return None
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _line_hunks(before: str, after: str) -> List[Tuple[int, int, List[str]]]:
+    """(first line, end line, inserted lines) of the changes between two files, indentation ignored"""
+    old, new = before.split("\n"), after.split("\n")
+    matcher = difflib.SequenceMatcher(None, [line.strip() for line in old], [line.strip() for line in new], autojunk=False)
+    return [(i1, i2, new[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def _relevant(diagnostic: Diagnostic, path: str, first: int, end: int, texts: List[str]) -> bool:
+    """Whether a hunk of an agent repair belongs to the diagnostic: near its lines or mentioning its names"""
+    if path == diagnostic.file:
+        # Lines of the error replaced, or lines inserted right before or after them
+        lines = range(diagnostic.line_start - 1, diagnostic.line_end)
+        if (first < lines.stop and end > lines.start) if end > first else lines.start <= first <= lines.stop:
+            return True
+    names = {name for quoted in re.findall(r"`([^`]*)`", diagnostic.message) for name in NAME_RE.findall(quoted)}
+    return any(re.search(rf"\b{re.escape(name)}\b", text) for name in names if len(name) > 1 for text in texts)
+
+
+def edit_template(diagnostic: Diagnostic, before: Dict[str, str], after: Dict[str, str],
+                  bindings: List[str], relevant_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Normalized template of the edit that turned before into after
+
+    Every changed block of lines is a hunk: the lines it removed, the lines
+    it inserted (indented relative to the block) and the line after it,
+    which anchors insertions. The diagnostic's project names are replaced
+    by their placeholders. Imports inserted at the top of a file are
+    anchored to the top instead.
+
+    Args:
+        diagnostic (Diagnostic): The error the edit fixed
+        before (dict): The project before the edit
+        after (dict): The project after the edit
+        bindings (list): Project names of the diagnostic's key
+        relevant_only (bool): Keep only the hunks near the error or naming
+            what it names, for an agent repair that fixed several errors
+
+    Returns:
+        list: The hunks, empty if the edit is too large to be a template
+    """
+    hunks = []
+    for path in sorted(before):
+        if path not in after or before[path] == after[path]:
+            continue
+        old = before[path].split("\n")
+        changes = []
+        for first, end, inserted in _line_hunks(before[path], after[path]):
+            imports = 0
+            while first == end == 0 and imports < len(inserted) and (
+                    inserted[imports].strip().startswith("use ") or (imports and not inserted[imports].strip())):
+                imports += 1
+            if 0 < imports < len(inserted):
+                # Imports added at the top and an insertion before the first line are two edits
+                changes.append((0, 0, inserted[:imports]))
+                inserted = inserted[imports:]
+            changes.append((first, end, inserted))
+        for first, end, inserted in changes:
+            # Blank lines around an insertion are layout, not part of the fix
+            while inserted and not inserted[0].strip():
+                inserted = inserted[1:]
+            while inserted and not inserted[-1].strip():
+                inserted = inserted[:-1]
+            removed = old[first:end]
+            following = old[end] if end < len(old) else None
+            if not any(line.strip() for line in removed + inserted):
+                continue
+            stripped = [line.strip() for line in inserted]
+            top = first == 0 and not removed and all(line.startswith("use ") or not line for line in stripped)
+            context = [] if top or following is None else [following]
+            if relevant_only and not _relevant(diagnostic, path, first, end, removed + inserted + context):
+                continue
+            if len(removed) > MAX_HUNK_LINES or len(inserted) > MAX_HUNK_LINES:
+                return []
+            if top and path.endswith(".rs") and path != diagnostic.file:
+                # Top-of-file imports are replayed into the error's file only
+                return []
+            anchor = removed[0] if removed else following or ""
+            base = _indent(anchor)
+            hunks.append({
+                # .rs hunks are looked for in the diagnostic's file first, then in the others
+                "file": "" if path.endswith(".rs") else path,
+                "top": top,
+                "removed": [_abstract(line.strip(), bindings) for line in removed],
+                "inserted": [_abstract(line[len(base):] if line.startswith(base) else line.lstrip(), bindings) for line in inserted],
+                "after": None if top or following is None else _abstract(following.strip(), bindings),
+            })
+    return hunks if len(hunks) <= MAX_TEMPLATE_HUNKS else []
+
+
+def template_id(hunks: List[Dict[str, Any]]) -> str:
+    return hashlib.sha1(json.dumps(hunks, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _replay_hunk(hunk: Dict[str, Any], diagnostic: Diagnostic, files: Dict[str, str],
+                 bindings: List[str]) -> Optional[Edit]:
+    removed = [_concrete(line, bindings) for line in hunk["removed"]]
+    inserted = [_concrete(line, bindings) for line in hunk["inserted"]]
+    after = _concrete(hunk["after"], bindings) if hunk["after"] is not None else None
+    if None in removed or None in inserted or (hunk["after"] is not None and after is None):
+        return None
+    if hunk["top"]:
+        path = hunk["file"] or diagnostic.file
+        if path not in files:
+            return None
+        lines = files[path].split("\n")
+        present = {line.strip() for line in lines}
+        if all(line.strip() in present for line in inserted):
+            return None
+        position = 0
+        while position < len(lines) and lines[position].strip().startswith(("//!", "#![")):
+            position += 1
+        return Edit(path, (position + 1, 1), (position + 1, 1), "\n".join(inserted) + "\n")
+
+    block = removed + ([after] if after is not None else [])
+    if hunk["file"]:
+        paths = [hunk["file"]]
+    else:
+        paths = [diagnostic.file] + sorted(path for path in files if path.endswith(".rs") and path != diagnostic.file)
+    found = None
+    for path in paths:
+        if path not in files:
+            continue
+        lines = files[path].split("\n")
+        stripped = [line.strip() for line in lines]
+        matches = [index for index in range(len(lines) - len(block) + 1)
+                   if stripped[index:index + len(block)] == block and (after is not None or index + len(block) == len(lines))]
+        if path == diagnostic.file and matches:
+            # In the error's own file, the occurrence closest to the error
+            found = (path, min(matches, key=lambda index: abs(index + 1 - diagnostic.line_start)))
+            break
+        if matches:
+            if found or len(matches) > 1:
+                # Elsewhere, only an anchor found once in the project is trusted
+                return None
+            found = (path, matches[0])
+    if not found:
+        return None
+    path, index = found
+    lines = files[path].split("\n")
+    anchor = lines[index] if index < len(lines) else ""
+    text = "".join(f"{_indent(anchor)}{line}\n" if line.strip() else "\n" for line in inserted)
+    end = index + len(removed)
+    if end == len(lines):
+        # The block runs to the end of the file, which has no newline after its last line
+        text = text[:-1] if text else text
+        if not removed and files[path]:
+            text = "\n" + text
+        return Edit(path, (len(lines), len(lines[-1]) + 1) if not removed else (index + 1, 1),
+                    (len(lines), len(lines[-1]) + 1), text)
+    return Edit(path, (index + 1, 1), (end + 1, 1), text)
+
+
+def replay_template(hunks: List[Dict[str, Any]], diagnostic: Diagnostic, files: Dict[str, str],
+                    bindings: List[str]) -> Optional[List[Edit]]:
+    """
+    Edits that apply a template to a project
+
+    Returns:
+        list: One edit per hunk, None if a hunk's lines are not found, are
+        found more than once outside the error's file, or are already there
+    """
+    if not hunks:
+        return None
+    edits = []
+    for hunk in hunks:
+        edit = _replay_hunk(hunk, diagnostic, files, bindings)
+        if edit is None:
+            return None
+        edits.append(edit)
+    return edits if apply_edits(files, edits) not in (None, files) else None
+
+
+class FixStore:
+    """
+    Verified edit templates, indexed by diagnostic key
+
+    {key: {template id: {"kind", "prior", "description", "hunks",
+                         "successes", "failures", "learned", "updated_at"}}}
+
+    Keys come from fix_key, templates from edit_template. For an error, the
+    store considers the fixers' fix and every template stored under its key
+    that applies to the project, and applies the most trusted one when its
+    confidence, (successes + prior successes) / (outcomes + prior outcomes),
+    reaches FIX_MIN_CONFIDENCE. Outcomes come from compiling the applied
+    fixes, and from agent repairs: the edit an agent made around an error
+    it fixed is stored as a template under the error's key, or counts for
+    the template if it is already there.
+    """
+    def __init__(self, path: str = FIX_STORE_PATH, min_confidence: float = FIX_MIN_CONFIDENCE,
+                 enabled: bool = FIX_STORE_ENABLED):
+        self.path = path
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        self.entries = {}
+        self.lookups = 0
+        self.hits = 0
+        self.applied = 0
+        self.verified = 0
+        self.rejected = 0
+        self.learned = 0
+        self._lock = threading.Lock()
+        if enabled and path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Fix store %s is unreadable, starting empty", path)
+                entries = {}
+            # Counts per fix kind, from before the store kept templates, are dropped
+            self.entries = {key: templates for key, templates in entries.items()
+                            if all(isinstance(entry, dict) and "hunks" in entry for entry in templates.values())}
+
+    def confidence(self, fix: Fix) -> float:
+        with self._lock:
+            entry = self.entries.get(fix.key, {}).get(fix.template, {})
+        prior_successes, prior_failures = PRIORS[fix.prior]
+        successes = entry.get("successes", 0) + prior_successes
+        total = successes + entry.get("failures", 0) + prior_failures
+        return successes / total if total else 0.0
+
+    def _options(self, diagnostic: Diagnostic, key: str, bindings: List[str], files: Dict[str, str]) -> List[Fix]:
+        """The fixers' fix and the stored templates that apply, one per template"""
+        options = {}
+        for fixer in FIXERS:
+            fix = fixer(diagnostic, files)
+            if fix:
+                fixed = apply_edits(files, fix.edits)
+                fix.hunks = edit_template(diagnostic, files, fixed, bindings) if fixed else []
+                # A fix whose edit has no template is counted under its kind
+                fix.template = template_id(fix.hunks) if fix.hunks else fix.kind
+                fix.key = key
+                options[fix.template] = fix
+                break
+        with self._lock:
+            stored = list(self.entries.get(key, {}).items())
+        for template, entry in stored:
+            if template in options:
+                continue
+            edits = replay_template(entry["hunks"], diagnostic, files, bindings)
+            if edits:
+                options[template] = Fix(entry["kind"], entry["prior"], entry["description"], edits,
+                                        key, template, entry["hunks"])
+        return list(options.values())
+
+    def lookup(self, diagnostics: List[Diagnostic], files: Dict[str, str]) -> Tuple[List[Fix], List[Fix]]:
+        """
+        Fixes for the errors of a compile, split by confidence
+
+        Returns:
+            tuple: (fixes to apply now, the best fix of the other errors that have one)
+        """
+        confident, candidates = [], []
+        if not self.enabled:
+            return confident, candidates
+        errors = [d for d in dedupe(diagnostics) if d.level.startswith("error")]
+        names = project_names(files)
+        chosen = []
+        hits = misses = 0
+        for diagnostic in errors:
+            key, bindings = fix_key(diagnostic, names)
+            options = self._options(diagnostic, key, bindings, files)
+            if not options:
+                misses += 1
+                continue
+            best = max(options, key=self.confidence)
+            if self.confidence(best) < self.min_confidence:
+                candidates.append(best)
+                continue
+            hits += 1
+            edits = [(e.path, e.start, e.end, e.text) for e in best.edits]
+            if all(edit in chosen for edit in edits):
+                # The same edit as another error's fix, e.g. one import for two uses
+                continue
+            if apply_edits(files, [e for fix in confident for e in fix.edits] + best.edits) is None:
+                candidates.append(best)
+                continue
+            confident.append(best)
+            chosen.extend(edits)
+        with self._lock:
+            self.lookups += len(errors)
+            self.hits += hits
+        FIX_LOOKUPS.inc(hits, outcome="hit")
+        FIX_LOOKUPS.inc(len(errors) - hits - misses, outcome="unconfident")
+        FIX_LOOKUPS.inc(misses, outcome="miss")
+        return confident, candidates
+
+    def _update(self, fix: Fix, counter: str):
+        entry = self.entries.setdefault(fix.key, {}).setdefault(fix.template, {
+            "kind": fix.kind, "prior": fix.prior, "description": fix.description, "hunks": fix.hunks,
+            "successes": 0, "failures": 0, "learned": 0,
+        })
+        entry[counter] = entry.get(counter, 0) + 1
+        entry["updated_at"] = time.time()
+
+    def verify(self, fixes: List[Fix], before: List[Diagnostic], after: List[Diagnostic], success: bool,
+               files: Dict[str, str]) -> bool:
+        """
+        Record the outcome of fixes applied by the store
+
+        A fix worked if its error is gone, or is reported fewer times, and no
+        new error points at the lines it wrote. Errors elsewhere are not held
+        against it: a fixed dependency or import lets the compiler get to
+        errors it could not report before.
+
+        Args:
+            fixes (list): The applied fixes
+            before (list): Diagnostics of the compile the fixes were looked up for
+            after (list): Diagnostics of the compile with the fixes
+            success (bool): Whether the fixed project compiled
+            files (dict): The project the fixes were looked up for
+
+        Returns:
+            bool: True if every fix worked, False if they should be rolled back
+        """
+        names = project_names(files)
+        counts_before, counts_after = count_keys(before, names), count_keys(after, names)
+        new_errors = [d for d in dedupe(after) if d.level.startswith("error")
+                      and counts_after[fix_key(d, names)[0]] > counts_before.get(fix_key(d, names)[0], 0)]
+        all_worked = True
+        with self._lock:
+            self.applied += len(fixes)
+            for fix in fixes:
+                written = edited_lines(fix.edits)
+                worked = success or (
+                    counts_after.get(fix.key, 0) < counts_before.get(fix.key, 0)
+                    and not any(d.line_start in written.get(d.file, ()) for d in new_errors)
+                )
+                self._update(fix, "successes" if worked else "failures")
+                if worked:
+                    self.verified += 1
+                else:
+                    self.rejected += 1
+                    all_worked = False
+                FIX_OUTCOMES.inc(kind=fix.kind, outcome="success" if worked else "failure")
+            self._save()
+        return all_worked
+
+    def learn(self, before: List[Diagnostic], after: List[Diagnostic],
+              before_files: Dict[str, str], after_files: Dict[str, str]) -> int:
+        """
+        Learn from an agent repair
+
+        For every error the repair got rid of (or reported fewer times), the
+        part of the edit near the error or naming what it names becomes a
+        template under the error's key, if it replays on the broken project.
+
+        Args:
+            before (list): Diagnostics of the broken project
+            after (list): Diagnostics of the repaired project
+            before_files (dict): The broken project
+            after_files (dict): The repaired project
+
+        Returns:
+            int: Templates learned or confirmed
+        """
+        if not self.enabled:
+            return 0
+        names = project_names(before_files)
+        counts_before, counts_after = count_keys(before, names), count_keys(after, names)
+        learned = []
+        for diagnostic in dedupe(before):
+            if not diagnostic.level.startswith("error"):
+                continue
+            key, bindings = fix_key(diagnostic, names)
+            if any(fix.key == key for fix in learned) or counts_after.get(key, 0) >= counts_before[key]:
+                continue
+            hunks = edit_template(diagnostic, before_files, after_files, bindings, relevant_only=True)
+            if not replay_template(hunks, diagnostic, before_files, bindings):
+                continue
+            description = f"learned from a repair of {diagnostic.code or 'an error'}"
+            learned.append(Fix("learned", "likely", description, [], key, template_id(hunks), hunks))
+        if not learned:
+            return 0
+        with self._lock:
+            for fix in learned:
+                self._update(fix, "successes")
+                self._update(fix, "learned")
+                self.learned += 1
+                FIX_OUTCOMES.inc(kind=fix.kind, outcome="learned")
+            self._save()
+        return len(learned)
+
+    def _save(self):
+        """Write the store atomically, call with the lock held"""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters of this process
+
+        Returns:
+            dict: errors looked up, confident hits, fixes applied, verified and
+            rejected, templates learned from the agents, hit rate and store size
+        """
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "applied": self.applied,
+                "verified": self.verified,
+                "rejected": self.rejected,
+                "learned": self.learned,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "keys": len(self.entries),
+                "templates": sum(len(templates) for templates in self.entries.values()),
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fix_store() -> FixStore:
+    """Return the process-wide fix store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FixStore()
+        return _store
@@ -0,0 +1,34 @@
+"""
+Logging for Rustsmith
+Every module logs below the "rustsmith" logger, whose level comes from LOG_LEVEL
+"""
+import logging
+import threading
+
+from config import LOG_LEVEL
+
+_configured = False
+_lock = threading.Lock()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger of a module
+
+    Args:
+        name (str): Module name, e.g. "pipeline"
+
+    Returns:
+        logging.Logger: "rustsmith.<name>", the handler is set up on first use
+    """
+    global _configured
+    with _lock:
+        if not _configured:
+            root = logging.getLogger("rustsmith")
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+            root.addHandler(handler)
+            root.setLevel(LOG_LEVEL.upper())
+            root.propagate = False
+            _configured = True
+    return logging.getLogger(f"rustsmith.{name}")
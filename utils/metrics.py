@@ -0,0 +1,186 @@
+"""
+Prometheus metrics for Rustsmith
+Latency histograms and counters, exported in the Prometheus text format to a file or an HTTP endpoint
+"""
+import bisect
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Tuple
+
+# Seconds, from a cache hit to a long generation or a cold build
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: List[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, with labels"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative histogram with labels"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: List[str], buckets: List[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = sorted(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + [float("inf")], counts):
+                    cumulative += count
+                    bound_label = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, bound_label)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics of this process"""
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, help: str, labels: List[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, labels: List[str] = ()) -> Gauge:
+        metric = Gauge(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: List[str] = (), buckets: List[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Write the metrics atomically, for node_exporter's textfile collector or a later scrape"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve the metrics at http://host:port/metrics from a background thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                data = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd
+
+
+registry = Registry()
+
+SPAN_SECONDS = registry.histogram(
+    "rustsmith_span_duration_seconds", "Duration of pipeline stages and operations", ["span", "status"])
+AGENT_SECONDS = registry.histogram(
+    "rustsmith_agent_request_seconds", "Latency of agent completions", ["agent", "model", "outcome"])
+AGENT_TOKENS = registry.counter(
+    "rustsmith_agent_tokens_total", "Tokens spent on agent completions", ["agent", "model"])
+COMPILES = registry.counter(
+    "rustsmith_compile_total", "Compiler runs by command and outcome", ["command", "outcome"])
+RUNS = registry.counter(
+    "rustsmith_pipeline_runs_total", "Finished pipeline runs by stop reason", ["stop_reason"])
+MODEL_QUEUE_SECONDS = registry.histogram(
+    "rustsmith_model_queue_seconds", "Time requests waited for a model's concurrency window and rate limits", ["model"])
+MODEL_WINDOW = registry.gauge(
+    "rustsmith_model_concurrency_window", "Adaptive limit of completions in flight per model", ["model"])
+MODEL_OVERLOADS = registry.counter(
+    "rustsmith_model_overload_total", "Requests refused by a model for overload (429/503/504 or timeout)", ["model", "reason"])
+ROUTE_HEDGES = registry.counter(
+    "rustsmith_route_hedges_total", "Hedged requests by agent role and whose answer won", ["role", "winner"])
+ROUTE_FALLBACKS = registry.counter(
+    "rustsmith_route_fallbacks_total", "Failed routed requests retried on the next route", ["role", "backend"])
+FIX_LOOKUPS = registry.counter(
+    "rustsmith_fix_lookups_total", "Compiler errors looked up in the fix knowledge base", ["outcome"])
+FIX_OUTCOMES = registry.counter(
+    "rustsmith_fix_outcomes_total", "Verified outcomes of known fixes by kind", ["kind", "outcome"])
+PROJECT_INDEX_LOOKUP_SECONDS = registry.histogram(
+    "rustsmith_project_index_lookup_seconds", "Latency of similar-project lookups",
+    buckets=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5])
+PROJECT_INDEX_LOOKUPS = registry.counter(
+    "rustsmith_project_index_lookups_total", "Similar-project lookups by whether a reference was found", ["outcome"])
+AGENT_CALLS_SKIPPED = registry.counter(
+    "rustsmith_agent_calls_skipped_total", "Agent calls skipped by starting from a similar project", ["agent"])
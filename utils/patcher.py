@@ -0,0 +1,136 @@
+"""
+Patch-based repair output for Rustsmith
+Parses and applies the Smith Agent's [PATCH: ...] unified diffs and [FILE: ...] replacements
+"""
+import re
+from typing import List, Dict, Tuple
+
+from utils.protocol import parse_response
+
+HUNK_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class PatchError(Exception):
+    """A repair response that cannot be applied to the current files"""
+
+
+def parse_hunks(diff: str) -> List[Tuple[int, List[str], List[str]]]:
+    """
+    Parse the hunks of a unified diff
+
+    Args:
+        diff (str): Diff of a single file, ---/+++ headers are optional
+
+    Returns:
+        list: (old start line, old lines, new lines) per hunk
+
+    Raises:
+        PatchError: If the diff has no hunk or a line outside of a hunk
+    """
+    hunks = []
+    for line in diff.splitlines():
+        match = HUNK_RE.match(line)
+        if match:
+            hunks.append((int(match.group(1)), [], []))
+            continue
+        if not hunks:
+            if line.startswith('---') or line.startswith('+++') or not line.strip():
+                continue
+            raise PatchError(f"line outside of a hunk: {line!r}")
+        _, old, new = hunks[-1]
+        if line.startswith('\\'):
+            # "\ No newline at end of file"
+            continue
+        if line.startswith('-'):
+            old.append(line[1:])
+        elif line.startswith('+'):
+            new.append(line[1:])
+        else:
+            # Models often drop the leading space of empty context lines
+            context = line[1:] if line.startswith(' ') else line
+            old.append(context)
+            new.append(context)
+    if not hunks:
+        raise PatchError("diff has no hunk")
+    return hunks
+
+
+def _find_block(lines: List[str], block: List[str], start: int, expected: int) -> int:
+    """Position of block in lines at or after start, the one closest to expected wins"""
+    last = len(lines) - len(block)
+    candidates = sorted(range(start, last + 1), key=lambda position: abs(position - expected))
+    for compare in (lambda line: line, lambda line: line.strip()):
+        wanted = [compare(line) for line in block]
+        for position in candidates:
+            if [compare(line) for line in lines[position:position + len(block)]] == wanted:
+                return position
+    return -1
+
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """
+    Apply a unified diff to a file
+
+    Hunks are located by their content, the line numbers in the hunk headers
+    only break ties, since models rarely get them right.
+
+    Args:
+        original (str): Current file content
+        diff (str): Unified diff of the file
+
+    Returns:
+        str: The patched content
+
+    Raises:
+        PatchError: If a hunk's context or removed lines are not in the file
+    """
+    lines = original.split('\n')
+    position = 0
+    for old_start, old, new in parse_hunks(diff):
+        expected = max(old_start - 1, position)
+        if old:
+            found = _find_block(lines, old, position, expected)
+            if found < 0:
+                raise PatchError(f"hunk at line {old_start} does not match the file")
+        else:
+            found = min(expected, len(lines))
+        lines[found:found + len(old)] = new
+        position = found + len(new)
+    return '\n'.join(lines)
+
+
+def apply_repair_response(response: str, files: Dict[str, str]) -> Dict[str, str]:
+    """
+    Apply a repair response to the current project files
+
+    Args:
+        response (str): The Smith agent's repair response
+        files (dict): Current file paths and contents
+
+    Returns:
+        dict: The new file set, files the response does not mention are unchanged
+
+    Raises:
+        PatchError: If the response has no block, an empty block, a block the
+            response ends in (likely cut off) or a patch that does not apply
+    """
+    parsed = parse_response(response)
+    patches, replacements = parsed.patches, parsed.files
+    if parsed.unterminated:
+        raise PatchError(f"block for {parsed.unterminated[-1]} is not closed, the response is likely cut off")
+    if parsed.empty:
+        raise PatchError(f"empty block for {parsed.empty[0]}")
+    if not patches and not replacements:
+        raise PatchError("response contains no [PATCH: ...] or [FILE: ...] block")
+    patched = dict(files)
+    patched.update(replacements)
+    for filepath, diff in patches.items():
+        if filepath not in patched:
+            if not re.search(r'^--- /dev/null', diff, re.MULTILINE):
+                raise PatchError(f"patch for unknown file {filepath}")
+            patched[filepath] = ""
+        try:
+            patched[filepath] = apply_unified_diff(patched[filepath], diff).strip()
+        except PatchError as e:
+            raise PatchError(f"{filepath}: {e}") from e
+    return patched
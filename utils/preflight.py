@@ -0,0 +1,248 @@
+"""
+Pre-flight validation for Rustsmith
+Catches obviously broken projects in milliseconds, before cargo is started
+"""
+import os
+import re
+import tomllib
+from typing import List, Dict, Optional
+
+from utils.diagnostics import Diagnostic
+
+MOD_RE = re.compile(r'^[ \t]*(?:pub(?:\([^)]*\))?[ \t]+)?mod[ \t]+(?:r#)?([A-Za-z_]\w*)[ \t]*;', re.MULTILINE)
+PATH_ATTRIBUTE_RE = re.compile(r'#\[\s*path\s*=[^\]]*\]\s*$')
+DELIMITERS = {"(": ")", "[": "]", "{": "}"}
+
+
+def _error(message: str, file: Optional[str] = None, line: int = 0, code: Optional[str] = None, help: str = "") -> Diagnostic:
+    location = f"\n  --> {file}:{line}" if file and line else (f"\n  --> {file}" if file else "")
+    rendered = f"error{f'[{code}]' if code else ''}: {message}{location}"
+    if help:
+        rendered += f"\n  = help: {help}"
+    return Diagnostic(level="error", message=message, code=code, file=file, line_start=line, line_end=line, rendered=rendered)
+
+
+def strip_code(source: str) -> str:
+    """
+    Blank out comments, string and char literals of Rust source
+
+    Newlines are kept, so offsets and line numbers in the result match the source.
+
+    Args:
+        source (str): Rust source
+
+    Returns:
+        str: The source with the content of comments and literals replaced by spaces
+    """
+    out = list(source)
+    length = len(source)
+
+    def blank(start: int, end: int):
+        for position in range(start, min(end, length)):
+            if out[position] != "\n":
+                out[position] = " "
+
+    i = 0
+    while i < length:
+        char = source[i]
+        if source.startswith("//", i):
+            end = source.find("\n", i)
+            end = length if end == -1 else end
+            blank(i, end)
+            i = end
+        elif source.startswith("/*", i):
+            depth, j = 1, i + 2
+            while j < length and depth:
+                if source.startswith("/*", j):
+                    depth, j = depth + 1, j + 2
+                elif source.startswith("*/", j):
+                    depth, j = depth - 1, j + 2
+                else:
+                    j += 1
+            blank(i, j)
+            i = j
+        elif char in "rb" and re.match(r'(?:br|r)#*"', source[i:i + 260]) and (i == 0 or not (source[i - 1].isalnum() or source[i - 1] == "_")):
+            prefix = re.match(r'(?:br|r)(#*)"', source[i:i + 260])
+            terminator = '"' + prefix.group(1)
+            end = source.find(terminator, i + prefix.end())
+            end = length if end == -1 else end + len(terminator)
+            blank(i, end)
+            i = end
+        elif char == '"':
+            j = i + 1
+            while j < length and source[j] != '"':
+                j += 2 if source[j] == "\\" else 1
+            blank(i, j + 1)
+            i = j + 1
+        elif char == "'":
+            # Char literal ('x', '\n', '\u{..}') or lifetime ('a)
+            if i + 1 < length and source[i + 1] == "\\":
+                end = source.find("'", i + 2)
+                end = length if end == -1 else end + 1
+                blank(i, end)
+                i = end
+            elif i + 2 < length and source[i + 2] == "'":
+                blank(i, i + 3)
+                i += 3
+            else:
+                i += 1
+        else:
+            i += 1
+    return "".join(out)
+
+
+def check_delimiters(filepath: str, code: str) -> List[Diagnostic]:
+    """
+    Check that (), [] and {} are balanced in comment and literal free code
+
+    Args:
+        filepath (str): Path of the file, for the report
+        code (str): Output of strip_code
+
+    Returns:
+        list: At most one diagnostic, for the first mismatch
+    """
+    stack = []
+    line = 1
+    for char in code:
+        if char == "\n":
+            line += 1
+        elif char in DELIMITERS:
+            stack.append((char, line))
+        elif char in ")]}":
+            if not stack:
+                return [_error(f"unexpected closing delimiter: `{char}`", filepath, line)]
+            opening, opened_at = stack.pop()
+            if DELIMITERS[opening] != char:
+                return [_error(
+                    f"mismatched closing delimiter: `{char}`", filepath, line,
+                    help=f"`{opening}` opened at line {opened_at} is closed by `{char}`"
+                )]
+    if stack:
+        opening, opened_at = stack[-1]
+        return [_error("this file contains an unclosed delimiter", filepath, opened_at,
+                       help=f"`{opening}` opened at line {opened_at} is never closed")]
+    return []
+
+
+def _module_directory(filepath: str) -> str:
+    """Directory the child modules of a source file live in"""
+    directory, filename = os.path.split(filepath)
+    is_root = filename == "mod.rs" or filepath in ("src/main.rs", "src/lib.rs") or directory == "src/bin"
+    return directory if is_root else os.path.join(directory, filename[:-3])
+
+
+def check_modules(filepath: str, code: str, files: Dict[str, str]) -> List[Diagnostic]:
+    """
+    Check that every top level `mod name;` of a file has a module file
+
+    Args:
+        filepath (str): Path of the declaring file
+        code (str): Output of strip_code for the file
+        files (dict): Every file of the project
+
+    Returns:
+        list: One diagnostic per missing module file
+    """
+    diagnostics = []
+    directory = _module_directory(filepath)
+    for match in MOD_RE.finditer(code):
+        before = code[:match.start()]
+        # Declarations inside inline modules resolve elsewhere, #[path] ones explicitly
+        if before.count("{") != before.count("}") or PATH_ATTRIBUTE_RE.search(before.rstrip()):
+            continue
+        name = match.group(1)
+        candidates = [f"{directory}/{name}.rs", f"{directory}/{name}/mod.rs"]
+        if not any(candidate in files for candidate in candidates):
+            diagnostics.append(_error(
+                f"file not found for module `{name}`", filepath, before.count("\n") + 1, code="E0583",
+                help=f"to create the module `{name}`, create file \"{candidates[0]}\" or \"{candidates[1]}\""
+            ))
+    return diagnostics
+
+
+def check_manifest(files: Dict[str, str]) -> List[Diagnostic]:
+    """
+    Parse Cargo.toml and check that the package has a target
+
+    Args:
+        files (dict): Every file of the project
+
+    Returns:
+        list: Manifest diagnostics
+    """
+    if "Cargo.toml" not in files:
+        return [_error("could not find `Cargo.toml` in the project", help="output a [FILE: Cargo.toml] block")]
+    try:
+        manifest = tomllib.loads(files["Cargo.toml"])
+    except tomllib.TOMLDecodeError as e:
+        return [_error(f"failed to parse manifest: {e}", "Cargo.toml")]
+
+    package = manifest.get("package")
+    if not isinstance(package, dict) or not package.get("name"):
+        return [_error("manifest has no [package] section with a `name`", "Cargo.toml")]
+    has_target = (
+        "src/main.rs" in files or "src/lib.rs" in files
+        or manifest.get("lib") or manifest.get("bin")
+        or any(filepath.startswith("src/bin/") for filepath in files)
+    )
+    if not has_target:
+        return [_error(
+            "no targets specified in the manifest", "Cargo.toml",
+            help="either src/lib.rs, src/main.rs, a [lib] section, or [[bin]] section must be present"
+        )]
+    return []
+
+
+def validate_files(files: Dict[str, str]) -> List[Diagnostic]:
+    """
+    Run every pre-flight check on a project
+
+    Args:
+        files (dict): Project file paths (relative, with / separators) and contents
+
+    Returns:
+        list: Diagnostics in cargo's order, manifest problems first; empty if
+        the project is worth compiling
+    """
+    diagnostics = check_manifest(files)
+    for filepath, content in sorted(files.items()):
+        if not (filepath.endswith(".rs") or filepath == "Cargo.toml"):
+            continue
+        fence = next((number for number, line in enumerate(content.splitlines(), 1) if line.lstrip().startswith("```")), 0)
+        if fence:
+            diagnostics.append(_error("stray code fence in file", filepath, fence,
+                                      help="close every code block before [END FILE]"))
+            continue
+        if filepath.endswith(".rs"):
+            code = strip_code(content)
+            diagnostics.extend(check_delimiters(filepath, code))
+            diagnostics.extend(check_modules(filepath, code, files))
+    return diagnostics
+
+
+def load_project(project_path: str) -> Dict[str, str]:
+    """Read the manifest and sources of a project, skipping target/"""
+    files = {}
+    for root, directories, filenames in os.walk(project_path):
+        directories[:] = [d for d in directories if d != "target" and not d.startswith(".")]
+        for filename in filenames:
+            if filename.endswith(".rs") or filename == "Cargo.toml":
+                full_path = os.path.join(root, filename)
+                filepath = os.path.relpath(full_path, project_path).replace(os.sep, "/")
+                with open(full_path, encoding="utf-8", errors="replace") as f:
+                    files[filepath] = f.read()
+    return files
+
+
+def preflight_check(project_path: str) -> List[Diagnostic]:
+    """
+    Validate a project on disk
+
+    Args:
+        project_path (str): Path to the Rust project
+
+    Returns:
+        list: Diagnostics, empty if the project is worth compiling
+    """
+    return validate_files(load_project(project_path))
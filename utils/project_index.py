@@ -0,0 +1,337 @@
+"""
+Similar-project index for Rustsmith
+TF-IDF retrieval over the ideas and files of projects that compiled
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from config import PROJECT_INDEX_ENABLED, PROJECT_INDEX_PATH, PROJECT_INDEX_MAX_ENTRIES, SIMILAR_SEED_THRESHOLD
+from database.mongodb import project_key
+from utils.log import get_logger
+from utils.metrics import PROJECT_INDEX_LOOKUP_SECONDS, PROJECT_INDEX_LOOKUPS
+
+logger = get_logger("project_index")
+
+STOPWORDS = {
+    "a", "an", "and", "app", "application", "build", "create", "for", "from", "in", "it", "make",
+    "of", "on", "or", "program", "project", "rust", "simple", "that", "the", "to", "tool", "with", "write",
+}
+# Weight of a term found in the project's code relative to one in its idea
+FILE_TERM_WEIGHT = 0.3
+# Code terms kept per project, the most frequent ones
+MAX_FILE_TERMS = 200
+
+WORD_RE = re.compile(r"[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+")
+DECLARATION_RE = re.compile(r"\b(?:struct|enum|trait|fn|mod|type)\s+(\w+)")
+
+
+# Suffixes folded so "stores", "storing" and "stored" are one term, longest first
+SUFFIXES = [("ices", "ix"), ("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", ""), ("e", "")]
+
+
+def stem(word: str) -> str:
+    """Crude suffix folding, enough to match the inflections of short ideas"""
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a text, identifiers split on case and underscores, inflections folded"""
+    tokens = []
+    for word in WORD_RE.findall(text):
+        word = word.lower()
+        if word not in STOPWORDS and len(word) > 1:
+            tokens.append(stem(word))
+    return tokens
+
+
+def _counts(tokens: List[str]) -> Dict[str, float]:
+    counts = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+
+def project_terms(idea: str, files: Dict[str, str]) -> Dict[str, float]:
+    """
+    Term frequencies of a project: the words of its idea plus, with a lower
+    weight, the names declared in its code and its dependencies
+    """
+    terms = {token: 1 + math.log(count) for token, count in _counts(tokenize(idea)).items()}
+    names = [name for content in files.values() for name in DECLARATION_RE.findall(content)]
+    dependencies = re.findall(r"^\s*([\w-]+)\s*=", files.get("Cargo.toml", "").split("[dependencies]", 1)[-1], re.MULTILINE)
+    code = _counts(tokenize(" ".join(names + dependencies)))
+    for token, count in sorted(code.items(), key=lambda item: -item[1])[:MAX_FILE_TERMS]:
+        terms[token] = terms.get(token, 0.0) + FILE_TERM_WEIGHT * (1 + math.log(count))
+    return terms
+
+
+@dataclass
+class SimilarProject:
+    """A project that compiled, with how close its idea is to the one looked up"""
+    idea: str
+    files: Dict[str, str]
+    agents: List[str] = field(default_factory=list)
+    score: float = 0.0
+
+
+class ProjectIndex:
+    """
+    TF-IDF index of the projects that compiled
+
+    A project is indexed once it compiles, keyed on its normalized idea so a
+    rebuild replaces the previous files. A lookup scores the stored projects
+    by the cosine of their TF-IDF vectors with the idea's, through an inverted
+    index, so only projects sharing a word with the idea are scored. The
+    least recently added projects are dropped past max_entries.
+
+    The index file holds the idea, agents and terms of every project; the
+    files of a project are in their own JSON file in files_dir, named after
+    its key, and are only read for the projects a lookup returns. An add
+    writes one project file and the index, which stays small.
+    """
+    def __init__(self, path: str = PROJECT_INDEX_PATH, max_entries: int = PROJECT_INDEX_MAX_ENTRIES,
+                 enabled: bool = PROJECT_INDEX_ENABLED):
+        self.path = path
+        self.files_dir = f"{os.path.splitext(path)[0]}_files" if path else ""
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.entries = {}
+        self.lookups = 0
+        self.matches = 0
+        self.lookup_seconds = 0.0
+        self._postings = {}
+        self._norms = None
+        # Files of every project when there is no path to write them to
+        self._memory_files = {}
+        self._version = 0
+        self._saved_version = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if enabled and path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Project index %s is unreadable, starting empty", path)
+        migrated = False
+        for key, entry in self.entries.items():
+            if "files" in entry:
+                # Indexes written before the files had their own file
+                self._write_files(key, entry.pop("files"))
+                migrated = True
+            self._post(key, entry["terms"])
+        if migrated:
+            self._version += 1
+            self._save()
+
+    def _post(self, key: str, terms: Dict[str, float]):
+        for term, weight in terms.items():
+            self._postings.setdefault(term, {})[key] = weight
+        self._norms = None
+
+    def _unpost(self, key: str):
+        for term in self.entries[key]["terms"]:
+            postings = self._postings.get(term, {})
+            postings.pop(key, None)
+            if not postings:
+                self._postings.pop(term, None)
+        self._norms = None
+
+    def _idf(self, term: str) -> float:
+        return math.log((1 + len(self.entries)) / (1 + len(self._postings.get(term, ())))) + 1
+
+    def _doc_norms(self) -> Dict[str, float]:
+        """Vector length of every project, recomputed after the index changed"""
+        if self._norms is None:
+            squares = {}
+            for term, postings in self._postings.items():
+                idf = self._idf(term)
+                for key, weight in postings.items():
+                    squares[key] = squares.get(key, 0.0) + (weight * idf) ** 2
+            self._norms = {key: math.sqrt(total) for key, total in squares.items()}
+        return self._norms
+
+    def add(self, idea: str, files: Dict[str, str], agents: List[str] = None):
+        """
+        Index a project that compiled
+
+        Args:
+            idea (str): The project idea
+            files (dict): The compiled files
+            agents (list): The sub-agents the Master Agent used for it
+        """
+        if not self.enabled:
+            return
+        key = project_key(idea)
+        terms = project_terms(idea, files)
+        self._write_files(key, files)
+        evicted = []
+        with self._lock:
+            if key in self.entries:
+                self._unpost(key)
+                del self.entries[key]
+            self.entries[key] = {"idea": idea, "agents": list(agents or []), "terms": terms, "added_at": time.time()}
+            self._post(key, terms)
+            while len(self.entries) > self.max_entries:
+                oldest = min(self.entries, key=lambda k: self.entries[k]["added_at"])
+                self._unpost(oldest)
+                del self.entries[oldest]
+                evicted.append(oldest)
+            self._version += 1
+        for oldest in evicted:
+            self._remove_files(oldest)
+        self._save()
+
+    def search(self, idea: str, limit: int = 5) -> List[SimilarProject]:
+        """
+        Projects closest to an idea
+
+        Args:
+            idea (str): The project idea
+            limit (int): Most projects returned
+
+        Returns:
+            list: Projects sharing a word with the idea, best first
+        """
+        started_at = time.perf_counter()
+        query = {token: 1 + math.log(count) for token, count in _counts(tokenize(idea)).items()}
+        with self._lock:
+            scores = {}
+            query_norm = 0.0
+            for term, weight in query.items():
+                idf = self._idf(term)
+                query_norm += (weight * idf) ** 2
+                for key, doc_weight in self._postings.get(term, {}).items():
+                    scores[key] = scores.get(key, 0.0) + weight * doc_weight * idf * idf
+            norms = self._doc_norms()
+            ranked = sorted(
+                ((score / (norms[key] * math.sqrt(query_norm)), key) for key, score in scores.items() if norms.get(key)),
+                reverse=True
+            )[:limit]
+            found = [
+                (key, SimilarProject(self.entries[key]["idea"], {}, self.entries[key]["agents"], round(score, 4)))
+                for score, key in ranked
+            ]
+        projects = []
+        for key, project in found:
+            project.files = self._read_files(key)
+            # A project whose files are gone was evicted by another thread or process
+            if project.files is not None:
+                projects.append(project)
+        elapsed = time.perf_counter() - started_at
+        PROJECT_INDEX_LOOKUP_SECONDS.observe(elapsed)
+        with self._lock:
+            self.lookups += 1
+            self.lookup_seconds += elapsed
+        return projects
+
+    def nearest(self, idea: str, threshold: float = SIMILAR_SEED_THRESHOLD) -> Optional[SimilarProject]:
+        """
+        The closest project if it is similar enough to start from
+
+        Returns:
+            SimilarProject: The best match with a score of at least threshold, or None
+        """
+        if not self.enabled:
+            return None
+        found = self.search(idea, limit=1)
+        match = found[0] if found and found[0].score >= threshold else None
+        PROJECT_INDEX_LOOKUPS.inc(outcome="match" if match else "miss")
+        if match:
+            with self._lock:
+                self.matches += 1
+        return match
+
+    def _files_path(self, key: str) -> str:
+        return os.path.join(self.files_dir, f"{key}.json")
+
+    def _write_files(self, key: str, files: Dict[str, str]):
+        """Write a project's files atomically to their own file"""
+        if not self.path:
+            self._memory_files[key] = files
+            return
+        os.makedirs(self.files_dir, exist_ok=True)
+        tmp_path = f"{self._files_path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(files, f, ensure_ascii=False)
+        os.replace(tmp_path, self._files_path(key))
+
+    def _read_files(self, key: str) -> Optional[Dict[str, str]]:
+        if not self.path:
+            return self._memory_files.get(key)
+        try:
+            with open(self._files_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_files(self, key: str):
+        if not self.path:
+            self._memory_files.pop(key, None)
+            return
+        try:
+            os.remove(self._files_path(key))
+        except OSError:
+            pass
+
+    def _save(self):
+        """
+        Write the index atomically
+
+        The entries are serialized under the lock and written outside of it;
+        a snapshot older than the one already written is dropped.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if self._version <= self._saved_version:
+                    return
+                version = self._version
+                data = json.dumps(self.entries, ensure_ascii=False)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+            self._saved_version = version
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters of this process
+
+        Returns:
+            dict: projects indexed, lookups, matches above the seed threshold
+            and the mean lookup latency in milliseconds
+        """
+        with self._lock:
+            return {
+                "projects": len(self.entries),
+                "lookups": self.lookups,
+                "matches": self.matches,
+                "mean_lookup_ms": round(1000 * self.lookup_seconds / self.lookups, 3) if self.lookups else 0.0,
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_project_index() -> ProjectIndex:
+    """Return the process-wide project index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ProjectIndex()
+        return _index
@@ -0,0 +1,229 @@
+"""
+Tokenizer for the agent response protocols
+One pass over [XXX_AGENT] ... [/XXX_AGENT] sections, [FILE: ...] ... [END FILE]
+and [PATCH: ...] ... [END PATCH] blocks
+"""
+import re
+from typing import List, Tuple, Optional
+
+AGENT_TAG_RE = re.compile(r'\[(/?)([A-Z]+)_AGENT\]')
+
+
+class ProtocolParser:
+    """
+    Incremental parser for the Master and Smith agent responses, and the
+    Smith agent's patch repairs
+
+    Feed it the response as one string or in chunks as they arrive; every
+    call returns the files whose block was closed by that chunk. The text is
+    scanned once, line by line, and only the open section or file is kept.
+
+    [PATCH: ...] blocks are read like file blocks, but keep their lines
+    as they are (diff context lines start with a space) and end up in
+    patches instead of files.
+
+    Common model mistakes are tolerated: a missing [END FILE] or [END PATCH]
+    (the next block or the end of the response closes the block), a block
+    without code fences, fenced blocks nested inside a file (``` with an
+    info string opens a nested block) and a section without its closing tag
+    (the next section or the end of the response closes it).
+
+    Attributes:
+        files (dict): File path -> content of every closed file block
+        patches (dict): File path -> diff text of every closed patch block
+        empty (list): Paths of file and patch blocks without content
+        unterminated (list): Paths of blocks still open at the end of the response
+        sections (dict): Lower-case agent name -> text of its first section
+        extra_text (list): Lines outside of files and sections
+    """
+    def __init__(self, extra_text_file: Optional[str] = None):
+        """
+        Args:
+            extra_text_file (str): File that receives the text found outside
+                of file blocks and sections when the parser is closed, None to
+                keep it in extra_text only
+        """
+        self.extra_text_file = extra_text_file
+        self.files = {}
+        self.patches = {}
+        self.empty = []
+        self.unterminated = []
+        self.sections = {}
+        self.extra_text = []
+        self._pending = []
+        # Open file or patch block
+        self._file = None
+        self._patch = False
+        self._fenced = []
+        self._raw = []
+        self._fence_seen = False
+        self._fence_depth = 0
+        # Open agent section
+        self._section = None
+        self._section_parts = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        Consume a chunk of the response
+
+        Args:
+            chunk (str): Next piece of the response text
+
+        Returns:
+            list: (file path, content) pairs completed by this chunk
+        """
+        completed = []
+        if not chunk:
+            return completed
+        start = 0
+        newline = chunk.find('\n')
+        if newline == -1:
+            # Pieces of a long line are joined once, when the line ends
+            self._pending.append(chunk)
+            return completed
+        if self._pending:
+            self._pending.append(chunk[:newline])
+            self._feed_line(''.join(self._pending), completed)
+            self._pending = []
+            start = newline + 1
+            newline = chunk.find('\n', start)
+        while newline != -1:
+            self._feed_line(chunk[start:newline], completed)
+            start = newline + 1
+            newline = chunk.find('\n', start)
+        if start < len(chunk):
+            self._pending.append(chunk[start:])
+        return completed
+
+    def close(self) -> List[Tuple[str, str]]:
+        """
+        Flush the last line, close whatever is still open and emit the extra text
+
+        Returns:
+            list: (file path, content) pairs completed by the end of the response
+        """
+        completed = []
+        if self._pending:
+            self._feed_line(''.join(self._pending), completed)
+            self._pending = []
+        if self._file is not None:
+            self.unterminated.append(self._file)
+        self._finish_file(completed)
+        self._finish_section()
+        content = '\n'.join(self.extra_text).strip()
+        if self.extra_text_file and content:
+            self.files[self.extra_text_file] = content
+            completed.append((self.extra_text_file, content))
+            self.extra_text = []
+        return completed
+
+    def _start_file(self, line: str):
+        self._patch = line.startswith('[PATCH:')
+        self._file = line[line.index(':') + 1:].split(']', 1)[0].strip().strip('`\'"* ')
+        self._fenced = []
+        self._raw = []
+        self._fence_seen = False
+        self._fence_depth = 0
+
+    def _finish_file(self, completed: List[Tuple[str, str]]):
+        if self._file is None:
+            return
+        lines = self._fenced if self._fence_seen else self._raw
+        content = '\n'.join(lines)
+        if self._file and not content.strip():
+            self.empty.append(self._file)
+        elif self._file and self._patch:
+            self.patches[self._file] = content.strip('\r\n')
+        elif self._file:
+            content = content.strip()
+            self.files[self._file] = content
+            completed.append((self._file, content))
+        self._file = None
+        self._patch = False
+        self._fenced = []
+        self._raw = []
+
+    def _finish_section(self):
+        if self._section is not None:
+            self.sections.setdefault(self._section, ''.join(self._section_parts).strip())
+        self._section = None
+        self._section_parts = []
+
+    def _feed_line(self, line: str, completed: List[Tuple[str, str]]):
+        stripped = line.strip()
+        if stripped.startswith(('[FILE:', '[PATCH:')):
+            self._finish_file(completed)
+            self._finish_section()
+            self._start_file(stripped)
+        elif self._file is not None:
+            if stripped.startswith(('[END FILE]', '[END PATCH]')):
+                self._finish_file(completed)
+            elif stripped.startswith('```'):
+                self._feed_fence(line, stripped)
+            elif self._fence_depth:
+                self._fenced.append(line)
+            elif not self._fence_seen:
+                self._raw.append(line)
+        elif '_AGENT]' in line:
+            self._feed_section_line(line)
+        elif self._section is not None:
+            self._section_parts.append(line + '\n')
+        else:
+            self.extra_text.append(line)
+
+    def _feed_fence(self, line: str, stripped: str):
+        if not self._fence_seen or self._fence_depth == 0:
+            # Opens the file's code block, a second block continues the file
+            self._fence_seen = True
+            self._fence_depth = 1
+        elif stripped[3:].strip():
+            # ```lang inside the code block opens a nested block
+            self._fence_depth += 1
+            self._fenced.append(line)
+        elif self._fence_depth > 1:
+            self._fence_depth -= 1
+            self._fenced.append(line)
+        else:
+            self._fence_depth = 0
+
+    def _feed_section_line(self, line: str):
+        position = 0
+        outside = []
+        for match in AGENT_TAG_RE.finditer(line):
+            text = line[position:match.start()]
+            if self._section is not None:
+                self._section_parts.append(text)
+            else:
+                outside.append(text)
+            name = match.group(2).lower()
+            if match.group(1):
+                if self._section == name:
+                    self._finish_section()
+            else:
+                self._finish_section()
+                self._section = name
+            position = match.end()
+        text = line[position:]
+        if self._section is not None:
+            self._section_parts.append(text + '\n')
+        else:
+            outside.append(text)
+        if ''.join(outside).strip():
+            self.extra_text.append(''.join(outside))
+
+
+def parse_response(response: str, extra_text_file: Optional[str] = None) -> ProtocolParser:
+    """
+    Parse a complete response
+
+    Args:
+        response (str): The agent's response
+        extra_text_file (str): See ProtocolParser
+
+    Returns:
+        ProtocolParser: The closed parser with files, patches, sections and extra text
+    """
+    parser = ProtocolParser(extra_text_file)
+    parser.feed(response)
+    parser.close()
+    return parser
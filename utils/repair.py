@@ -0,0 +1,132 @@
+"""
+Repair loop control for Rustsmith
+Budgets and stall detection for the compile-and-fix iterations
+"""
+import hashlib
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any
+
+from config import REPAIR_MAX_ATTEMPTS, REPAIR_MAX_SECONDS, REPAIR_MAX_TOKENS, REPAIR_MAX_REPEATS
+from utils.diagnostics import Diagnostic
+
+
+@dataclass
+class RepairBudget:
+    """Limits of a repair loop, 0 disables a limit"""
+    max_attempts: int = REPAIR_MAX_ATTEMPTS
+    max_seconds: float = REPAIR_MAX_SECONDS
+    max_tokens: int = REPAIR_MAX_TOKENS
+    max_repeats: int = REPAIR_MAX_REPEATS
+
+
+def error_fingerprint(errors: List[Diagnostic]) -> str:
+    """
+    Fingerprint of a set of compiler errors
+
+    Args:
+        errors (list): Diagnostics of one compile
+
+    Returns:
+        str: Short hash of the sorted normalized error fingerprints, empty if there are none
+    """
+    if not errors:
+        return ""
+    joined = "\n".join(sorted({error.fingerprint for error in errors}))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:12]
+
+
+class RepairController:
+    """
+    Decides whether another repair attempt is worth it
+
+    Call record() after every compile and should_continue() before asking
+    for the next fix. Once should_continue() returns False, stop_reason says
+    why: "success", "max_attempts", "time_budget", "token_budget" or
+    "repeated_error".
+    """
+    def __init__(self, budget: RepairBudget = None):
+        self.budget = budget or RepairBudget()
+        self.started_at = time.monotonic()
+        self.attempts = []
+        self.tokens = 0
+        self.fingerprint_counts = {}
+        self.stop_reason = None
+
+    def record(
+        self,
+        success: bool,
+        errors: List[Diagnostic],
+        tokens: int = 0,
+        compile_seconds: float = 0.0,
+        llm_seconds: float = 0.0
+    ) -> Dict[str, Any]:
+        """
+        Record the outcome of an attempt
+
+        Args:
+            success (bool): Whether the project compiled
+            errors (list): Ranked errors of the compile
+            tokens (int): Tokens spent on the agent calls of this attempt
+            compile_seconds (float): Time spent in cargo
+            llm_seconds (float): Time spent waiting for the agents
+
+        Returns:
+            dict: The metrics stored for the attempt
+        """
+        fingerprint = error_fingerprint(errors)
+        if fingerprint:
+            self.fingerprint_counts[fingerprint] = self.fingerprint_counts.get(fingerprint, 0) + 1
+        self.tokens += tokens
+        metrics = {
+            "attempt": len(self.attempts) + 1,
+            "success": success,
+            "errors": len(errors),
+            "fingerprint": fingerprint,
+            "tokens": tokens,
+            "compile_seconds": compile_seconds,
+            "llm_seconds": llm_seconds,
+            "elapsed": time.monotonic() - self.started_at,
+        }
+        self.attempts.append(metrics)
+        if success:
+            self.stop_reason = "success"
+        return metrics
+
+    def should_continue(self) -> bool:
+        """
+        Check the budgets before the next repair attempt
+
+        Returns:
+            bool: True if another attempt may run, otherwise stop_reason is set
+        """
+        if self.stop_reason:
+            return False
+        budget = self.budget
+        last = self.attempts[-1] if self.attempts else None
+        if budget.max_attempts and len(self.attempts) >= budget.max_attempts:
+            self.stop_reason = "max_attempts"
+        elif budget.max_seconds and time.monotonic() - self.started_at >= budget.max_seconds:
+            self.stop_reason = "time_budget"
+        elif budget.max_tokens and self.tokens >= budget.max_tokens:
+            self.stop_reason = "token_budget"
+        elif (budget.max_repeats and last and last["fingerprint"]
+              and self.fingerprint_counts[last["fingerprint"]] >= budget.max_repeats):
+            self.stop_reason = "repeated_error"
+        return self.stop_reason is None
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Outcome of the loop
+
+        Returns:
+            dict: stop reason, totals and the per-attempt metrics
+        """
+        return {
+            "stop_reason": self.stop_reason,
+            "attempts": len(self.attempts),
+            "tokens": self.tokens,
+            "elapsed": time.monotonic() - self.started_at,
+            "budget": asdict(self.budget),
+            "per_attempt": self.attempts,
+        }
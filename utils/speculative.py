@@ -0,0 +1,177 @@
+"""
+Speculative repair for Rustsmith
+Several candidate fixes are generated and compiled in parallel, the first one that compiles wins
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from agents.smith_agent import SmithAgent
+from agents.llm_client import LLMError
+from agents.prompts import format_files
+from config import SPECULATIVE_CANDIDATES, SPECULATIVE_TEMPERATURES, REPAIR_OUTPUT_MODE
+from utils.compiler import CompileResult, compile_project
+from utils.context_manager import estimate_tokens
+from utils.file_manager import extract_files_from_response
+from utils.patcher import PatchError, apply_repair_response
+from utils.workspace import Workspace
+from utils.log import get_logger
+from utils.tracing import propagate, span
+
+logger = get_logger("speculative")
+
+
+@dataclass
+class Candidate:
+    """One speculative fix and how it fared"""
+    index: int
+    params: Dict[str, Any]
+    files: Dict[str, str] = field(default_factory=dict)
+    compile_result: Optional[CompileResult] = None
+    tokens: int = 0
+    llm_seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.compile_result is not None and self.compile_result.success
+
+    @property
+    def error_count(self) -> float:
+        if self.compile_result is None:
+            return float("inf")
+        return len(self.compile_result.errors)
+
+
+def candidate_params(count: int, temperatures: List[float] = SPECULATIVE_TEMPERATURES) -> List[Dict[str, Any]]:
+    """Generation parameters of each candidate, a different temperature and seed per candidate"""
+    return [
+        {"temperature": temperatures[index % len(temperatures)], "seed": index}
+        for index in range(count)
+    ]
+
+
+def speculative_repair(
+    project_idea: str,
+    master_response: str,
+    context: List[Dict[str, Any]],
+    candidates: int = SPECULATIVE_CANDIDATES,
+    name: str = "repair",
+    files: Dict[str, str] = None,
+    error: str = "",
+    mode: str = REPAIR_OUTPUT_MODE
+) -> Dict[str, Any]:
+    """
+    Request several fixes at once and keep the first one that compiles
+
+    Every candidate compiles in its own scratch workspace. As soon as one
+    succeeds the others are cancelled: queued candidates never start and
+    running cargo processes are killed.
+
+    Args:
+        project_idea (str): The user's project idea
+        master_response (str): The Master Agent's workflow description
+        context (list): Compacted list of past attempts
+        candidates (int): Number of candidate fixes
+        name (str): Prefix of the scratch workspaces
+        files (dict): Current files, patched by the candidates in "patch" mode
+        error (str): Compiler errors of the current files
+        mode (str): "patch" asks every candidate for patches and falls back
+            to the whole project when they do not apply, "full" always
+            regenerates the whole project, see REPAIR_OUTPUT_MODE
+
+    Returns:
+        dict: winner (the successful candidate, or the one with the fewest
+        errors), tokens summed over every candidate that was started (the
+        prompt estimate for those still waiting on the API), llm_seconds of
+        the slowest finished one, and the number of candidates that finished
+    """
+    cancel_event = threading.Event()
+    started = []
+    patching = mode == "patch" and bool(files)
+
+    def call_agent(agent: SmithAgent, candidate: Candidate, prompt: str, call) -> str:
+        # The prompt is charged until the call returns, a candidate still
+        # waiting on the API when the winner is picked has at least cost that
+        estimate = estimate_tokens(prompt)
+        candidate.tokens += estimate
+        try:
+            return call()
+        finally:
+            candidate.tokens += agent.last_tokens - estimate
+
+    def run_candidate(index: int, params: Dict[str, Any]) -> Candidate:
+        with span("speculative.candidate", candidate=index, **params) as current:
+            candidate = generate_candidate(index, params)
+            current.set("success", candidate.success)
+            current.set("cancelled", candidate.compile_result is None and candidate.error is None)
+            return candidate
+
+    def generate_candidate(index: int, params: Dict[str, Any]) -> Candidate:
+        candidate = Candidate(index, params)
+        if cancel_event.is_set():
+            return candidate
+        agent = SmithAgent()
+        started.append(candidate)
+        started_at = time.perf_counter()
+        try:
+            if patching:
+                response = call_agent(agent, candidate, format_files(files) + error,
+                                      lambda: agent.repair(project_idea, files, error, **params))
+                try:
+                    candidate.files = apply_repair_response(response, files)
+                except PatchError as e:
+                    logger.info("Candidate %d: patch did not apply (%s), regenerating the whole project", index, e)
+            if not candidate.files:
+                response = call_agent(agent, candidate, project_idea + master_response + json.dumps(context, default=str),
+                                      lambda: agent.process(project_idea, master_response, context, **params))
+                candidate.files = extract_files_from_response(response)
+        except LLMError as e:
+            candidate.error = str(e)
+            return candidate
+        finally:
+            candidate.llm_seconds = time.perf_counter() - started_at
+
+        if cancel_event.is_set():
+            return candidate
+        with Workspace(f"{name}-{index}") as workspace:
+            workspace.write(candidate.files)
+            candidate.compile_result = compile_project(workspace.path, cancel_event=cancel_event)
+        return candidate
+
+    pool = ThreadPoolExecutor(max_workers=candidates)
+    futures = [pool.submit(propagate(run_candidate), index, params) for index, params in enumerate(candidate_params(candidates))]
+    finished = []
+    winner = None
+    try:
+        for future in as_completed(futures):
+            candidate = future.result()
+            finished.append(candidate)
+            logger.info("Candidate %d (%s): %s", candidate.index, candidate.params,
+                        'compiled' if candidate.success else candidate.error or f"{candidate.error_count} errors")
+            if candidate.success:
+                winner = candidate
+                cancel_event.set()
+                break
+    finally:
+        # Losing candidates still waiting on the API finish in the background
+        # and skip their compile
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if winner is None:
+        compiled = [candidate for candidate in finished if candidate.compile_result is not None]
+        if not compiled:
+            raise RuntimeError(
+                "No speculative candidate produced a project: " + "; ".join(c.error or "" for c in finished)
+            )
+        winner = min(compiled, key=lambda candidate: candidate.error_count)
+
+    return {
+        "winner": winner,
+        "tokens": sum(candidate.tokens for candidate in started),
+        "llm_seconds": max(candidate.llm_seconds for candidate in finished),
+        "finished": len(finished),
+    }
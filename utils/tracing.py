@@ -0,0 +1,220 @@
+"""
+Stage-level tracing for Rustsmith
+Spans of one pipeline run, exported as OpenTelemetry (OTLP JSON) trace files
+"""
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, Optional
+
+from config import TRACE_DIR
+from utils.metrics import SPAN_SECONDS
+
+_current_trace = contextvars.ContextVar("rustsmith_trace", default=None)
+_current_span = contextvars.ContextVar("rustsmith_span", default=None)
+_span_listener = contextvars.ContextVar("rustsmith_span_listener", default=None)
+
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP JSON encodes 64 bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """A timed operation with attributes and an outcome"""
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else ""
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set(self, key: str, value: Any):
+        """Add an attribute, None values are skipped"""
+        if value is not None:
+            self.attributes[key] = value
+
+    def fail(self, message: str):
+        """Mark the span as failed without raising"""
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _attribute_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status, "message": self.status_message} if self.status_message else {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """The finished spans of one pipeline run"""
+    def __init__(self, name: str, attributes: Dict[str, Any] = None):
+        self.trace_id = secrets.token_hex(16)
+        self.name = name
+        self.attributes = attributes or {}
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The trace in the OTLP/JSON ExportTraceServiceRequest shape"""
+        with self._lock:
+            spans = [span.to_otlp() for span in sorted(self.spans, key=lambda span: span.start_ns)]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": "rustsmith"}},
+                    *({"key": key, "value": _attribute_value(value)} for key, value in self.attributes.items()),
+                ]},
+                "scopeSpans": [{"scope": {"name": "rustsmith"}, "spans": spans}],
+            }]
+        }
+
+    def export(self, directory: str = TRACE_DIR) -> Optional[str]:
+        """
+        Write the trace to <directory>/<trace id>.json
+
+        Returns:
+            str: Path of the file, None if tracing to disk is disabled
+        """
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.trace_id}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_otlp(), f)
+        os.replace(tmp_path, path)
+        return path
+
+
+@contextmanager
+def trace_run(name: str, **attributes: Any) -> Iterator[Trace]:
+    """
+    Collect the spans of a run and export them when it ends
+
+    Args:
+        name (str): Name of the root span
+        **attributes: Attributes of the root span and the trace resource
+
+    Yields:
+        Trace: The trace, the root span is current inside the block
+    """
+    trace = Trace(name, attributes)
+    token = _current_trace.set(trace)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.export()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a block as a child of the current span
+
+    Exceptions mark the span as failed and are re-raised. Outside of a
+    trace_run block the span is timed but not exported.
+
+    Args:
+        name (str): Span name, e.g. "compile" or "agent.SmithAgent"
+        **attributes: Initial attributes
+
+    Yields:
+        Span: The span, to add attributes or mark a failure
+    """
+    trace = _current_trace.get() or Trace(name)
+    current = Span(trace, name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        if current.status == STATUS_UNSET:
+            current.status = STATUS_OK
+        if _current_trace.get() is trace:
+            trace.add(current)
+        SPAN_SECONDS.observe(current.duration, span=name, status="error" if current.status == STATUS_ERROR else "ok")
+        listener = _span_listener.get()
+        if listener:
+            listener(current)
+
+
+@contextmanager
+def watch_spans(listener: Callable[[Span], None]) -> Iterator[None]:
+    """
+    Call listener with every span that ends inside the block
+
+    The listener is inherited like the current span, so spans of work handed
+    to threads with propagate are reported too, from those threads.
+
+    Args:
+        listener (callable): Called with the finished span
+    """
+    token = _span_listener.set(listener)
+    try:
+        yield
+    finally:
+        _span_listener.reset(token)
+
+
+def current_span() -> Optional[Span]:
+    """The innermost open span of this thread or task"""
+    return _current_span.get()
+
+
+def propagate(function: Callable) -> Callable:
+    """
+    Bind a function to the current trace context, for work handed to a thread pool
+
+    Args:
+        function (callable): Function to run in another thread
+
+    Returns:
+        callable: Wrapper running it with the caller's current trace and span
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+    return wrapper
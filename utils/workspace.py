@@ -0,0 +1,126 @@
+"""
+Isolated build workspaces for Rustsmith
+Every job compiles in its own directory, and cargo runs are capped machine-wide
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+from config import WORKSPACE_ROOT, KEEP_WORKSPACES, CARGO_MAX_PARALLEL, CARGO_LOCK_DIR
+from utils.file_manager import save_project
+from utils.log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: the limit only holds within this process
+    fcntl = None
+
+logger = get_logger("workspace")
+
+
+class Workspace:
+    """
+    Private build root of a job
+
+    Files are written to a fresh directory (tmpfs when WORKSPACE_ROOT points
+    there) that is emptied before every attempt, so nothing from an earlier
+    attempt or another job can leak into a build.
+    """
+    def __init__(self, name: str = "job", root: str = WORKSPACE_ROOT, keep: bool = KEEP_WORKSPACES):
+        if root:
+            os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=f"{name}-", dir=root or None)
+        self.keep = keep
+
+    def reset(self):
+        """Remove every file of the previous attempt"""
+        for entry in os.scandir(self.path):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
+    def write(self, files: Dict[str, str]):
+        """Replace the workspace content with the given files"""
+        self.reset()
+        save_project(files, self.path)
+
+    def export(self, destination: str):
+        """
+        Copy the project to its final location
+
+        Args:
+            destination (str): Directory to copy to. If it holds an earlier
+                project (a Cargo.toml), its content except a target/
+                directory is removed first; any other directory is only
+                copied into, never cleared
+        """
+        if os.path.isfile(os.path.join(destination, "Cargo.toml")):
+            self._clear(destination)
+        elif os.path.isdir(destination) and os.listdir(destination):
+            logger.warning("%s is not empty and holds no project, copying without clearing it", destination)
+        shutil.copytree(self.path, destination, dirs_exist_ok=True, ignore=shutil.ignore_patterns("target"))
+
+    @staticmethod
+    def _clear(destination: str):
+        """Remove an earlier project, keeping its target/ directory for incremental builds"""
+        for entry in os.scandir(destination):
+            if entry.name == "target":
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
+    def cleanup(self):
+        if not self.keep:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self) -> "Workspace":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+
+_local_slots = threading.BoundedSemaphore(CARGO_MAX_PARALLEL)
+
+
+@contextmanager
+def cargo_slot(slots: int = CARGO_MAX_PARALLEL, lock_dir: str = CARGO_LOCK_DIR) -> Iterator[Tuple[int, int]]:
+    """
+    Hold one of the machine-wide cargo slots
+
+    Slots are flock'ed files shared by every Rustsmith process on the host.
+    Each slot gets cpu_count // slots jobs, so cargo's jobserver keeps all
+    concurrent builds together within the cores.
+
+    Yields:
+        tuple: (slot index, number of build jobs for this slot)
+    """
+    jobs = max(1, (os.cpu_count() or 1) // slots)
+    if fcntl is None:
+        with _local_slots:
+            yield 0, jobs
+        return
+
+    os.makedirs(lock_dir, exist_ok=True)
+    while True:
+        for index in range(slots):
+            handle = open(os.path.join(lock_dir, f"cargo-slot-{index}.lock"), "w")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            try:
+                yield index, jobs
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+                handle.close()
+            return
+        time.sleep(0.1)